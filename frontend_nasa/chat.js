@@ -68,28 +68,65 @@ async function sendMessage() {
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify({ query }),
+      body: JSON.stringify({ query, stream: true }),
     });
 
     if (!response.ok) {
       throw new Error("Failed to fetch response from the server");
     }
 
-    const data = await response.json();
-
-    // Replace thinking indicator with bot response
-    thinking.stop(data.generated_output);
-
-    // Display publications
-    if (data.Publication && data.Publication.length > 0) {
-      displayPublications(data.Publication);
+    // Non-streaming servers still answer with a single JSON body
+    if (!(response.headers.get("Content-Type") || "").includes("text/event-stream")) {
+      const data = await response.json();
+      thinking.stop(data.generated_output);
+      if (data.Publication && data.Publication.length > 0) {
+        displayPublications(data.Publication);
+      }
+      return;
     }
+
+    // Server-sent events: publications first, then answer tokens as they arrive
+    let answer = "";
+    await readEventStream(response, (event, data) => {
+      if (event === "publications" && data.Publication && data.Publication.length > 0) {
+        displayPublications(data.Publication);
+      } else if (event === "token") {
+        answer += data.text;
+        thinking.stop(answer);
+      } else if (event === "error") {
+        throw new Error(data.error);
+      }
+    });
+    thinking.stop(answer.trim());
   } catch (error) {
     console.error("Error:", error);
     addMessage("Sorry, something went wrong. Please try again.", "bot");
   }
 }
 
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 function addMessage(text, sender) {
   const message = document.createElement("div");
   message.className = `message ${sender}`;
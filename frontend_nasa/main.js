@@ -49,16 +49,33 @@ function hideLoader() {
   loader.style.display = 'none';
 }
 
+// Follow a paged listing's next_after / next_after_id cursors and collect every page's `key` items
+async function fetchAllPages(path, key, errorMessage) {
+  const items = [];
+  let cursor = {};
+  while (cursor) {
+    const response = await fetch(`${API_BASE_URL}${path}?${new URLSearchParams(cursor)}`);
+    if (!response.ok) {
+      throw new Error(errorMessage);
+    }
+    const page = await response.json();
+    items.push(...page[key]);
+    if (page.next_after != null) {
+      cursor = { after: page.next_after };
+    } else if (page.next_after_id != null) {
+      cursor = { after_id: page.next_after_id };
+    } else {
+      cursor = null;
+    }
+  }
+  return items;
+}
+
 // Fetch all documents and display them as the first card
 async function fetchAllDocuments() {
   try {
     showLoader();
-    const response = await fetch(`${API_BASE_URL}/list-all-documents/`);
-    if (!response.ok) {
-      throw new Error('Failed to fetch all documents');
-    }
-
-    const data = await response.json();
+    const data = { documents: await fetchAllPages('/list-all-documents/', 'documents', 'Failed to fetch all documents') };
     const documentsBox = document.getElementById('documents-box');
 
     // Create a card for "All Documents"
@@ -123,13 +140,10 @@ async function fetchCategories() {
 async function fetchCategoryData(categoryName) {
   try {
     showLoader();
-    const response = await fetch(`${API_BASE_URL}/get-category/${categoryName}/`);
-    if (!response.ok) {
-      throw new Error(`Failed to fetch data for category: ${categoryName}`);
-    }
-
-    const data = await response.json();
-    const names = data.data.map(item => item.properties.name); // Extract names
+    const items = await fetchAllPages(
+      `/get-category/${categoryName}/`, 'data', `Failed to fetch data for category: ${categoryName}`,
+    );
+    const names = items.map(item => item.properties.name); // Extract names
     displayDocuments(names, categoryName); // Pass category name for further actions
   } catch (error) {
     console.error(`Error fetching data for category ${categoryName}:`, error);
@@ -161,7 +175,8 @@ async function fetchDocumentsForItem(categoryName, itemName) {
 async function fetchDocumentDetails(documentName) {
   try {
     showLoader();
-    const response = await fetch(`${API_BASE_URL}/get-document/?doc_name=${documentName}`);
+    // The card needs only the summary; the full text is fetched when asked for
+    const response = await fetch(`${API_BASE_URL}/get-document/?doc_name=${encodeURIComponent(documentName)}&fields=summary`);
     if (!response.ok) {
       throw new Error(`Failed to fetch details for document: ${documentName}`);
     }
@@ -205,7 +220,14 @@ async function fetchDocumentDetails(documentName) {
     viewButton.textContent = 'View Full Document';
     viewButton.style.margin = '0';
     viewButton.style.whiteSpace = 'nowrap';
-    viewButton.addEventListener('click', () => {
+    viewButton.addEventListener('click', async () => {
+      const textResponse = await fetch(`${API_BASE_URL}/get-document/text/?doc_name=${encodeURIComponent(documentName)}`);
+      if (!textResponse.ok) {
+        console.error(`Failed to fetch the text of document: ${documentName}`);
+        return;
+      }
+      const fullText = await textResponse.text();
+
       // Remove the summary section
       const summarySection = window.document.getElementById('summary-section');
       if (summarySection) {
@@ -214,7 +236,7 @@ async function fetchDocumentDetails(documentName) {
 
       // Display the full text
       const fullTextElement = window.document.createElement('div');
-      fullTextElement.innerHTML = marked.parse(docDetails.text); // Parse markdown
+      fullTextElement.innerHTML = marked.parse(fullText); // Parse markdown
       fullTextElement.style.marginTop = '20px';
       documentContainer.appendChild(fullTextElement);
 
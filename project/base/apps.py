@@ -1,6 +1,52 @@
+import logging
+import sys
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
 
 
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        from django.conf import settings
+        if settings.NEO4J_SCHEMA_ON_STARTUP and serving():
+            ensure_neo4j_schema(settings)
+
+
+def serving():
+    """Whether this process serves requests: ``runserver``, or a WSGI/ASGI server rather than ``manage.py``.
+
+    Other management commands leave the schema alone; ``scripts/migrate_schema.py``
+    migrates it explicitly.
+    """
+    if Path(sys.argv[0]).name == "manage.py":
+        return len(sys.argv) > 1 and sys.argv[1] == "runserver"
+    return True
+
+
+def ensure_neo4j_schema(settings):
+    """Create missing constraints/indexes and refuse to start on a vector dimension mismatch."""
+    from neo4j import GraphDatabase
+    from neo4j.exceptions import DriverError, Neo4jError
+    from engine.schema import SchemaError, VectorDimensionError, migrate
+
+    # A short-lived driver: the shared connection lives in the WSGI module, which
+    # cannot be imported while apps are still loading.
+    driver = GraphDatabase.driver(
+        settings.NEO4J_URI, auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD), connection_timeout=5
+    )
+    try:
+        added = migrate(driver)
+        logger.info("Neo4j schema ready (%s added)", added)
+    except VectorDimensionError as e:
+        raise ImproperlyConfigured(str(e))
+    except (SchemaError, Neo4jError, DriverError) as e:
+        # The API still works without a missing index; run scripts/migrate_schema.py once fixed.
+        logger.warning("Neo4j schema not checked at startup: %s", e)
+    finally:
+        driver.close()
@@ -0,0 +1,191 @@
+"""Async versions of the views in ``base.views`` for ASGI deployments.
+
+They return the same payloads but use the async Neo4j driver and the async
+embedding client, so a worker keeps serving other requests while it waits on
+Bolt or OpenAI. Enabled with ``ASYNC_VIEWS = True`` (see ``base.urls``).
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from nasa_publication_tool.wsgi import async_retriever, lexical_index, neo4j_connection
+from engine.profiling import span
+from engine.query_embeddings import get_query_embedding_async
+from engine.related_documents import RELATED_QUERY, related_rows
+from engine.search import ahybrid_search
+from . import catalog, documents, search
+from .response_cache import acached_by_graph_version
+
+
+async def run_query(query_name, query, /, **params):
+    return await neo4j_connection.aexecute_read(query_name, query, **params)
+
+
+@require_GET
+@acached_by_graph_version
+async def list_categories(request):
+    try:
+        records = await run_query("list_categories", "CALL db.labels() YIELD label WHERE NOT label IN ['Section', 'GraphMeta'] RETURN label")
+        return JsonResponse({"categories": [record["label"] for record in records]})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def get_category(request, pk):
+    try:
+        page = catalog.page_params(request.GET)
+    except catalog.CatalogParamError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        query, params = catalog.category_query(pk, catalog.field_params(request.GET), page)
+        records = await run_query("get_category", query, **params)
+        rest = catalog.nameless_page(records, page)
+        if rest is not None:
+            query, params = catalog.category_query(pk, catalog.field_params(request.GET), rest)
+            records = [*records, *await run_query("get_category", query, **params)]
+        records, cursor = catalog.split_page(records, page)
+        nodes = [catalog.category_node(record) for record in records]
+        return JsonResponse({"category_name": pk, "data": nodes, **cursor})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def list_documents(request):
+    category = request.GET.get("category")
+    name = request.GET.get("name")
+
+    if not category or not name:
+        return JsonResponse({"error": "Both 'category' and 'name' parameters are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        records = await run_query(
+            "list_documents", f"MATCH (e:`{category}` {{name: $name}})--(connected) RETURN connected.name AS name", name=name,
+        )
+        documents = [record["name"] for record in records]
+        return JsonResponse({"category": category, "name": name, "documents": documents})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def list_all_documents(request):
+    try:
+        page = catalog.page_params(request.GET)
+    except catalog.CatalogParamError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        query, params = catalog.document_names_query(page)
+        records = await run_query("list_all_documents", query, **params)
+        rest = catalog.nameless_page(records, page)
+        if rest is not None:
+            query, params = catalog.document_names_query(rest)
+            records = [*records, *await run_query("list_all_documents", query, **params)]
+        records, cursor = catalog.split_page(records, page)
+        return JsonResponse({"documents": [record["name"] for record in records], **cursor})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def list_summaries(request):
+    try:
+        records = await run_query("list_summaries", "MATCH (doc:Document) WHERE doc.summary IS NOT NULL RETURN doc")
+        summaries = [{"name": r["doc"].get("name"), "summary": r["doc"].get("summary")} for r in records]
+        return JsonResponse({"summaries": summaries})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def get_document(request):
+    doc_name = request.GET.get('doc_name')
+    if not doc_name:
+        return JsonResponse({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fields, paging = documents.document_params(request.GET)
+    except documents.DocumentParamError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        records = await run_query("get_document", documents.METADATA_QUERY, **documents.metadata_params(doc_name, fields, paging))
+        if not records:
+            return JsonResponse({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        headings = sections = None
+        if "headings" in fields:
+            headings = await run_query("get_document_headings", documents.HEADINGS_QUERY, doc_name=doc_name)
+        if "sections" in fields:
+            sections = await run_query("get_document_sections", documents.SECTIONS_QUERY, **documents.sections_params(doc_name, paging))
+        return JsonResponse({'document': documents.document_payload(records[0], fields, paging, headings, sections)})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_document_text(request):
+    doc_name = request.GET.get('doc_name')
+    if not doc_name:
+        return JsonResponse({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        records = await run_query("get_document_text", documents.TEXT_QUERY, doc_name=doc_name)
+        if not records:
+            return JsonResponse({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        return documents.text_response(records[0]['text'], request.headers.get('Range'))
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+@acached_by_graph_version
+async def related_documents(request):
+    doc_name = request.GET.get('doc_name')
+    if not doc_name:
+        return JsonResponse({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        k = min(int(request.GET.get('k', settings.RELATED_DOCUMENTS_K)), settings.RELATED_DOCUMENTS_K)
+    except ValueError:
+        return JsonResponse({'error': "'k' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+    if k < 1:
+        return JsonResponse({'error': "'k' must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        related = related_rows(await run_query("related_documents", RELATED_QUERY, name=doc_name, k=k))
+        if related is None:
+            return JsonResponse({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({'document': doc_name, 'related': related})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def search_by_nodes(request):
+    search_text = request.GET.get("search_text")
+    if not search_text:
+        return JsonResponse({"error": "'search_text' parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        top_k, limit, fusion = search.search_params(request.GET)
+    except search.SearchParamError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results, embedded = await ahybrid_search(
+            async_retriever, lexical_index, get_query_embedding_async, search_text,
+            top_k=top_k, limit=limit, method=fusion, weights=settings.SEARCH_FUSION_WEIGHTS,
+            skip_embedding=settings.LEXICAL_SKIP_EMBEDDING,
+        )
+        with span("aggregate"):
+            final_results = [{"document": r["document"], "score": r["score"]} for r in results]
+        with span("render"):
+            return JsonResponse({"results": final_results, "fusion": fusion, "embedding_skipped": not embedded})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
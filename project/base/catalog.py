@@ -0,0 +1,120 @@
+"""Cypher and paging helpers shared by the sync and async catalog views.
+
+Listings are ordered by ``name`` and paged by keyset: a client passes the last
+name it received as ``after`` together with ``limit`` (``DEFAULT_PAGE_SIZE``
+when absent), and the response carries ``next_after``. Nodes without a name
+follow every named one, in element id order: the page where the names run out
+is filled up with the first nameless nodes (``nameless_page``), and from then
+on the response carries ``next_after_id`` instead, which the client passes
+back as ``after_id``. Both are ``null`` after the last page. Only the
+requested properties are projected in Cypher, so embeddings and full texts
+never cross the wire unless asked for.
+"""
+from collections import namedtuple
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+Page = namedtuple("Page", "after after_id limit")
+
+# Properties left out of category listings unless requested through ``fields``.
+HEAVY_PROPERTIES = ["embedding", "embedding_int8", "embedding_scale", "text", "summary"]
+# Never listed, even when asked for.
+VECTOR_PROPERTIES = {"embedding", "embedding_int8", "embedding_scale"}
+
+
+class CatalogParamError(ValueError):
+    pass
+
+
+def quote_label(label):
+    return "`" + label.replace("`", "``") + "`"
+
+
+def page_params(params):
+    """``Page(after, after_id, limit)`` from query params; ``after_id`` is ``None`` while paging by name."""
+    after = params.get("after") or None
+    after_id = params.get("after_id")
+    limit = params.get("limit")
+    if limit in (None, ""):
+        return Page(after, after_id, DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise CatalogParamError("'limit' must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise CatalogParamError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+    return Page(after, after_id, limit)
+
+
+def field_params(params):
+    fields = params.get("fields")
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip() and f.strip() not in VECTOR_PROPERTIES]
+
+
+def _paged(match, returns, page):
+    if page.after_id is None:
+        # A plain range predicate (no OR) keeps the name index usable for seek and order.
+        where, order = ("n.name > $after" if page.after is not None else "n.name IS NOT NULL"), "n.name"
+    else:
+        # Nameless nodes are rare and only read once the named ones are exhausted.
+        where, order = "n.name IS NULL AND elementId(n) > $after_id", "elementId(n)"
+    # One row past the page tells whether another page exists.
+    return f"{match} WHERE {where} RETURN {returns}, elementId(n) AS element_id ORDER BY {order} LIMIT $fetch"
+
+
+def category_query(label, fields, page):
+    """Query and params listing nodes of ``label`` with only the chosen properties."""
+    if fields is None:
+        props = "[k IN keys(n) WHERE NOT k IN $excluded | [k, n[k]]]"
+    else:
+        props = "[k IN $fields WHERE n[k] IS NOT NULL | [k, n[k]]]"
+    returns = f"id(n) AS id, labels(n) AS labels, n.name AS name, {props} AS properties"
+    query = _paged(f"MATCH (n:{quote_label(label)})", returns, page)
+    params = {"excluded": HEAVY_PROPERTIES, "fields": fields or []}
+    params.update(_page_query_params(page))
+    return query, params
+
+
+def document_names_query(page):
+    return _paged("MATCH (n:Document)", "n.name AS name", page), _page_query_params(page)
+
+
+def _page_query_params(page):
+    return {"after": page.after, "after_id": page.after_id, "fetch": page.limit + 1}
+
+
+def nameless_page(rows, page):
+    """The ``Page`` of nameless nodes that fills a named page which ran out of names, else ``None``.
+
+    Its limit may be 0: the one extra row fetched still tells whether nameless nodes exist.
+    """
+    if page.after_id is not None or len(rows) > page.limit:
+        return None
+    return Page(None, "", page.limit - len(rows))
+
+
+def split_page(rows, page):
+    """``(rows, cursor)`` for rows fetched with one extra row past the page.
+
+    ``rows`` may be named rows followed by those of their ``nameless_page``.
+    ``cursor`` holds the response's ``next_after`` and ``next_after_id``.
+    """
+    if len(rows) <= page.limit:
+        return rows, {"next_after": None, "next_after_id": None}
+    rows, following = rows[:page.limit], rows[page.limit]
+    last = rows[-1]
+    if following["name"] is not None:
+        return rows, {"next_after": last["name"], "next_after_id": None}
+    # The next page is nameless: it starts after the last nameless row, or at the first one.
+    return rows, {"next_after": None, "next_after_id": last["element_id"] if last["name"] is None else ""}
+
+
+def category_node(record):
+    return {
+        "id": record["id"],
+        "labels": list(record["labels"]),
+        "properties": dict(record["properties"]),
+    }
@@ -0,0 +1,157 @@
+"""Cypher and paging helpers shared by the sync and async document views.
+
+``get-document/`` returns a document's metadata: name, the lengths of its
+text and summary, and its section count. Anything heavier is named in
+``fields``:
+
+* ``summary``;
+* ``text``, optionally a character window ``text_offset`` / ``text_limit``,
+  cut in Cypher so only the window leaves Neo4j; the response carries
+  ``next_text_offset`` (``null`` at the end);
+* ``headings``: ``[{"ordinal", "heading"}]`` of every section, a table of contents;
+* ``sections``: ``[{"ordinal", "heading", "text"}]`` from ordinal
+  ``section_from`` (default 0), at most ``section_limit``, with
+  ``next_section`` (``null`` after the last).
+
+``get-document/text/`` serves the text as ``text/plain`` and honours a single
+``Range: bytes=...`` request with a 206.
+"""
+import re
+
+from django.http import HttpResponse
+from rest_framework import status
+
+FIELDS = ("summary", "text", "headings", "sections")
+MAX_SECTION_PAGE = 50
+
+METADATA_QUERY = """
+MATCH (d:Document {name: $doc_name})
+RETURN d.name AS name, size(d.text) AS text_length, size(d.summary) AS summary_length,
+       COUNT { (d)-[:HAS_SECTION]->(:Section) } AS section_count,
+       CASE WHEN $summary THEN d.summary END AS summary,
+       CASE WHEN $text THEN substring(d.text, $text_offset, coalesce($text_limit, size(d.text))) END AS text
+"""
+
+# Sections are reached the way section_count counts them, through HAS_SECTION.
+HEADINGS_QUERY = """
+MATCH (:Document {name: $doc_name})-[:HAS_SECTION]->(s:Section)
+RETURN s.ordinal AS ordinal, s.heading AS heading
+ORDER BY s.ordinal
+"""
+
+SECTIONS_QUERY = """
+MATCH (:Document {name: $doc_name})-[:HAS_SECTION]->(s:Section)
+WHERE s.ordinal >= $section_from
+RETURN s.ordinal AS ordinal, s.heading AS heading, s.text AS text
+ORDER BY s.ordinal
+LIMIT $fetch
+"""
+
+TEXT_QUERY = "MATCH (d:Document {name: $doc_name}) RETURN d.text AS text"
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class DocumentParamError(ValueError):
+    pass
+
+
+def _int_param(params, name, default, minimum, maximum=None):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise DocumentParamError(f"'{name}' must be an integer.")
+    if value < minimum or (maximum is not None and value > maximum):
+        bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+        raise DocumentParamError(f"'{name}' must be {bounds}.")
+    return value
+
+
+def document_params(params):
+    """``(fields, paging)`` from query params; ``fields`` is a set drawn from ``FIELDS``."""
+    fields = {f.strip() for f in params.get("fields", "").split(",") if f.strip()}
+    unknown = fields - set(FIELDS)
+    if unknown:
+        raise DocumentParamError(f"Unknown fields: {', '.join(sorted(unknown))}. Use {', '.join(FIELDS)}.")
+    paging = {
+        "text_offset": _int_param(params, "text_offset", 0, 0),
+        "text_limit": _int_param(params, "text_limit", None, 1),
+        "section_from": _int_param(params, "section_from", 0, 0),
+        "section_limit": _int_param(params, "section_limit", MAX_SECTION_PAGE, 1, MAX_SECTION_PAGE),
+    }
+    return fields, paging
+
+
+def metadata_params(doc_name, fields, paging):
+    return {
+        "doc_name": doc_name, "summary": "summary" in fields, "text": "text" in fields,
+        "text_offset": paging["text_offset"], "text_limit": paging["text_limit"],
+    }
+
+
+def sections_params(doc_name, paging):
+    # One row past the page tells whether another page exists.
+    return {"doc_name": doc_name, "section_from": paging["section_from"], "fetch": paging["section_limit"] + 1}
+
+
+def document_payload(record, fields, paging, headings=None, sections=None):
+    """The ``document`` object of a response, from the metadata record and the optional section rows."""
+    document = {k: record[k] for k in ("name", "text_length", "summary_length", "section_count")}
+    if "summary" in fields:
+        document["summary"] = record["summary"]
+    if "text" in fields:
+        text = record["text"] or ""
+        end = paging["text_offset"] + len(text)
+        document["text"] = text
+        document["text_offset"] = paging["text_offset"]
+        document["next_text_offset"] = end if record["text_length"] is not None and end < record["text_length"] else None
+    if headings is not None:
+        document["headings"] = [{"ordinal": r["ordinal"], "heading": r["heading"]} for r in headings]
+    if sections is not None:
+        rows = [{"ordinal": r["ordinal"], "heading": r["heading"], "text": r["text"]} for r in sections]
+        limit = paging["section_limit"]
+        document["sections"] = rows[:limit]
+        document["next_section"] = rows[limit]["ordinal"] if len(rows) > limit else None
+    return document
+
+
+def byte_range(header, size):
+    """``(start, end)`` (inclusive) of a single ``Range: bytes=`` header, ``None`` to send everything.
+
+    Raises ``DocumentParamError`` when the range cannot be satisfied.
+    """
+    match = BYTE_RANGE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        # Absent, multi-range or malformed: a 200 with the whole body is allowed.
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise DocumentParamError(f"Range not satisfiable for {size} bytes.")
+    return start, end
+
+
+def text_response(text, range_header=None):
+    """The document text as UTF-8 ``text/plain``, or the single byte range ``range_header`` asks for."""
+    body = (text or "").encode("utf-8")
+    try:
+        window = byte_range(range_header, len(body))
+    except DocumentParamError:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response["Content-Range"] = f"bytes */{len(body)}"
+        return response
+    if window is None:
+        response = HttpResponse(body, content_type="text/plain; charset=utf-8")
+    else:
+        start, end = window
+        response = HttpResponse(body[start:end + 1], content_type="text/plain; charset=utf-8",
+                                status=status.HTTP_206_PARTIAL_CONTENT)
+        response["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+    response["Accept-Ranges"] = "bytes"
+    return response
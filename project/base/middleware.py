@@ -0,0 +1,254 @@
+"""Request timing, ``Server-Timing`` headers and sampled profiles.
+
+``RequestTimingMiddleware`` collects the spans marked with
+``engine.profiling.span`` while a request is served. Its response carries
+them as a ``Server-Timing`` header, so browser dev tools show the breakdown,
+and the ``request_timing`` logger gets one JSON line per request.
+
+A request is profiled when it is sampled (``PROFILING_SAMPLE_RATE``) or sends
+the ``PROFILING_HEADER`` header (off unless the setting names one). The
+profile is written to ``PROFILING_DIR`` with cProfile (``.prof``, open it
+with ``snakeviz`` or ``pstats``) or pyinstrument (``.html``, when installed
+and ``PROFILING_BACKEND = "pyinstrument"``), and its file name is returned
+in ``X-Profile``. Only one request is profiled at a time, since Python allows
+only one active profiler. cProfile sees only the serving thread, so for
+async views pyinstrument gives the more useful picture.
+
+Spans of a streamed body (the tokens of a ``stream=true`` RAG answer) come
+after the response has left the middleware; the stream reports its own
+timings in its ``done`` event.
+
+``CompressionMiddleware`` compresses response bodies of at least
+``COMPRESSION_MIN_BYTES`` with brotli (when the ``brotli`` package is
+installed and the client accepts ``br``) or gzip. Streamed responses are left
+alone so server-sent events still flush token by token, and so are partial
+(206) responses, whose ``Content-Range`` counts identity bytes.
+"""
+import cProfile
+import gzip
+import json
+import logging
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from engine import profiling
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger("request_timing")
+
+_profiling_lock = threading.Lock()
+
+
+class _Capture:
+    def __init__(self, backend, async_mode):
+        if backend == "pyinstrument" and pyinstrument is not None:
+            self._profiler = pyinstrument.Profiler(async_mode="enabled" if async_mode else "disabled")
+            self.suffix = "html"
+        else:
+            self._profiler = cProfile.Profile()
+            self.suffix = "prof"
+
+    def start(self):
+        if self.suffix == "html":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.suffix == "html":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def save(self, directory, request):
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+        path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{slug}.{self.suffix}"
+        if self.suffix == "html":
+            path.write_text(self._profiler.output_html(), encoding="utf-8")
+        else:
+            self._profiler.dump_stats(path)
+        return path
+
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.SERVER_TIMING_HEADER
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.header = settings.PROFILING_HEADER
+        self.backend = settings.PROFILING_BACKEND
+        self.directory = Path(settings.PROFILING_DIR)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _capture(self, request, async_mode):
+        wanted = (self.header and request.headers.get(self.header)) or (
+            self.sample_rate and random.random() < self.sample_rate
+        )
+        if not wanted or not _profiling_lock.acquire(blocking=False):
+            return None
+        capture = _Capture(self.backend, async_mode)
+        try:
+            capture.start()
+        except Exception:
+            _profiling_lock.release()
+            logger.warning("Profiler could not start", exc_info=True)
+            return None
+        return capture
+
+    def _finish(self, request, response, timings, seconds, capture):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "ms": round(seconds * 1000, 3),
+            "spans": timings.as_dict(),
+            "streaming": response.streaming,
+        }
+        if capture is not None:
+            try:
+                capture.stop()
+                path = capture.save(self.directory, request)
+                record["profile"] = str(path)
+                response["X-Profile"] = path.name
+            except Exception:
+                logger.warning("Profile of %s not saved", request.path, exc_info=True)
+            finally:
+                _profiling_lock.release()
+        if self.server_timing:
+            response["Server-Timing"] = timings.server_timing(seconds)
+        logger.info(json.dumps(record))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = profiling.begin()
+        capture = self._capture(request, async_mode=False)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            if capture is not None:
+                capture.stop()
+                _profiling_lock.release()
+            raise
+        finally:
+            profiling.end(token)
+        return self._finish(request, response, timings, time.perf_counter() - started, capture)
+
+    async def __acall__(self, request):
+        timings, token = profiling.begin()
+        capture = self._capture(request, async_mode=True)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            if capture is not None:
+                capture.stop()
+                _profiling_lock.release()
+            raise
+        finally:
+            profiling.end(token)
+        return self._finish(request, response, timings, time.perf_counter() - started, capture)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that as "render".
+        timings = profiling.current()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add("render", time.perf_counter() - started))
+        return response
+
+
+def accepted_encodings(header):
+    """Content codings of an ``Accept-Encoding`` header that are not refused with ``q=0``."""
+    codings = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.RESPONSE_COMPRESSION
+        self.min_bytes = settings.COMPRESSION_MIN_BYTES
+        self.gzip_level = settings.GZIP_LEVEL
+        self.brotli_quality = settings.BROTLI_QUALITY
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _encoding(self, request):
+        codings = accepted_encodings(request.headers.get("Accept-Encoding"))
+        if brotli is not None and "br" in codings:
+            return "br"
+        if "gzip" in codings or "*" in codings:
+            return "gzip"
+        return None
+
+    def _compress(self, request, response):
+        if not self.enabled or response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if response.status_code == 206 or len(response.content) < self.min_bytes:
+            return response
+        # Caches must key on Accept-Encoding even when this client gets identity.
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self._encoding(request)
+        if encoding is None:
+            return response
+        with profiling.span("compress"):
+            if encoding == "br":
+                body = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        # The encoded bytes differ from the identity ones a strong ETag vouches for.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
@@ -0,0 +1,112 @@
+"""Response cache for the read-only catalog endpoints.
+
+Entries are keyed on the graph version stamp (see ``engine.graph_version``),
+the request path and the query params the views read (``KEY_PARAMS``), so an
+ingestion run invalidates everything at once and unknown params such as cache
+busters do not grow the key space. The same key forms the ETag: a client
+revalidating with ``If-None-Match`` gets a 304 without the cache or Neo4j
+being read. When the version cannot be read the view is served uncached.
+"""
+import functools
+import hashlib
+import logging
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from nasa_publication_tool.wsgi import graph_version
+
+logger = logging.getLogger(__name__)
+
+# Query params the cached views read (see base.catalog, base.documents); the rest do not change a response.
+KEY_PARAMS = (
+    "after", "after_id", "limit", "fields", "category", "name", "doc_name", "k",
+    "text_offset", "text_limit", "section_from", "section_limit",
+)
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _cache_path(request):
+    # Last value of a repeated param, as ``request.GET.get`` reads it.
+    params = [(p, request.GET[p]) for p in KEY_PARAMS if p in request.GET]
+    return f"{request.path}?{urlencode(params)}"
+
+
+def _key_and_etag(name, request, version):
+    digest = hashlib.sha1(_cache_path(request).encode("utf-8")).hexdigest()
+    return f"resp:{name}:{version}:{digest}", f'W/"{version}-{digest[:16]}"'
+
+
+def _not_modified(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _with_headers(response, etag):
+    response["ETag"] = etag
+    # Let clients store the response but always revalidate (cheap 304s).
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def cached_by_graph_version(get):
+    """Decorator for a DRF ``APIView.get`` method returning a ``Response``."""
+    name = get.__qualname__
+
+    @functools.wraps(get)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            version = graph_version.current()
+        except Exception:
+            logger.warning("Graph version unavailable, %s served uncached", name, exc_info=True)
+            return get(self, request, *args, **kwargs)
+        key, etag = _key_and_etag(name, request, version)
+        if _not_modified(request, etag):
+            return _with_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        data = _cache().get(key)
+        if data is None:
+            response = get(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            _cache().set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            return _with_headers(response, etag)
+        return _with_headers(Response(data), etag)
+
+    return wrapper
+
+
+def acached_by_graph_version(view):
+    """Decorator for an async function view returning a ``JsonResponse``."""
+    name = view.__qualname__
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            version = await graph_version.acurrent()
+        except Exception:
+            logger.warning("Graph version unavailable, %s served uncached", name, exc_info=True)
+            return await view(request, *args, **kwargs)
+        key, etag = _key_and_etag(name, request, version)
+        if _not_modified(request, etag):
+            return _with_headers(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        content = await _cache().aget(key)
+        if content is None:
+            response = await view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            await _cache().aset(key, response.content, settings.RESPONSE_CACHE_TIMEOUT)
+            return _with_headers(response, etag)
+        return _with_headers(HttpResponse(content, content_type="application/json"), etag)
+
+    return wrapper
@@ -0,0 +1,41 @@
+"""Query parameter parsing shared by the sync and async search views.
+
+``search-by-nodes/`` takes ``top_k`` (nodes probed per index, default 20),
+``limit`` (documents returned, default ``SEARCH_LIMIT``) and ``fusion`` (see
+``engine.search``). Before fusion was added every matched document was
+returned; now the best ``limit`` are, so a client wanting more asks for a
+larger ``limit``.
+
+Each result is ``{"document", "score"}`` and the response names the
+``fusion`` method used. ``score`` used to be ``max_score``, the best cosine;
+under the default ``rrf`` it is a sum of reciprocal ranks that only orders
+the results.
+"""
+from django.conf import settings
+
+from engine.search import FUSION_METHODS
+
+
+class SearchParamError(ValueError):
+    pass
+
+
+def _positive_int(params, name, default):
+    value = params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise SearchParamError(f"'{name}' must be an integer.")
+    if value < 1:
+        raise SearchParamError(f"'{name}' must be at least 1.")
+    return value
+
+
+def search_params(params):
+    """``(top_k, limit, fusion)`` from query params."""
+    fusion = params.get("fusion", settings.SEARCH_FUSION)
+    if fusion not in FUSION_METHODS:
+        raise SearchParamError(f"'fusion' must be one of {', '.join(FUSION_METHODS)}.")
+    return _positive_int(params, "top_k", 20), _positive_int(params, "limit", settings.SEARCH_LIMIT), fusion
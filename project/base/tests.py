@@ -1,3 +1,374 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from engine import metrics
+from engine.profiling import span
+
+from . import async_views, catalog, documents
+from .middleware import CompressionMiddleware, RequestTimingMiddleware, accepted_encodings
+from .views import (
+    GetCategoryView, GetDocumentTextView, GetDocumentView, ListAllDocumentsView, RelatedDocumentsView, SearchByNodesView,
+)
+
+TEXT = "héllo wörld"  # 13 bytes in UTF-8
+
+
+class DocumentParamsTests(SimpleTestCase):
+    def test_fields_and_paging_defaults(self):
+        fields, paging = documents.document_params({"fields": "summary, sections"})
+        self.assertEqual(fields, {"summary", "sections"})
+        self.assertEqual(paging, {"text_offset": 0, "text_limit": None, "section_from": 0,
+                                  "section_limit": documents.MAX_SECTION_PAGE})
+
+    def test_rejects_unknown_fields_and_out_of_range_values(self):
+        for params in ({"fields": "embedding"}, {"section_limit": "0"}, {"section_limit": "51"},
+                       {"text_offset": "-1"}, {"text_limit": "x"}):
+            with self.subTest(params=params), self.assertRaises(documents.DocumentParamError):
+                documents.document_params(params)
+
+    def test_payload_pages_sections_and_text(self):
+        fields, paging = documents.document_params({"fields": "text,sections", "text_limit": "4", "section_limit": "2"})
+        record = {"name": "Paper", "text_length": 10, "summary_length": None, "section_count": 3, "text": "abcd"}
+        rows = [{"ordinal": i, "heading": f"H{i}", "text": f"t{i}"} for i in range(3)]
+
+        document = documents.document_payload(record, fields, paging, sections=rows)
+        self.assertEqual(document["next_text_offset"], 4)
+        self.assertEqual([s["ordinal"] for s in document["sections"]], [0, 1])
+        self.assertEqual(document["next_section"], 2)
+
+        document = documents.document_payload(record, fields, paging, sections=rows[:2])
+        self.assertIsNone(document["next_section"])
+
+
+class ByteRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertIsNone(documents.byte_range(None, 13))
+        self.assertIsNone(documents.byte_range("bytes=0-1,4-5", 13))
+        self.assertEqual(documents.byte_range("bytes=2-", 13), (2, 12))
+        self.assertEqual(documents.byte_range("bytes=-3", 13), (10, 12))
+        self.assertEqual(documents.byte_range("bytes=5-100", 13), (5, 12))
+        with self.assertRaises(documents.DocumentParamError):
+            documents.byte_range("bytes=13-", 13)
+
+    def test_text_response(self):
+        response = documents.text_response(TEXT, "bytes=0-2")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, "hé".encode("utf-8"))
+        self.assertEqual(response["Content-Range"], "bytes 0-2/13")
+
+        response = documents.text_response(TEXT, "bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */13")
+
+        response = documents.text_response(TEXT)
+        self.assertEqual((response.status_code, response["Accept-Ranges"]), (200, "bytes"))
+
+
+class CatalogPagingTests(SimpleTestCase):
+    def test_default_page_size_and_bounds(self):
+        self.assertEqual(catalog.page_params({}), catalog.Page(None, None, catalog.DEFAULT_PAGE_SIZE))
+        for limit in ("0", "x", str(catalog.MAX_PAGE_SIZE + 1)):
+            with self.subTest(limit=limit), self.assertRaises(catalog.CatalogParamError):
+                catalog.page_params({"limit": limit})
+
+    def test_named_page_continues_by_name(self):
+        page = catalog.page_params({"limit": "2"})
+        rows = [{"name": n, "element_id": n} for n in "abc"]
+        self.assertIsNone(catalog.nameless_page(rows, page))
+        self.assertEqual(catalog.split_page(rows, page), (rows[:2], {"next_after": "b", "next_after_id": None}))
+
+    def test_last_named_page_is_filled_with_nameless_nodes(self):
+        page = catalog.page_params({"after": "a", "limit": "3"})
+        named = [{"name": "b", "element_id": "4:x:9"}]
+        self.assertEqual(catalog.nameless_page(named, page), catalog.Page(None, "", 2))
+
+        nameless = [{"name": None, "element_id": e} for e in ("4:x:1", "4:x:2", "4:x:3")]
+        rows, cursor = catalog.split_page(named + nameless, page)
+        self.assertEqual(rows, named + nameless[:2])
+        self.assertEqual(cursor, {"next_after": None, "next_after_id": "4:x:2"})
+
+    def test_no_cursor_when_no_nameless_nodes_follow(self):
+        page = catalog.page_params({"limit": "2"})
+        rows = [{"name": n, "element_id": n} for n in "ab"]
+        self.assertEqual(catalog.nameless_page(rows, page), catalog.Page(None, "", 0))
+        self.assertEqual(catalog.split_page(rows, page)[1], {"next_after": None, "next_after_id": None})
+        # A full named page followed by nameless nodes: the next page starts at the first of them.
+        nameless = {"name": None, "element_id": "4:x:1"}
+        self.assertEqual(catalog.split_page(rows + [nameless], page)[1], {"next_after": None, "next_after_id": ""})
+
+    def test_nameless_pages(self):
+        page = catalog.page_params({"after_id": "4:x:1", "limit": "2"})
+        rows = [{"name": None, "element_id": e} for e in ("4:x:2", "4:x:3", "4:x:4")]
+        self.assertIsNone(catalog.nameless_page(rows[:1], page))
+        self.assertEqual(catalog.split_page(rows, page)[1], {"next_after": None, "next_after_id": "4:x:3"})
+        self.assertEqual(catalog.split_page(rows[:2], page)[1], {"next_after": None, "next_after_id": None})
+
+
+class ViewTestCase(SimpleTestCase):
+    """Patches the graph version read and the Neo4j queries of ``base.views`` and ``base.async_views``."""
+
+    version = 7
+
+    def setUp(self):
+        caches["default"].clear()
+        self.graph_version = mock.Mock()
+        self.graph_version.current.side_effect = lambda: self.version
+        self.graph_version.acurrent = mock.AsyncMock(side_effect=lambda: self.version)
+        self.connection = mock.Mock()
+        self.connection.aexecute_read = mock.AsyncMock()
+        for target, value in (("base.response_cache.graph_version", self.graph_version),
+                              ("base.views.neo4j_connection", self.connection),
+                              ("base.async_views.neo4j_connection", self.connection)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, view, path, **kwargs):
+        response = view(APIRequestFactory().get(path, **kwargs))
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+
+class DocumentViewTests(ViewTestCase):
+    def test_sections_page(self):
+        self.connection.execute_read.side_effect = [
+            [{"name": "Paper", "text_length": 5, "summary_length": 3, "section_count": 3}],
+            [{"ordinal": 1, "heading": "B", "text": "b"}, {"ordinal": 2, "heading": "C", "text": "c"}],
+        ]
+        response = self.get(GetDocumentView.as_view(), "/get-document/?doc_name=Paper&fields=sections&section_from=1&section_limit=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["document"]["sections"], [{"ordinal": 1, "heading": "B", "text": "b"}])
+        self.assertEqual(response.data["document"]["next_section"], 2)
+        _, query = self.connection.execute_read.call_args.args
+        self.assertEqual(query, documents.SECTIONS_QUERY)
+        self.assertEqual(self.connection.execute_read.call_args.kwargs, {"doc_name": "Paper", "section_from": 1, "fetch": 2})
+
+    def test_missing_document_is_a_404(self):
+        self.connection.execute_read.return_value = []
+        response = self.get(GetDocumentView.as_view(), "/get-document/?doc_name=Nope")
+        self.assertEqual(response.status_code, 404)
+
+    def test_text_byte_range(self):
+        self.connection.execute_read.return_value = [{"text": TEXT}]
+        response = self.get(GetDocumentTextView.as_view(), "/get-document/text/?doc_name=Paper", HTTP_RANGE="bytes=-6")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content.decode("utf-8"), "wörld")
+
+    def test_async_text_byte_range(self):
+        self.connection.aexecute_read.return_value = [{"text": TEXT}]
+        request = AsyncRequestFactory().get("/get-document/text/?doc_name=Paper", headers={"Range": "bytes=0-0"})
+        response = asyncio.run(async_views.get_document_text(request))
+        self.assertEqual((response.status_code, response.content), (206, b"h"))
+
+
+class ResponseCacheTests(ViewTestCase):
+    path = "/get-category/Entity/?limit=1"
+
+    def setUp(self):
+        super().setUp()
+        # A full page and the row past it: no query for nameless nodes.
+        self.connection.execute_read.return_value = [
+            {"id": i, "labels": ["Entity"], "name": n, "properties": [["name", n]], "element_id": f"4:x:{i}"}
+            for i, n in enumerate("ab")
+        ]
+        self.view = lambda request: GetCategoryView.as_view()(request, pk="Entity")
+
+    def test_etag_then_cache_hit_then_304(self):
+        first = self.get(self.view, self.path)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"].startswith('W/"7-'))
+        self.assertEqual(first["Cache-Control"], "no-cache")
+
+        second = self.get(self.view, self.path)
+        self.assertEqual((second.status_code, second.content, second["ETag"]), (200, first.content, first["ETag"]))
+        self.assertEqual(self.connection.execute_read.call_count, 1)
+
+        revalidated = self.get(self.view, self.path, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], first["ETag"])
+        self.assertEqual(self.connection.execute_read.call_count, 1)
+
+    def test_new_graph_version_changes_the_etag_and_misses(self):
+        first = self.get(self.view, self.path)
+        self.version = 8
+        second = self.get(self.view, self.path, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(self.connection.execute_read.call_count, 2)
+
+    def test_errors_are_not_cached(self):
+        self.connection.execute_read.side_effect = RuntimeError("down")
+        self.assertEqual(self.get(self.view, self.path).status_code, 500)
+        self.connection.execute_read.side_effect = None
+        self.assertEqual(self.get(self.view, self.path).status_code, 200)
+
+    def test_unread_query_params_share_the_entry(self):
+        first = self.get(self.view, self.path)
+        second = self.get(self.view, "/get-category/Entity/?_=1234&limit=1")
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(self.connection.execute_read.call_count, 1)
+
+        third = self.get(self.view, "/get-category/Entity/?limit=1&fields=name")
+        self.assertNotEqual(third["ETag"], first["ETag"])
+        self.assertEqual(self.connection.execute_read.call_count, 2)
+
+    def test_unreadable_graph_version_serves_uncached(self):
+        self.graph_version.current.side_effect = RuntimeError("neo4j down")
+        for _ in range(2):
+            response = self.get(self.view, self.path)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("ETag", response)
+        self.assertEqual(self.connection.execute_read.call_count, 2)
+
+    def test_async_unreadable_graph_version_serves_uncached(self):
+        self.graph_version.acurrent.side_effect = RuntimeError("neo4j down")
+        self.connection.aexecute_read.return_value = self.connection.execute_read.return_value
+        response = asyncio.run(async_views.get_category(AsyncRequestFactory().get(self.path), pk="Entity"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+    def test_async_etag_and_304(self):
+        self.connection.aexecute_read.return_value = self.connection.execute_read.return_value
+
+        def get(**headers):
+            request = AsyncRequestFactory().get(self.path, headers=headers)
+            return asyncio.run(async_views.get_category(request, pk="Entity"))
+
+        first = get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(get(**{"If-None-Match": first["ETag"]}).status_code, 304)
+        self.assertEqual(get().content, first.content)
+        self.assertEqual(self.connection.aexecute_read.await_count, 1)
+
+
+class CatalogViewTests(ViewTestCase):
+    def test_page_where_names_run_out_is_filled_with_nameless_documents(self):
+        self.connection.execute_read.side_effect = [
+            [{"name": "b", "element_id": "4:x:9"}],
+            [{"name": None, "element_id": "4:x:1"}],
+        ]
+        response = self.get(ListAllDocumentsView.as_view(), "/list-all-documents/?after=a&limit=3")
+
+        self.assertEqual(response.data, {"documents": ["b", None], "next_after": None, "next_after_id": None})
+        self.assertEqual(self.connection.execute_read.call_args.kwargs["fetch"], 3)
+        self.assertEqual(self.connection.execute_read.call_args.kwargs["after_id"], "")
+
+
+class RelatedDocumentsViewTests(ViewTestCase):
+    def test_related_documents_are_capped_at_the_stored_k(self):
+        self.connection.execute_read.return_value = [{"name": "B", "score": 0.8}]
+        with self.settings(RELATED_DOCUMENTS_K=5):
+            response = self.get(RelatedDocumentsView.as_view(), "/related-documents/?doc_name=A&k=50")
+        self.assertEqual(response.data, {"document": "A", "related": [{"document": "B", "score": 0.8}]})
+        self.assertEqual(self.connection.execute_read.call_args.kwargs, {"name": "A", "k": 5})
+
+    def test_unknown_document_and_bad_k(self):
+        self.connection.execute_read.return_value = []
+        self.assertEqual(self.get(RelatedDocumentsView.as_view(), "/related-documents/?doc_name=Nope").status_code, 404)
+        for query in ("", "doc_name=A&k=x", "doc_name=A&k=0"):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(RelatedDocumentsView.as_view(), f"/related-documents/?{query}").status_code, 400)
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_metrics_are_served_in_the_prometheus_text_format(self):
+        metrics.counter("test_scraped_total", "Scrape test").inc()
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE test_scraped_total counter\ntest_scraped_total 1\n", response.content.decode())
+
+
+def timed_view(request):
+    with span("embed"):
+        pass
+    for _ in range(2):
+        with span("db.get_document"):
+            pass
+    return HttpResponse("ok")
+
+
+class RequestTimingMiddlewareTests(SimpleTestCase):
+    def test_spans_go_out_as_server_timing_and_a_log_line(self):
+        with self.assertLogs("request_timing", "INFO") as logs:
+            response = RequestTimingMiddleware(timed_view)(RequestFactory().get("/get-document/"))
+
+        names = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        self.assertEqual(names, ["embed", "db.get_document", "total"])
+        self.assertIn('db.get_document;dur=', response["Server-Timing"])
+        self.assertIn('desc="x2"', response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["path"], record["status"], list(record["spans"])), ("/get-document/", 200, ["embed", "db.get_document"]))
+        self.assertNotIn("X-Profile", response)
+
+    def test_async_requests_are_timed(self):
+        async def view(request):
+            with span("retrieve"):
+                pass
+            return HttpResponse("ok")
+
+        with self.assertLogs("request_timing", "INFO"):
+            response = asyncio.run(RequestTimingMiddleware(view)(AsyncRequestFactory().get("/rag/")))
+        self.assertTrue(response["Server-Timing"].startswith("retrieve;dur="))
+
+    def test_requested_profile_is_saved(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING_HEADER="X-Profile-Request", PROFILING_DIR=directory), \
+                self.assertLogs("request_timing", "INFO"):
+            middleware = RequestTimingMiddleware(timed_view)
+            response = middleware(RequestFactory().get("/get-document/", headers={"X-Profile-Request": "1"}))
+            self.assertTrue(response["X-Profile"].endswith("-get-document.prof"))
+            self.assertTrue((Path(directory) / response["X-Profile"]).exists())
+            self.assertNotIn("X-Profile", middleware(RequestFactory().get("/get-document/")))
+
+
+@override_settings(COMPRESSION_MIN_BYTES=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    BODY = b'{"documents": [' + b'"Microgravity and bone", ' * 50 + b'"x"]}'
+
+    def compress(self, response, accept="gzip, deflate"):
+        return CompressionMiddleware(lambda request: response)(RequestFactory().get("/", headers={"Accept-Encoding": accept}))
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings("gzip;q=0.5, br;q=0, identity"), {"gzip", "identity"})
+        self.assertEqual(accepted_encodings(None), set())
+
+    def test_large_bodies_are_gzipped_and_strong_etags_weakened(self):
+        response = HttpResponse(self.BODY, content_type="application/json")
+        response["ETag"] = '"abc"'
+        response = self.compress(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual((response["ETag"], response["Vary"]), ('W/"abc"', "Accept-Encoding"))
+
+    def test_small_partial_streamed_or_unaccepted_bodies_are_left_alone(self):
+        responses = {
+            "small": (HttpResponse(b"{}"), "gzip"),
+            "partial": (HttpResponse(self.BODY, status=206), "gzip"),
+            "identity only": (HttpResponse(self.BODY), "identity, gzip;q=0"),
+        }
+        for case, (response, accept) in responses.items():
+            with self.subTest(case=case):
+                self.assertFalse(self.compress(response, accept).has_header("Content-Encoding"))
+        streamed = StreamingHttpResponse(iter([self.BODY]))
+        self.assertFalse(self.compress(streamed).has_header("Content-Encoding"))
+
+
+class SearchParamsTests(ViewTestCase):
+    def test_bad_parameters_are_a_400(self):
+        for query in ("top_k=x", "limit=0", "fusion=nope"):
+            with self.subTest(query=query):
+                response = self.get(SearchByNodesView.as_view(), f"/search-by-nodes/?search_text=a&{query}")
+                self.assertEqual(response.status_code, 400)
@@ -1,15 +1,25 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from .views import ListCategoriesView, GetCategoryView, ListDocumentsView, ListAllDocumentsView, GetDocumentView, SearchByNodesView
-from .views import ListSummariesView
+from .views import ListSummariesView, RelatedDocumentsView, GetDocumentTextView, prometheus_metrics
+from . import async_views
+
+
+def view(sync_view, async_view):
+    """The async function view under ``ASYNC_VIEWS``, else the DRF view class (see ``base.async_views``)."""
+    return async_view if settings.ASYNC_VIEWS else sync_view.as_view()
+
 
 urlpatterns = [
-    path('list-categories/', ListCategoriesView.as_view(), name='list_categories'),
-    path('get-category/<str:pk>/', GetCategoryView.as_view(), name='get_category'),
-    path('list-documents/', ListDocumentsView.as_view(), name='list_documents'),
-    path('list-all-documents/', ListAllDocumentsView.as_view(), name='list_all_documents'),
-    path('list-summaries/', ListSummariesView.as_view(), name='list_summaries'),
-    path('get-document/', GetDocumentView.as_view(), name='get_document'),
-    path('search-by-nodes/', SearchByNodesView.as_view(), name='search_by_nodes'),
+    path('list-categories/', view(ListCategoriesView, async_views.list_categories), name='list_categories'),
+    path('get-category/<str:pk>/', view(GetCategoryView, async_views.get_category), name='get_category'),
+    path('list-documents/', view(ListDocumentsView, async_views.list_documents), name='list_documents'),
+    path('list-all-documents/', view(ListAllDocumentsView, async_views.list_all_documents), name='list_all_documents'),
+    path('list-summaries/', view(ListSummariesView, async_views.list_summaries), name='list_summaries'),
+    path('get-document/', view(GetDocumentView, async_views.get_document), name='get_document'),
+    path('get-document/text/', view(GetDocumentTextView, async_views.get_document_text), name='get_document_text'),
+    path('related-documents/', view(RelatedDocumentsView, async_views.related_documents), name='related_documents'),
+    path('search-by-nodes/', view(SearchByNodesView, async_views.search_by_nodes), name='search_by_nodes'),
+    path('metrics/', prometheus_metrics, name='metrics'),
 ]
-
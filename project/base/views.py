@@ -1,47 +1,56 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from nasa_publication_tool.wsgi import neo4j_connection
-import openai
+from django.conf import settings
+from django.http import HttpResponse
+from nasa_publication_tool.wsgi import lexical_index, neo4j_connection, retriever
+from engine import metrics
+from engine.profiling import span
+from engine.query_embeddings import get_query_embedding
+from engine.related_documents import RELATED_QUERY, related_rows
+from engine.search import hybrid_search
+from . import catalog, documents, search
+from .response_cache import cached_by_graph_version
 
 
 class ListCategoriesView(APIView):
+    @cached_by_graph_version
     def get(self, request):
         try:
-            with neo4j_connection._driver.session() as session:
-                # Run the query to list all node types (labels)
-                result = session.run("CALL db.labels() YIELD label WHERE label <> 'Section' RETURN label")
-                categories = [record["label"] for record in result]
+            # Run the query to list all node types (labels)
+            result = neo4j_connection.execute_read(
+                "list_categories", "CALL db.labels() YIELD label WHERE NOT label IN ['Section', 'GraphMeta'] RETURN label"
+            )
+            categories = [record["label"] for record in result]
 
-                return Response({"categories": categories})
+            return Response({"categories": categories})
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class GetCategoryView(APIView):
+    @cached_by_graph_version
     def get(self, request, pk):
         try:
-            with neo4j_connection._driver.session() as session:
-                query = f"MATCH (n:`{pk}`) RETURN n"
-                records = session.run(query)
+            page = catalog.page_params(request.GET)
+        except catalog.CatalogParamError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                nodes = []
-                for record in records:
-                    node = record["n"]
-
-                    # ✅ Filter out 'embedding' from properties
-                    props = {k: v for k, v in node.items() if k != "embedding"}
-
-                    node_data = {
-                        "id": node.id,
-                        "labels": list(node.labels),
-                        "properties": props
-                    }
-                    nodes.append(node_data)
+        try:
+            # Project only the needed properties (never 'embedding') and page by name
+            query, params = catalog.category_query(pk, catalog.field_params(request.GET), page)
+            records = neo4j_connection.execute_read("get_category", query, **params)
+            rest = catalog.nameless_page(records, page)
+            if rest is not None:
+                query, params = catalog.category_query(pk, catalog.field_params(request.GET), rest)
+                records = [*records, *neo4j_connection.execute_read("get_category", query, **params)]
+            records, cursor = catalog.split_page(records, page)
+            nodes = [catalog.category_node(record) for record in records]
 
             response = {
                 "category_name": pk,
-                "data": nodes
+                "data": nodes,
+                **cursor
             }
 
             return Response(response)
@@ -50,6 +59,7 @@ class GetCategoryView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class ListDocumentsView(APIView):
+    @cached_by_graph_version
     def get(self, request):
         category = request.GET.get("category")
         name = request.GET.get("name")
@@ -58,21 +68,15 @@ class ListDocumentsView(APIView):
             return Response({"error": "Both 'category' and 'name' parameters are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with neo4j_connection._driver.session() as session:
-                # ⚠️ Use backticks and parameterized queries to prevent Cypher injection
-                query = f"""
-                MATCH (e:`{category}` {{name: $name}})--(connected)
-                RETURN connected
-                """
-                result = session.run(query, name=name)
-
-                # Extract connected nodes
-                connected_nodes = []
-                for record in result:
-                    connected_node = record["connected"]
-                    connected_nodes.append(
-                        connected_node.get("name")
-                    )
+            # ⚠️ Use backticks and parameterized queries to prevent Cypher injection
+            query = f"""
+            MATCH (e:`{category}` {{name: $name}})--(connected)
+            RETURN connected.name AS name
+            """
+            result = neo4j_connection.execute_read("list_documents", query, name=name)
+
+            # Only the names cross the wire, not the connected nodes' embeddings
+            connected_nodes = [record["name"] for record in result]
 
             response = {
                 "category": category,
@@ -86,20 +90,25 @@ class ListDocumentsView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 class ListAllDocumentsView(APIView):
+    @cached_by_graph_version
     def get(self, request):
         try:
-            with neo4j_connection._driver.session() as session:
-                # Query to fetch all Document nodes
-                query = "MATCH (doc:Document) RETURN doc"
-                result = session.run(query)
+            page = catalog.page_params(request.GET)
+        except catalog.CatalogParamError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Extract document names
-                documents = []
-                for record in result:
-                    doc_node = record["doc"]
-                    documents.append(doc_node.get("name"))
-
-            return Response({"documents": documents},status=status.HTTP_200_OK)
+        try:
+            # Only document names are needed, not the full text and summary
+            query, params = catalog.document_names_query(page)
+            records = neo4j_connection.execute_read("list_all_documents", query, **params)
+            rest = catalog.nameless_page(records, page)
+            if rest is not None:
+                query, params = catalog.document_names_query(rest)
+                records = [*records, *neo4j_connection.execute_read("list_all_documents", query, **params)]
+            records, cursor = catalog.split_page(records, page)
+            documents = [record["name"] for record in records]
+
+            return Response({"documents": documents, **cursor},status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -109,19 +118,19 @@ class ListSummariesView(APIView):
     """Return documents that have pre-generated summaries stored on the Document node.
     Expected response: { "summaries": [ { "name": str, "summary": str }, ... ] }
     """
+    @cached_by_graph_version
     def get(self, request):
         try:
-            with neo4j_connection._driver.session() as session:
-                query = "MATCH (doc:Document) WHERE doc.summary IS NOT NULL RETURN doc"
-                result = session.run(query)
-
-                summaries = []
-                for record in result:
-                    doc_node = record["doc"]
-                    summaries.append({
-                        "name": doc_node.get("name"),
-                        "summary": doc_node.get("summary"),
-                    })
+            query = "MATCH (doc:Document) WHERE doc.summary IS NOT NULL RETURN doc"
+            result = neo4j_connection.execute_read("list_summaries", query)
+
+            summaries = []
+            for record in result:
+                doc_node = record["doc"]
+                summaries.append({
+                    "name": doc_node.get("name"),
+                    "summary": doc_node.get("summary"),
+                })
 
             return Response({"summaries": summaries}, status=status.HTTP_200_OK)
 
@@ -129,101 +138,101 @@ class ListSummariesView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class GetDocumentView(APIView):
+    @cached_by_graph_version
+    def get(self, request):
+        doc_name = request.GET.get('doc_name')
+        if not doc_name:
+            return Response({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fields, paging = documents.document_params(request.GET)
+        except documents.DocumentParamError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Metadata by default; summary, text and sections only when asked for (see base/documents.py)
+            records = neo4j_connection.execute_read(
+                "get_document", documents.METADATA_QUERY, **documents.metadata_params(doc_name, fields, paging)
+            )
+            if not records:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            headings = sections = None
+            if "headings" in fields:
+                headings = neo4j_connection.execute_read("get_document_headings", documents.HEADINGS_QUERY, doc_name=doc_name)
+            if "sections" in fields:
+                sections = neo4j_connection.execute_read(
+                    "get_document_sections", documents.SECTIONS_QUERY, **documents.sections_params(doc_name, paging)
+                )
+            document = documents.document_payload(records[0], fields, paging, headings, sections)
+            return Response({'document': document}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class GetDocumentTextView(APIView):
+    def get(self, request):
+        doc_name = request.GET.get('doc_name')
+        if not doc_name:
+            return Response({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            records = neo4j_connection.execute_read("get_document_text", documents.TEXT_QUERY, doc_name=doc_name)
+            if not records:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            return documents.text_response(records[0]['text'], request.headers.get('Range'))
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class RelatedDocumentsView(APIView):
+    @cached_by_graph_version
     def get(self, request):
         doc_name = request.GET.get('doc_name')
         if not doc_name:
             return Response({'error': 'Document name is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            k = min(int(request.GET.get('k', settings.RELATED_DOCUMENTS_K)), settings.RELATED_DOCUMENTS_K)
+        except ValueError:
+            return Response({'error': "'k' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if k < 1:
+            return Response({'error': "'k' must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with neo4j_connection._driver.session() as session:
-                query = """
-                MATCH (d:Document {name: $doc_name})
-                RETURN d
-                """
-                result = session.run(query, doc_name=doc_name)
-                document = result.single()
-
-                if document:
-                    return Response({'document': document['d']}, status=status.HTTP_200_OK)
-                else:
-                    return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            # Precomputed SIMILAR_TO edges, already ranked (see engine/related_documents.py)
+            related = related_rows(neo4j_connection.execute_read("related_documents", RELATED_QUERY, name=doc_name, k=k))
+            if related is None:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'document': doc_name, 'related': related})
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
 class SearchByNodesView(APIView):
     def get(self, request):
         search_text = request.GET.get("search_text")
-        top_k = int(request.GET.get("top_k", 20))
-
         if not search_text:
             return Response({"error": "'search_text' parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            top_k, limit, fusion = search.search_params(request.GET)
+        except search.SearchParamError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Generate embedding for the search text
-            embedding = self.get_embedding(search_text)
-
-            with neo4j_connection._driver.session() as session:
-                # Query Neo4j for matching documents
-                query = """
-                CALL db.index.vector.queryNodes('entity_embeddings', $top_k, $embedding)
-                YIELD node AS entity_node, score AS entity_score
-                MATCH (entity_node)<-[:MENTIONS]-(doc_entity:Document)
-                WITH doc_entity AS doc, collect({type:'entity', name: entity_node.name, 
-                     score: CASE WHEN entity_node.name = $query THEN 100.0 ELSE entity_score END}) AS matches
-                RETURN doc, matches
-                UNION ALL
-                CALL db.index.vector.queryNodes('organism_embeddings', $top_k, $embedding)
-                YIELD node AS org_node, score AS org_score
-                MATCH (org_node)<-[:MENTIONS_ORGANISM]-(doc_org:Document)
-                WITH doc_org AS doc, collect({type:'organism', name: org_node.name, 
-                     score: CASE WHEN org_node.name = $query THEN 100.0 ELSE org_score END}) AS matches
-                RETURN doc, matches
-                UNION ALL
-                CALL db.index.vector.queryNodes('compound_embeddings', $top_k, $embedding)
-                YIELD node AS cmp_node, score AS cmp_score
-                MATCH (cmp_node)<-[:MENTIONS_COMPOUND]-(doc_cmp:Document)
-                WITH doc_cmp AS doc, collect({type:'compound', name: cmp_node.name, 
-                     score: CASE WHEN cmp_node.name = $query THEN 100.0 ELSE cmp_score END}) AS matches
-                RETURN doc, matches
-                UNION ALL
-                CALL db.index.vector.queryNodes('person_embeddings', $top_k, $embedding)
-                YIELD node AS person_node, score AS person_score
-                MATCH (person_node)<-[:CONTRIBUTED_BY|MENTIONS_PERSON]-(doc_person:Document)
-                WITH doc_person AS doc, collect({type:'person', name: person_node.name, 
-                     score: CASE WHEN person_node.name = $query THEN 100.0 ELSE person_score END}) AS matches
-                RETURN doc, matches
-                """
-                result = session.run(query, parameters={"embedding":embedding , "top_k":top_k, "query":search_text })
-
-                # Aggregate results per document
-                docs = {}
-                for record in result:
-                    doc_name = record["doc"]["name"]
-                    matches = record["matches"]
-                    if doc_name not in docs:
-                        docs[doc_name] = []
-                    docs[doc_name].extend(matches)
-
-                # Compute max score per document
-                final_results = []
-                for doc_name, items in docs.items():
-                    max_score = max([m['score'] for m in items])
-                    final_results.append({
-                        "document": doc_name,
-                        "max_score": max_score
-                    })
-
-                # Sort by max_score descending
-                final_results.sort(key=lambda x: x['max_score'], reverse=True)
-
-            return Response({"results": final_results}, status=status.HTTP_200_OK)
+            # BM25 over sections and names, fused with the four node indexes probed in parallel;
+            # an exact name match is answered without embedding the search text.
+            results, embedded = hybrid_search(
+                retriever, lexical_index, get_query_embedding, search_text,
+                top_k=top_k, limit=limit, method=fusion, weights=settings.SEARCH_FUSION_WEIGHTS,
+                skip_embedding=settings.LEXICAL_SKIP_EMBEDDING,
+            )
+            with span("aggregate"):
+                final_results = [{"document": r["document"], "score": r["score"]} for r in results]
+
+            return Response({"results": final_results, "fusion": fusion, "embedding_skipped": not embedded}, status=status.HTTP_200_OK)
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_embedding(self, text):
-        response = openai.Embedding.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response["data"][0]["embedding"]
\ No newline at end of file
+
+def prometheus_metrics(request):
+    """Per-query Neo4j timings and the other in-process metrics, for a Prometheus scrape."""
+    return HttpResponse(metrics.prometheus_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
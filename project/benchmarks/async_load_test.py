@@ -0,0 +1,107 @@
+"""Throughput of the sync (WSGI) versus async (ASGI) views against local stand-ins.
+
+The embedding client, retriever and LLM are replaced by fakes with fixed
+latencies, so the numbers show how many concurrent requests one worker can
+keep in flight, not Neo4j or OpenAI speed. The sync views are driven from a
+thread pool the size of a WSGI worker's thread count; the async views from
+one event loop.
+
+    python benchmarks/async_load_test.py --requests 200 --concurrency 50 --sync-threads 4
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+
+def configure(embedding_latency, retrieval_latency, llm_latency):
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "nasa_publication_tool.settings",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_EMBEDDING_LATENCY": str(embedding_latency),
+        "RETRIEVAL_BACKEND": "fake",
+        "FAKE_RETRIEVAL_LATENCY": str(retrieval_latency),
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(llm_latency),
+    })
+    import django
+    django.setup()
+
+
+def run_sync(view, make_request, requests, threads):
+    def call(i):
+        response = view(make_request(i))
+        if response.status_code != 200:
+            raise RuntimeError(f"request {i} failed with {response.status_code}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(call, range(requests)))
+    return time.perf_counter() - started
+
+
+def run_async(view, make_request, requests, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with semaphore:
+                response = await view(make_request(i))
+                if response.status_code != 200:
+                    raise RuntimeError(f"request {i} failed with {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*[call(i) for i in range(requests)])
+        return time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def main(requests, concurrency, sync_threads, embedding_latency, retrieval_latency, llm_latency):
+    configure(embedding_latency, retrieval_latency, llm_latency)
+    from django.test import AsyncRequestFactory, RequestFactory
+    from rest_framework.test import APIRequestFactory
+    from base.views import SearchByNodesView
+    from base import async_views as base_async
+    from rag.views import query_and_generate
+    from rag import async_views as rag_async
+
+    # Distinct queries so the query-embedding cache does not hide the embedding latency.
+    factory, async_factory, api_factory = RequestFactory(), AsyncRequestFactory(), APIRequestFactory()
+    scenarios = [
+        (
+            "search-by-nodes",
+            SearchByNodesView.as_view(), lambda i: factory.get("/search-by-nodes/", {"search_text": f"sync query {i}"}),
+            base_async.search_by_nodes, lambda i: async_factory.get("/search-by-nodes/", {"search_text": f"async query {i}"}),
+        ),
+        (
+            "rag/query-and-generate",
+            query_and_generate, lambda i: api_factory.post("/rag/query-and-generate/", {"query": f"sync question {i}"}, format="json"),
+            rag_async.query_and_generate, lambda i: async_factory.post("/rag/query-and-generate/", {"query": f"async question {i}"}, content_type="application/json"),
+        ),
+    ]
+
+    print(f"{requests} requests, fake latencies: embedding {embedding_latency}s, retrieval {retrieval_latency}s, llm {llm_latency}s")
+    print(f"{'endpoint':<24}{'sync req/s':>12}{'async req/s':>13}{'gain':>8}")
+    for name, sync_view, sync_request, async_view, async_request in scenarios:
+        sync_elapsed = run_sync(sync_view, sync_request, requests, sync_threads)
+        async_elapsed = run_async(async_view, async_request, requests, concurrency)
+        sync_rps, async_rps = requests / sync_elapsed, requests / async_elapsed
+        print(f"{name:<24}{sync_rps:>12.1f}{async_rps:>13.1f}{async_rps / sync_rps:>7.1f}x")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Load-test sync vs async views against local stand-ins')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+    parser.add_argument('--concurrency', type=int, default=50, help='In-flight requests for the async views')
+    parser.add_argument('--sync-threads', type=int, default=4, help='Threads serving the sync views')
+    parser.add_argument('--embedding-latency', type=float, default=0.05, help='Fake embedding call latency (s)')
+    parser.add_argument('--retrieval-latency', type=float, default=0.02, help='Fake vector search latency (s)')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Fake LLM completion latency (s)')
+    args = parser.parse_args()
+    main(args.requests, args.concurrency, args.sync_threads, args.embedding_latency, args.retrieval_latency, args.llm_latency)
@@ -0,0 +1,189 @@
+"""Write throughput of the legacy per-document statement versus engine.graph_writer.
+
+Needs a local Neo4j (5.13+ for ``db.create.setNodeVectorProperty``); run it
+against a scratch database. Synthetic documents share entity, organism,
+compound and person pools the way real papers do, so both paths contend on
+the same nodes. All names are prefixed with ``bench-`` and removed before each
+run and at the end.
+
+    python benchmarks/graph_writer.py --documents 500 --batch-sizes 200,1000,5000
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from neo4j import GraphDatabase
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.graph_writer import GraphWriter
+from engine.schema import create_constraints
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+# The statement build_graph ran per document, from 4 threads, before the batched writer.
+LEGACY_QUERY = """
+MERGE (d:Document {name:$name})
+SET d.text = $text, d.summary = $summary
+WITH d
+    UNWIND $sections AS s
+        CREATE (sec:Section {text: s.text, embedding: s.embedding})
+        MERGE (d)-[:HAS_SECTION]->(sec)
+    WITH d
+UNWIND $entities AS e
+    MERGE (ent:Entity {name: e.name})
+    SET ent.embedding = e.embedding
+    MERGE (d)-[:MENTIONS]->(ent)
+WITH d
+UNWIND $organisms AS o
+    MERGE (org:Organism {name: o.name})
+    SET org.embedding = o.embedding
+    MERGE (d)-[:MENTIONS_ORGANISM]->(org)
+WITH d
+UNWIND $compounds AS c
+    MERGE (cmp:Compound {name: c.name})
+    SET cmp.embedding = c.embedding
+    MERGE (d)-[:MENTIONS_COMPOUND]->(cmp)
+WITH d
+UNWIND $contributors AS a
+    MERGE (per:Person {name: a.name})
+    SET per.embedding = a.embedding
+    MERGE (d)-[:CONTRIBUTED_BY]->(per)
+WITH d
+UNWIND $mentioned AS m
+    MERGE (mp:Person {name: m.name})
+    SET mp.embedding = m.embedding
+    MERGE (d)-[:MENTIONS_PERSON]->(mp)
+"""
+
+# record key -> (name prefix, pool size relative to the number of documents, per document)
+SYNTHETIC_LINKS = {
+    "entities": ("entity", 2.0, 10),
+    "organisms": ("organism", 0.05, 2),
+    "compounds": ("compound", 0.2, 2),
+    "contributors": ("person", 0.5, 3),
+    "mentioned": ("mentioned-person", 0.2, 1),
+}
+
+
+def synthetic_records(documents, sections, dimensions, seed=0, as_lists=True):
+    """Records for ``GraphWriter.add``; embeddings are numpy rows unless ``as_lists`` (what Bolt sends)."""
+    rng = np.random.default_rng(seed)
+
+    def vectors(n):
+        v = rng.standard_normal((n, dimensions)).astype(np.float32)
+        v /= np.linalg.norm(v, axis=1, keepdims=True)
+        return v.tolist() if as_lists else list(v)
+
+    pools = {}
+    for key, (prefix, ratio, _) in SYNTHETIC_LINKS.items():
+        size = max(1, int(documents * ratio))
+        pools[key] = list(zip([f"bench-{prefix}-{i}" for i in range(size)], vectors(size)))
+
+    records = []
+    for d in range(documents):
+        record = {
+            "name": f"bench-doc-{d}",
+            "text": "lorem ipsum " * 2000,
+            "summary": "summary " * 200,
+            "sections": [
+                {
+                    "ordinal": s, "heading": f"Section {s}", "text": f"section {s} of bench-doc-{d} " * 100,
+                    "token_count": 150, "content_hash": f"bench-{d}-{s}", "embedding": v,
+                }
+                for s, v in enumerate(vectors(sections))
+            ],
+        }
+        for key, (_, _, per_doc) in SYNTHETIC_LINKS.items():
+            pool = pools[key]
+            picks = rng.choice(len(pool), size=min(per_doc, len(pool)), replace=False)
+            record[key] = dict(pool[i] for i in picks)
+        records.append(record)
+    return records
+
+
+def count_nodes(records):
+    shared = set()
+    for r in records:
+        for key in SYNTHETIC_LINKS:
+            shared.update(r[key])
+    return len(records) + sum(len(r["sections"]) for r in records) + len(shared)
+
+
+def cleanup(driver):
+    with driver.session() as session:
+        session.run(
+            "MATCH (d:Document) WHERE d.name STARTS WITH 'bench-' "
+            "CALL { WITH d OPTIONAL MATCH (d)-[:HAS_SECTION]->(s) DETACH DELETE s, d } IN TRANSACTIONS OF 500 ROWS"
+        )
+        session.run("MATCH (n) WHERE n.name STARTS WITH 'bench-' CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 5000 ROWS")
+
+
+def legacy_write(driver, records, threads):
+    def write(r):
+        with driver.session() as session:
+            session.run(
+                LEGACY_QUERY, name=r["name"], text=r["text"], summary=r["summary"],
+                sections=[{"text": s["text"], "embedding": s["embedding"]} for s in r["sections"]],
+                **{key: [{"name": k, "embedding": v} for k, v in r[key].items()] for key in SYNTHETIC_LINKS},
+            ).consume()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(write, records))
+
+
+def writer_write(driver, records, batch_size, flush_documents):
+    writer = GraphWriter(driver, batch_size=batch_size)
+    for start in range(0, len(records), flush_documents):
+        for record in records[start:start + flush_documents]:
+            writer.add(record)
+        writer.flush()
+    return writer.report()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(documents, sections, dimensions, batch_sizes, flush_documents, threads):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        records = synthetic_records(documents, sections, dimensions)
+        nodes = count_nodes(records)
+        print(f"{documents} documents, {nodes} nodes ({sections} sections/doc, {dimensions}-d embeddings)")
+        print(f"{'path':<28}{'seconds':>10}{'nodes/s':>12}")
+
+        cleanup(driver)
+        elapsed = timed(lambda: legacy_write(driver, records, threads))
+        print(f"{f'legacy ({threads} threads)':<28}{elapsed:>10.2f}{nodes / elapsed:>12.1f}")
+
+        cleanup(driver)
+        create_constraints(driver)
+        for batch_size in batch_sizes:
+            cleanup(driver)
+            elapsed = timed(lambda: writer_write(driver, records, batch_size, flush_documents))
+            print(f"{f'writer (batch {batch_size})':<28}{elapsed:>10.2f}{nodes / elapsed:>12.1f}")
+
+        cleanup(driver)
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare per-document writes with the batched graph writer')
+    parser.add_argument('--documents', type=int, default=500, help='Synthetic documents to write')
+    parser.add_argument('--sections', type=int, default=8, help='Sections per document')
+    parser.add_argument('--dimensions', type=int, default=1536, help='Embedding dimensions')
+    parser.add_argument('--batch-sizes', default='200,1000,5000', help='Comma-separated writer batch sizes')
+    parser.add_argument('--flush-documents', type=int, default=50, help='Documents per writer flush')
+    parser.add_argument('--threads', type=int, default=4, help='Threads for the legacy per-document writes')
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+    main(args.documents, args.sections, args.dimensions, batch_sizes, args.flush_documents, args.threads)
@@ -0,0 +1,161 @@
+"""Legacy per-request fetching versus the pooled, conditional fetcher, on a local stand-in.
+
+A threaded HTTP/1.1 server on localhost serves synthetic PMC-like pages
+(navigation, a large ``<article>``, footer and scripts) with ETag and
+Last-Modified headers, answers conditional requests with 304, and adds a fixed
+per-request latency. Three passes are timed: the old ``requests.get`` +
+``html.parser`` path, a cold run of ``HtmlFetcher`` and a revalidating rerun
+after ``--changed`` of the pages were edited.
+
+    python benchmarks/html_fetcher.py --pages 200 --workers 10 --latency 0.02
+"""
+import hashlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from bs4 import BeautifulSoup
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data_ingestion_pipeline"))
+from fetcher import HtmlFetcher, ValidatorStore
+
+
+def synthetic_page(i, revision, article_kb):
+    paragraph = f"<p>Spaceflight alters gene expression in sample {i}, revision {revision}. " + "lorem ipsum " * 40 + "</p>\n"
+    body = paragraph * max(1, article_kb * 1024 // len(paragraph))
+    nav = "<nav>" + "<a href='/x'>Search NCBI</a>" * 200 + "</nav>"
+    footer = "<footer>" + "<a href='/y'>Dashboard</a>" * 300 + "</footer><script>" + "var x = 1;" * 2000 + "</script>"
+    return f"<html><head><title>Paper {i}</title></head><body>{nav}<article><h1>Paper {i}</h1>{body}</article>{footer}</body></html>"
+
+
+class StandIn:
+    def __init__(self, pages, article_kb, latency):
+        self.latency = latency
+        self.article_kb = article_kb
+        self.revisions = [0] * pages
+        self.modified = formatdate(usegmt=True)
+        self._pages = {}
+        self.requests = 0
+        self.connections = set()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stand_in.requests += 1
+                stand_in.connections.add(self.client_address)
+                time.sleep(stand_in.latency)
+                i = int(self.path.rsplit("/", 1)[-1])
+                body, etag = stand_in.page(i)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", stand_in.modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def page(self, i):
+        key = (i, self.revisions[i])
+        if key not in self._pages:
+            body = synthetic_page(i, self.revisions[i], self.article_kb).encode("utf-8")
+            self._pages[key] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        return self._pages[key]
+
+    def urls(self):
+        host, port = self.server.server_address
+        return [f"http://{host}:{port}/pmc/{i}" for i in range(len(self.revisions))]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+    def reset_counters(self):
+        self.requests = 0
+        self.connections = set()
+
+
+def legacy_fetch(url):
+    started = time.perf_counter()
+    response = requests.get(url, timeout=15)
+    article = BeautifulSoup(response.text, "html.parser").find("article")
+    str(article)
+    return len(response.content), time.perf_counter() - started
+
+
+def run_legacy(urls, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(legacy_fetch, urls))
+    seconds = [s for _, s in results]
+    return {"pages": len(results), "not_modified": 0, "bytes": sum(b for b, _ in results), "mean_s": statistics.fmean(seconds)}
+
+
+def run_fetcher(urls, workers, validators, conditional):
+    fetcher = HtmlFetcher(validators, pool_size=workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda url: fetcher.fetch(url, conditional=conditional), urls))
+    fetcher.close()
+    return fetcher.report()
+
+
+def main(pages, workers, latency, article_kb, changed):
+    with StandIn(pages, article_kb, latency) as stand_in, tempfile.TemporaryDirectory() as tmp:
+        urls = stand_in.urls()
+        validators = ValidatorStore(Path(tmp) / "validators.sqlite")
+        print(f"{pages} pages of ~{article_kb} KB article, {latency * 1000:.0f} ms server latency, {workers} workers")
+        print(f"{'pass':<22}{'seconds':>9}{'ms/page':>9}{'MB':>8}{'304s':>6}{'conns':>7}")
+
+        passes = [
+            ("legacy", lambda: run_legacy(urls, workers)),
+            ("fetcher cold", lambda: run_fetcher(urls, workers, validators, conditional=False)),
+            (f"revalidate ({changed:.0%} new)", lambda: run_fetcher(urls, workers, validators, conditional=True)),
+        ]
+        for name, run in passes:
+            if name.startswith("revalidate"):
+                for i in range(0, pages, max(1, round(1 / changed)) if changed else pages + 1):
+                    stand_in.revisions[i] += 1
+            stand_in.reset_counters()
+            started = time.perf_counter()
+            report = run()
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name:<22}{elapsed:>9.2f}{report['mean_s'] * 1000:>9.1f}{report['bytes'] / 1e6:>8.2f}"
+                f"{report['not_modified']:>6}{len(stand_in.connections):>7}"
+            )
+        validators.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the HTML fetcher against a local HTTP stand-in')
+    parser.add_argument('--pages', type=int, default=200, help='Synthetic pages served')
+    parser.add_argument('--workers', type=int, default=10, help='Concurrent fetches (and pool size)')
+    parser.add_argument('--latency', type=float, default=0.02, help='Server latency per request (s)')
+    parser.add_argument('--article-kb', type=int, default=150, help='Approximate article size')
+    parser.add_argument('--changed', type=float, default=0.1, help='Fraction of pages edited before revalidating')
+    args = parser.parse_args()
+    main(args.pages, args.workers, args.latency, args.article_kb, args.changed)
@@ -0,0 +1,316 @@
+"""In-memory stand-in for the Neo4j driver, for benchmarks without a database.
+
+``MemoryDriver`` answers the statements the API and the ingestion writer send
+(``engine.graph_writer``, ``engine.retrieval``, ``engine.graph_version`` and the
+catalog listings of ``base.catalog``) from dicts, with brute-force numpy vector
+search scored like Neo4j's cosine indexes, ``(1 + cos) / 2``. Statements are
+matched on their text, so a query that changes without this module following
+raises ``NotImplementedError`` rather than benchmarking something else.
+``engine.database.Database`` wraps it like a real driver, so query metrics and
+spans are recorded as usual.
+"""
+import bisect
+import itertools
+import re
+import sys
+import threading
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine import graph_writer
+from engine.graph_version import BUMP_QUERY, READ_QUERY
+from engine.retrieval import (
+    DOCUMENT_MATCH_QUERY, NEIGHBOURS_QUERY, RERANK_DOCUMENT_MATCH_QUERY, RERANK_SECTION_QUERY, SECTION_QUERY,
+)
+from engine.vector_index import NODE_LABELS, SECTION_LABEL, normalize_rows, top_k
+
+CATEGORY_QUERY = re.compile(r"MATCH \(n:`((?:[^`]|``)+)`\) WHERE .* AS properties, elementId\(n\) AS element_id ORDER BY ", re.S)
+LABELS_QUERY = "CALL db.labels()"
+
+
+class Summary:
+    result_available_after = None
+    result_consumed_after = None
+
+
+class Result:
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def consume(self):
+        return Summary()
+
+
+class Transaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, parameters=None, **kwargs):
+        return Result(self.graph.run(query, {**(parameters or {}), **kwargs}))
+
+
+class Session:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, parameters=None, **kwargs):
+        return Transaction(self.graph).run(query, parameters, **kwargs)
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(Transaction(self.graph), *args, **kwargs)
+
+    execute_write = execute_read
+
+    def close(self):
+        pass
+
+
+class MemoryDriver:
+    def __init__(self, graph=None):
+        self.graph = graph or MemoryGraph()
+
+    def session(self, **config):
+        return Session(self.graph)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryGraph:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.documents = {}  # name -> properties
+        self.nodes = {label: {} for label in NODE_LABELS}  # label -> name -> properties
+        self.sections = {}  # id (any unique key for sections without one) -> properties
+        self.doc_sections = {}  # document -> {section key}
+        self.links = {}  # rel -> name -> {document}
+        self.doc_links = {}  # document -> {(rel, name)}
+        self.version = 0
+        self._ids = {}
+        self._next_id = itertools.count()
+        self._matrices = {}  # label -> (keys, normalized embeddings)
+        self._sorted = {}  # label -> sorted names
+        self._statements = self._statement_table()
+
+    def _statement_table(self):
+        table = {
+            graph_writer.CLEAR_QUERY: self._clear,
+            graph_writer.DOCUMENT_QUERY: self._merge_documents,
+            graph_writer.SECTION_QUERY: self._merge_sections,
+            graph_writer.SECTION_HASHES_QUERY: self._section_hashes,
+            READ_QUERY: self._read_version,
+            BUMP_QUERY: self._bump_version,
+            SECTION_QUERY: self._search_sections,
+            RERANK_SECTION_QUERY: self._section_candidates,
+            NEIGHBOURS_QUERY: self._neighbours,
+        }
+        for label, rels in NODE_LABELS.items():
+            table[graph_writer.NODE_QUERY.format(label=label)] = partial(self._merge_nodes, label)
+            table[DOCUMENT_MATCH_QUERY.replace("{rel}", "|".join(rels))] = partial(self._document_matches, label)
+            table[RERANK_DOCUMENT_MATCH_QUERY.replace("{rel}", "|".join(rels))] = partial(self._document_candidates, label)
+        for label, rel in graph_writer.LINKED_NODES.values():
+            table[graph_writer.LINK_QUERY.format(label=label, rel=rel)] = partial(self._link, label, rel)
+        return table
+
+    def run(self, query, params):
+        with self._lock:
+            statement = self._statements.get(query)
+            if statement is not None:
+                return statement(params)
+            if query.startswith(LABELS_QUERY):
+                return self._labels()
+            match = CATEGORY_QUERY.match(query)
+            if match:
+                return self._category(match.group(1).replace("``", "`"), params)
+        raise NotImplementedError(f"No in-memory equivalent for: {query.strip().splitlines()[0]}")
+
+    def _changed(self, label):
+        self._matrices.pop(label, None)
+        self._sorted.pop(label, None)
+
+    def _id(self, label, key):
+        return self._ids.setdefault((label, key), next(self._next_id))
+
+    def _store(self, label):
+        if label == "Document":
+            return self.documents
+        if label == SECTION_LABEL:
+            return self.sections
+        return self.nodes.get(label, {})
+
+    # Writes (engine.graph_writer, engine.graph_version)
+
+    def _clear(self, params):
+        for row in params["rows"]:
+            name = row["name"]
+            if name not in self.documents:
+                continue
+            keep = set(row["keep"])
+            stale = {key for key in self.doc_sections.get(name, ()) if self.sections[key].get("id") not in keep}
+            for section in stale:
+                del self.sections[section]
+            if stale:
+                self.doc_sections[name] -= stale
+                self._changed(SECTION_LABEL)
+            for rel, node in self.doc_links.pop(name, ()):
+                self.links[rel][node].discard(name)
+        return []
+
+    def _merge_documents(self, params):
+        for row in params["rows"]:
+            document = self.documents.setdefault(row["name"], {"name": row["name"]})
+            document.update(text=row["text"], summary=row["summary"])
+        self._changed("Document")
+        return []
+
+    def _merge_nodes(self, label, params):
+        nodes = self.nodes[label]
+        for row in params["rows"]:
+            node = nodes.setdefault(row["name"], {"name": row["name"]})
+            if row["aliases"]:
+                known = node.setdefault("aliases", [])
+                known.extend(a for a in row["aliases"] if a not in known)
+            node["embedding"] = np.asarray(row["embedding"], dtype=np.float32)
+            node["embedding_int8"], node["embedding_scale"] = row["embedding_int8"], row["embedding_scale"]
+        self._changed(label)
+        return []
+
+    def _merge_sections(self, params):
+        for row in params["rows"]:
+            if row["doc"] not in self.documents:
+                continue
+            self.sections[row["id"]] = {
+                "id": row["id"], "text": row["text"], "doc": row["doc"], "ordinal": row["ordinal"],
+                "heading": row["heading"], "token_count": row["token_count"], "content_hash": row["content_hash"],
+                "embedding": np.asarray(row["embedding"], dtype=np.float32),
+                "embedding_int8": row["embedding_int8"], "embedding_scale": row["embedding_scale"],
+            }
+            self.doc_sections.setdefault(row["doc"], set()).add(row["id"])
+        self._changed(SECTION_LABEL)
+        return []
+
+    def _section_hashes(self, params):
+        sections = (self.sections[key] for key in self.doc_sections.get(params["doc"], ()))
+        return [{"ordinal": s["ordinal"], "content_hash": s["content_hash"]} for s in sections if s.get("id") is not None]
+
+    def _link(self, label, rel, params):
+        nodes = self.nodes[label]
+        for row in params["rows"]:
+            if row["doc"] in self.documents and row["name"] in nodes:
+                self.links.setdefault(rel, {}).setdefault(row["name"], set()).add(row["doc"])
+                self.doc_links.setdefault(row["doc"], set()).add((rel, row["name"]))
+        return []
+
+    def _bump_version(self, params):
+        self.version += 1
+        return [{"version": self.version}]
+
+    # Reads (engine.retrieval, engine.graph_version, base.catalog)
+
+    def _read_version(self, params):
+        return [{"version": self.version}] if self.version else []
+
+    def _labels(self):
+        return [{"label": label} for label in ["Document", *NODE_LABELS] if self._store(label)]
+
+    def _sorted_names(self, label):
+        if label not in self._sorted:
+            self._sorted[label] = sorted(name for name, node in self._store(label).items() if node.get("name") is not None)
+        return self._sorted[label]
+
+    def _category(self, label, params):
+        if params["after_id"] is not None:
+            # Nodes are keyed by name here, so there are no nameless ones to list.
+            return []
+        store, names = self._store(label), self._sorted_names(label)
+        start = 0 if params["after"] is None else bisect.bisect_right(names, params["after"])
+        records = []
+        for name in names[start:start + params["fetch"]]:
+            node = store[name]
+            if params["fields"]:
+                properties = [[k, node[k]] for k in params["fields"] if node.get(k) is not None]
+            else:
+                properties = [[k, v] for k, v in node.items() if k not in params["excluded"]]
+            records.append({
+                "id": self._id(label, name), "labels": [label], "name": name, "properties": properties,
+                "element_id": str(self._id(label, name)),
+            })
+        return records
+
+    def _matrix(self, label):
+        if label not in self._matrices:
+            store = self._store(label)
+            keys = [key for key, node in store.items() if node.get("embedding") is not None]
+            matrix = normalize_rows(np.stack([store[key]["embedding"] for key in keys])) if keys else np.empty((0, 0))
+            self._matrices[label] = (keys, matrix)
+        return self._matrices[label]
+
+    def _nearest(self, label, embedding, k):
+        keys, matrix = self._matrix(label)
+        idx, scores = top_k(matrix, np.asarray(embedding, dtype=np.float32), k)
+        return [(keys[i], (1.0 + float(score)) / 2.0) for i, score in zip(idx, scores)]
+
+    def _document_matches(self, label, params):
+        scores, names = {}, {}
+        for name, score in self._nearest(label, params["embedding"], params["top_k"]):
+            if name == params["query"]:
+                score = params["exact_score"]
+            for rel in NODE_LABELS[label]:
+                for document in self.links.get(rel, {}).get(name, ()):
+                    scores[document] = max(scores.get(document, float("-inf")), score)
+                    names.setdefault(document, []).append(name)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:params["limit"]]
+        return [{"document": document, "score": score, "names": names[document]} for document, score in ranked]
+
+    def _document_candidates(self, label, params):
+        records = []
+        for name, score in self._nearest(label, params["embedding"], params["candidates"]):
+            node = self.nodes[label][name]
+            documents = [d for rel in NODE_LABELS[label] for d in self.links.get(rel, {}).get(name, ())]
+            if documents:
+                records.append({
+                    "name": name, "score": score, "codes": node.get("embedding_int8"),
+                    "scale": node.get("embedding_scale"), "documents": documents,
+                })
+        return records
+
+    def _search_sections(self, params, k="top_k"):
+        records = []
+        for key, score in self._nearest(SECTION_LABEL, params["embedding"], params[k]):
+            section = self.sections[key]
+            if section["doc"] in self.documents:
+                records.append({
+                    "doc_name": section["doc"], "section_text": section["text"], "ordinal": section["ordinal"],
+                    "heading": section["heading"], "section_score": score,
+                    "codes": section.get("embedding_int8"), "scale": section.get("embedding_scale"),
+                })
+        return records
+
+    def _section_candidates(self, params):
+        return self._search_sections(params, k="candidates")
+
+    def _neighbours(self, params):
+        sections = [self.sections[key] for key in self.doc_sections.get(params["doc"], ())]
+        return [
+            {"doc_name": s["doc"], "section_text": s["text"], "ordinal": s["ordinal"], "heading": s["heading"]}
+            for s in sorted(sections, key=lambda s: s["ordinal"])
+            if s["ordinal"] is not None and params["low"] <= s["ordinal"] <= params["high"]
+        ]
@@ -0,0 +1,177 @@
+"""Latency of the legacy four-way UNION search versus engine.search's fused probes.
+
+Needs a local Neo4j. ``--populate`` writes a synthetic graph (random unit
+embeddings, names prefixed with ``bench-``) so run it against a scratch
+database; ``--cleanup`` removes it again.
+
+    python benchmarks/search_fusion.py --populate --documents 10000 --queries 50
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from neo4j import GraphDatabase
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.retrieval import NODE_INDEXES, Neo4jRetriever
+from engine.search import search_documents
+from engine.vector_index import NODE_LABELS
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+DIMENSIONS = 1536
+
+# The query SearchByNodesView ran before the fused search.
+LEGACY_QUERY = """
+CALL db.index.vector.queryNodes('entity_embeddings', $top_k, $embedding)
+YIELD node AS entity_node, score AS entity_score
+MATCH (entity_node)<-[:MENTIONS]-(doc_entity:Document)
+WITH doc_entity AS doc, collect({type:'entity', name: entity_node.name,
+     score: CASE WHEN entity_node.name = $query THEN 100.0 ELSE entity_score END}) AS matches
+RETURN doc, matches
+UNION ALL
+CALL db.index.vector.queryNodes('organism_embeddings', $top_k, $embedding)
+YIELD node AS org_node, score AS org_score
+MATCH (org_node)<-[:MENTIONS_ORGANISM]-(doc_org:Document)
+WITH doc_org AS doc, collect({type:'organism', name: org_node.name,
+     score: CASE WHEN org_node.name = $query THEN 100.0 ELSE org_score END}) AS matches
+RETURN doc, matches
+UNION ALL
+CALL db.index.vector.queryNodes('compound_embeddings', $top_k, $embedding)
+YIELD node AS cmp_node, score AS cmp_score
+MATCH (cmp_node)<-[:MENTIONS_COMPOUND]-(doc_cmp:Document)
+WITH doc_cmp AS doc, collect({type:'compound', name: cmp_node.name,
+     score: CASE WHEN cmp_node.name = $query THEN 100.0 ELSE cmp_score END}) AS matches
+RETURN doc, matches
+UNION ALL
+CALL db.index.vector.queryNodes('person_embeddings', $top_k, $embedding)
+YIELD node AS person_node, score AS person_score
+MATCH (person_node)<-[:CONTRIBUTED_BY|MENTIONS_PERSON]-(doc_person:Document)
+WITH doc_person AS doc, collect({type:'person', name: person_node.name,
+     score: CASE WHEN person_node.name = $query THEN 100.0 ELSE person_score END}) AS matches
+RETURN doc, matches
+"""
+
+# node type -> (label, pool size relative to the number of documents, mentions per document)
+SYNTHETIC_NODES = {
+    "entity": ("Entity", 2.0, 10),
+    "organism": ("Organism", 0.05, 2),
+    "compound": ("Compound", 0.2, 2),
+    "person": ("Person", 0.5, 3),
+}
+
+
+def random_unit_vectors(rng, n):
+    vectors = rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def populate(driver, documents, seed=0, batch_size=500):
+    rng = np.random.default_rng(seed)
+    with driver.session() as session:
+        for label in ["Document"] + [label for label, _, _ in SYNTHETIC_NODES.values()]:
+            session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.name)")
+        session.run("UNWIND range(0, $n - 1) AS i MERGE (:Document {name: 'bench-doc-' + i})", n=documents)
+        for node_type, (label, ratio, per_doc) in SYNTHETIC_NODES.items():
+            index = NODE_INDEXES[node_type][0]
+            rel = NODE_LABELS[label][0]
+            pool = max(1, int(documents * ratio))
+            print(f"Writing {pool} {label} nodes...")
+            for start in range(0, pool, batch_size):
+                count = min(batch_size, pool - start)
+                rows = [
+                    {"name": f"bench-{node_type}-{start + i}", "embedding": vec.tolist()}
+                    for i, vec in enumerate(random_unit_vectors(rng, count))
+                ]
+                session.run(f"UNWIND $rows AS row MERGE (n:{label} {{name: row.name}}) SET n.embedding = row.embedding", rows=rows)
+            links = [
+                {"doc": f"bench-doc-{d}", "node": f"bench-{node_type}-{n}"}
+                for d in range(documents)
+                for n in rng.choice(pool, size=min(per_doc, pool), replace=False)
+            ]
+            for start in range(0, len(links), batch_size * 10):
+                session.run(
+                    f"UNWIND $rows AS row MATCH (d:Document {{name: row.doc}}) MATCH (n:{label} {{name: row.node}}) MERGE (d)-[:{rel}]->(n)",
+                    rows=links[start:start + batch_size * 10],
+                )
+            session.run(
+                f"CREATE VECTOR INDEX {index} IF NOT EXISTS FOR (n:{label}) ON (n.embedding) "
+                f"OPTIONS {{indexConfig: {{`vector.dimensions`: {DIMENSIONS}, `vector.similarity_function`: 'cosine'}}}}"
+            )
+        session.run("CALL db.awaitIndexes(600)")
+
+
+def cleanup(driver):
+    with driver.session() as session:
+        session.run("MATCH (n) WHERE n.name STARTS WITH 'bench-' CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 5000 ROWS")
+
+
+def legacy_search(driver, embedding, query, top_k):
+    with driver.session() as session:
+        result = session.run(LEGACY_QUERY, embedding=embedding, top_k=top_k, query=query)
+        docs = {}
+        for record in result:
+            docs.setdefault(record["doc"]["name"], []).extend(record["matches"])
+        final_results = [{"document": d, "max_score": max(m["score"] for m in items)} for d, items in docs.items()]
+        final_results.sort(key=lambda x: x["max_score"], reverse=True)
+        return final_results
+
+
+def timed(fn, runs):
+    latencies = []
+    for args in runs:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def main(documents, queries, top_k, limit, fusion, do_populate, do_cleanup):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        if do_populate:
+            populate(driver, documents)
+        retriever = Neo4jRetriever(driver)
+        rng = np.random.default_rng(1)
+        runs = [(vec.tolist(), "bench-query") for vec in random_unit_vectors(rng, queries)]
+
+        # Warm up both paths so plan caching does not skew the first run.
+        legacy_search(driver, runs[0][0], runs[0][1], top_k)
+        search_documents(retriever, runs[0][0], runs[0][1], top_k=top_k, limit=limit, method=fusion)
+
+        legacy = timed(lambda e, q: legacy_search(driver, e, q, top_k), runs)
+        fused = timed(lambda e, q: search_documents(retriever, e, q, top_k=top_k, limit=limit, method=fusion), runs)
+        print(f"{'path':<10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for name, stats in (("legacy", legacy), ("fused", fused)):
+            print(f"{name:<10}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['mean_ms']:>10.1f}")
+        print(f"speedup (p50): {legacy['p50_ms'] / fused['p50_ms']:.2f}x")
+
+        if do_cleanup:
+            cleanup(driver)
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare legacy UNION search with the fused parallel search')
+    parser.add_argument('--documents', type=int, default=10000, help='Synthetic documents to create with --populate')
+    parser.add_argument('--queries', type=int, default=50, help='Number of timed queries per path')
+    parser.add_argument('--top-k', type=int, default=20, help='Nearest nodes per vector index')
+    parser.add_argument('--limit', type=int, default=50, help='Documents returned by the fused search')
+    parser.add_argument('--fusion', default='max', help='Fusion method for the fused search')
+    parser.add_argument('--populate', action='store_true', help='Write the synthetic graph first')
+    parser.add_argument('--cleanup', action='store_true', help='Delete the synthetic graph afterwards')
+    args = parser.parse_args()
+    main(args.documents, args.queries, args.top_k, args.limit, args.fusion, args.populate, args.cleanup)
@@ -0,0 +1,310 @@
+"""Latency and throughput of the main endpoints and the ingestion writer at several corpus sizes.
+
+For each scale a synthetic corpus (the pools of ``benchmarks/graph_writer.py``:
+shared entities, organisms, compounds and people, ``--sections`` sections per
+document, random unit embeddings) is written through
+``engine.graph_writer.GraphWriter`` and indexed for BM25. Then
+``SearchByNodesView``, ``query_and_generate`` and ``GetCategoryView`` are
+driven with distinct requests, so neither the query-embedding cache, the
+answer cache nor the response cache hides the work. Embeddings and the LLM
+are the fake backends with the given latencies. The graph is the in-memory
+stand-in of ``benchmarks/memory_graph.py``, or with ``--backend neo4j`` a
+scratch Neo4j at ``NEO4J_URI``; there, names prefixed with ``bench-`` are
+removed before each scale and at the end. ``--index-dimensions`` stores the
+embeddings compact (see ``engine.embedding_storage``) to compare layouts.
+
+Results go to ``--output`` as JSON together with the commit they were taken
+at; ``--baseline`` prints the change against an earlier file.
+
+    python benchmarks/suite.py --scales 100,1000,5000 --requests 200 --output bench.json
+    python benchmarks/suite.py --backend neo4j --scales 1000 --baseline bench-main.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+SCENARIOS = ("search_by_nodes", "query_and_generate", "get_category")
+
+
+def configure(dimensions, index_dimensions, embedding_latency, llm_latency, llm_token_latency):
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "nasa_publication_tool.settings",
+        "NEO4J_SCHEMA_ON_STARTUP": "0",
+        "EMBEDDING_BACKEND": "fake",
+        "EMBEDDING_DIMENSIONS": str(dimensions),
+        "EMBEDDING_INDEX_DIMENSIONS": str(index_dimensions or dimensions),
+        "FAKE_EMBEDDING_LATENCY": str(embedding_latency),
+        "RETRIEVAL_BACKEND": "neo4j",
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_FIRST_TOKEN_DELAY": str(llm_latency),
+        "FAKE_LLM_TOKEN_DELAY": str(llm_token_latency),
+        "RAG_ANSWER_CACHE_SIZE": "0",
+    })
+    import django
+    django.setup()
+
+
+def git_metadata():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def open_graph(backend, index_dimensions):
+    """``(driver, reset)``; ``reset()`` empties the benchmark's part of the graph."""
+    from graph_writer import cleanup
+    if backend == "memory":
+        from memory_graph import MemoryDriver, MemoryGraph
+        driver = MemoryDriver()
+
+        def reset():
+            driver.graph = MemoryGraph()
+        return driver, reset
+
+    from neo4j import GraphDatabase
+    from engine.schema import migrate
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    migrate(driver, index_dimensions, wait=True)
+    return driver, lambda: cleanup(driver)
+
+
+def lexical_units(records):
+    """``(sections, names)`` for ``engine.lexical_index.write_index``, as built from the graph."""
+    from engine.graph_writer import LINKED_NODES
+    sections = [(r["name"], s["text"]) for r in records for s in r["sections"]]
+    linked = {}
+    for r in records:
+        for key, (label, _) in LINKED_NODES.items():
+            for name in r[key]:
+                linked.setdefault((label, name), set()).add(r["name"])
+    names = [("Document", r["name"], [r["name"]]) for r in records]
+    names.extend((label, name, sorted(docs)) for (label, name), docs in linked.items())
+    return sections, names
+
+
+def wire(db, lexical_path):
+    """Point the views and the graph version tracker at ``db`` instead of the configured Neo4j."""
+    from engine.lexical_index import LexicalIndex
+    from engine.retrieval import Neo4jRetriever
+    from nasa_publication_tool import wsgi
+    from base import views
+    from rag import views as rag_views
+
+    retriever = Neo4jRetriever(db)
+    wsgi.neo4j_connection = views.neo4j_connection = db
+    views.retriever = rag_views.retriever = retriever
+    views.lexical_index = LexicalIndex(lexical_path) if lexical_path else None
+    wsgi.graph_version.refresh()
+
+
+def summarize(latencies, elapsed, errors, spans):
+    ms = np.asarray(latencies) * 1000
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(float(ms.mean()), 3) if count else None,
+        **{f"p{q}_ms": round(float(np.percentile(ms, q)), 3) if count else None for q in (50, 95, 99)},
+        "max_ms": round(float(ms.max()), 3) if count else None,
+        # Mean time per request in each span of engine.profiling (only the serving thread's spans).
+        "spans_ms": {name: round(total * 1000 / count, 3) for name, total in spans.items()} if count else {},
+    }
+
+
+def measure(view, make_request, requests, warmup, threads):
+    from engine import profiling
+
+    def call(i):
+        timings, token = profiling.begin()
+        started = time.perf_counter()
+        try:
+            response = view(make_request(i))
+            if hasattr(response, "render"):
+                response.render()
+        finally:
+            profiling.end(token)
+        return time.perf_counter() - started, response.status_code, timings
+
+    for i in range(warmup):
+        call(requests + i)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    spans = {}
+    for _, _, timings in outcomes:
+        for name, (seconds, _) in timings.spans.items():
+            spans[name] = spans.get(name, 0.0) + seconds
+    errors = sum(1 for _, code, _ in outcomes if code != 200)
+    return summarize([seconds for seconds, _, _ in outcomes], elapsed, errors, spans)
+
+
+def scenarios(records):
+    from django.test import RequestFactory
+    from rest_framework.test import APIRequestFactory
+    from base.views import GetCategoryView, SearchByNodesView
+    from rag.views import query_and_generate
+
+    factory, api_factory = RequestFactory(), APIRequestFactory()
+    documents = [r["name"] for r in records]
+    entities = sorted({name for r in records for name in r["entities"]})
+    get_category = GetCategoryView.as_view()
+    return {
+        # Section words make the lexical index score something; the number keeps every query distinct.
+        "search_by_nodes": (SearchByNodesView.as_view(), lambda i: factory.get(
+            "/search-by-nodes/", {"search_text": f"section {i % 8} of {documents[i % len(documents)]} {i}"},
+        )),
+        "query_and_generate": (query_and_generate, lambda i: api_factory.post(
+            "/rag/query-and-generate/", {"query": f"What does {documents[i % len(documents)]} report? ({i})"}, format="json",
+        )),
+        # Keyset pages starting at successive names: every request is a response-cache miss.
+        "get_category": (lambda request: get_category(request, pk="Entity"), lambda i: factory.get(
+            "/get-category/Entity/", {"limit": 50, "after": entities[i % len(entities)], "i": i},
+        )),
+    }
+
+
+def write_corpus(driver, records, batch_size, flush_documents):
+    from graph_writer import count_nodes, writer_write
+    from engine.graph_version import bump_graph_version
+
+    started = time.perf_counter()
+    report = writer_write(driver, records, batch_size, flush_documents)
+    elapsed = time.perf_counter() - started
+    bump_graph_version(driver)
+    return {
+        "documents": len(records),
+        "nodes": count_nodes(records),
+        "seconds": round(elapsed, 3),
+        "documents_per_s": round(len(records) / elapsed, 1),
+        "nodes_per_s": round(count_nodes(records) / elapsed, 1),
+        "transactions": report["transactions"],
+    }
+
+
+def run_scale(driver, reset, scale, args):
+    from graph_writer import synthetic_records
+    from engine.database import Database
+    from engine.lexical_index import write_index
+
+    reset()
+    records = synthetic_records(scale, args.sections, args.dimensions, seed=scale, as_lists=args.backend == "neo4j")
+    results = [{"scale": scale, "scenario": "graph_writer", **write_corpus(driver, records, args.batch_size, args.flush_documents)}]
+
+    with tempfile.TemporaryDirectory(prefix="bench-lexical-") as lexical_path:
+        if args.lexical:
+            write_index(lexical_path, *lexical_units(records))
+        wire(Database(driver), lexical_path if args.lexical else None)
+        for name, (view, make_request) in scenarios(records).items():
+            if name in args.scenarios:
+                stats = measure(view, make_request, args.requests, args.warmup, args.threads)
+                results.append({"scale": scale, "scenario": name, **stats})
+    return results
+
+
+def print_row(row):
+    if row["scenario"] == "graph_writer":
+        print(f"{row['scale']:>8}  {row['scenario']:<20}{row['seconds'] * 1000:>10.1f}ms total"
+              f"{row['documents_per_s']:>12.1f} docs/s{row['nodes_per_s']:>12.1f} nodes/s")
+    else:
+        print(f"{row['scale']:>8}  {row['scenario']:<20}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['throughput_rps']:>10.1f}{row['errors']:>8}")
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    previous = {(r["scale"], r["scenario"]): r for r in baseline["results"]}
+    print(f"\nagainst {baseline_path} ({(baseline['meta'].get('commit') or 'unknown')[:12]}); ratios above 1 are faster")
+    for row in results:
+        old = previous.get((row["scale"], row["scenario"]))
+        if old is None:
+            continue
+        if row["scenario"] == "graph_writer":
+            print(f"{row['scale']:>8}  {row['scenario']:<20}throughput x{row['documents_per_s'] / old['documents_per_s']:.2f}")
+        elif row["p50_ms"] and old["p50_ms"]:
+            print(f"{row['scale']:>8}  {row['scenario']:<20}p50 x{old['p50_ms'] / row['p50_ms']:.2f}"
+                  f"  p95 x{old['p95_ms'] / row['p95_ms']:.2f}  throughput x{row['throughput_rps'] / old['throughput_rps']:.2f}")
+
+
+def main(args):
+    configure(args.dimensions, args.index_dimensions, args.embedding_latency, args.llm_latency, args.llm_token_latency)
+    driver, reset = open_graph(args.backend, args.index_dimensions or args.dimensions)
+    meta = {
+        **git_metadata(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+    }
+    print(f"{args.backend} backend; fake latencies: embedding {args.embedding_latency}s, llm {args.llm_latency}s")
+    print(f"{'scale':>8}  {'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    results = []
+    try:
+        for scale in args.scales:
+            for row in run_scale(driver, reset, scale, args):
+                print_row(row)
+                results.append(row)
+    finally:
+        if args.backend == "neo4j":
+            reset()
+        driver.close()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+        print(f"\nwrote {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the search, RAG and catalog endpoints and the graph writer')
+    parser.add_argument('--backend', choices=('memory', 'neo4j'), default='memory', help='In-memory graph or a local Neo4j')
+    parser.add_argument('--scales', default='100,1000,5000', help='Comma-separated corpus sizes (documents)')
+    parser.add_argument('--sections', type=int, default=4, help='Sections per document')
+    parser.add_argument('--dimensions', type=int, default=1536, help='Embedding dimensions')
+    parser.add_argument('--index-dimensions', type=int, default=0,
+                        help='Store embeddings compact with this many indexed dimensions (see engine.embedding_storage)')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint and scale')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests before each endpoint')
+    parser.add_argument('--threads', type=int, default=1, help='Concurrent requests')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated endpoints to measure')
+    parser.add_argument('--no-lexical', dest='lexical', action='store_false', help='Search without the BM25 index')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Graph writer batch size')
+    parser.add_argument('--flush-documents', type=int, default=200, help='Documents per writer flush')
+    parser.add_argument('--embedding-latency', type=float, default=0.0, help='Fake embedding call latency (s)')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Fake LLM first-token latency (s)')
+    parser.add_argument('--llm-token-latency', type=float, default=0.0, help='Fake LLM per-token latency (s)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+    args.scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    main(args)
@@ -0,0 +1,8 @@
+"""Lets pytest run the Django test modules (``python -m pytest`` from this directory)."""
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nasa_publication_tool.settings")
+os.environ.setdefault("NEO4J_SCHEMA_ON_STARTUP", "0")
+django.setup()
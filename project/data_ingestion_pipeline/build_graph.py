@@ -1,10 +1,21 @@
+import asyncio
 import json
 import os
-import openai
-from langchain.text_splitter import RecursiveCharacterTextSplitter, Language
+import sys
 from pathlib import Path
 from neo4j import GraphDatabase
-from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.canonicalize import DEFAULT_THRESHOLD, Canonicalizer
+from engine.chunking import chunk_markdown
+from engine.embeddings import get_embedding_service
+from engine.vector_index import refresh_snapshot
+from engine.lexical_index import build_lexical_index
+from engine.related_documents import compute_related
+from engine.graph_version import bump_graph_version
+from engine.scheduler import create_scheduler
+from engine.graph_writer import LINKED_NODES, GraphWriter, section_hashes
+from engine.schema import migrate
 
 NEO4J_URI = "neo4j://127.0.0.1:7687"
 NEO4J_USER = "neo4j"
@@ -13,18 +24,21 @@ NEO4J_PASSWORD = "123456789"
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
 docs_path = Path("cleaned_data")
-documents = {file.name: file.read_text(encoding="utf-8") for file in docs_path.glob("*.txt")}
 
+# Documents accumulated before the writer flushes, and rows per write transaction.
+FLUSH_DOCUMENTS = int(os.environ.get("GRAPH_FLUSH_DOCUMENTS", 50))
+WRITE_BATCH_SIZE = int(os.environ.get("GRAPH_WRITE_BATCH_SIZE", 1000))
 
-def get_embedding(text):
-    response = openai.Embedding.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return response["data"][0]["embedding"]
+embedding_service = get_embedding_service()
 
+# Extracted names are mapped onto existing nodes (see engine.canonicalize) unless CANONICALIZE_NAMES=0.
+canonicalizer = (
+    Canonicalizer(float(os.environ.get("CANONICAL_SIMILARITY", DEFAULT_THRESHOLD)))
+    if os.environ.get("CANONICALIZE_NAMES", "1").lower() in ("1", "true", "yes") else None
+)
 
-def extract_entities(text):
+
+async def extract_entities(text, scheduler):
     prompt = f"""
         Extract key scientific **entities** (topics, equipment, methods, institutions, research areas, techniques, gene, concept etc).
 
@@ -52,13 +66,12 @@ def extract_entities(text):
         Text: {text}
     """
 
-    response = openai.ChatCompletion.create(
+    content = await scheduler.chat(
+        [{"role": "user", "content": prompt}],
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        expected_output_tokens=1024,
         temperature=0
     )
-
-    content = response.choices[0].message["content"].strip()
     print(content)
     try:
         data = json.loads(content)
@@ -71,22 +84,7 @@ def extract_entities(text):
         return [], [], [], {"contributors": [], "mentioned_persons": []}
 
 
-def add_document_with_entities(doc_name, text, entities, organisms, compounds, persons):
-
-    splitter = RecursiveCharacterTextSplitter.from_language(language=Language.MARKDOWN, chunk_size=10000, chunk_overlap=500)
-    sections = splitter.split_text(text)
-
-    section_embeddings = [get_embedding(section) for section in sections]
-
-    entity_embeddings = {e: get_embedding(e) for e in entities}
-    organism_embeddings = {o: get_embedding(o) for o in organisms}
-    compound_embeddings = {c: get_embedding(c) for c in compounds}
-    contributor_embeddings = {p: get_embedding(p) for p in persons["contributors"]}
-    mentioned_embeddings = {
-        p: get_embedding(p) for p in persons["mentioned_persons"]
-        if p not in persons["contributors"]
-    }
-
+async def summarize_document(text, scheduler):
     system_prompt = """You are an expert science summarizer for technical audiences. You will be provided with scientific publications (text, abstracts, sections, figures, and tables) related to NASA’s biological and physical sciences research. Your goal is to generate a detailed summary that condenses the paper without losing essential scientific content.
 
 Requirements for the summary:
@@ -103,103 +101,126 @@ Important Notes:
  - Include information on diversity, specificity, phosphorylation, dimerization, or other key molecular/biochemical mechanisms where relevant.
  - Summaries should allow a reader to grasp the full scientific content and implications without reading the full paper, but still include enough detail to understand experimental reasoning, evidence, and context.
 """
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[
+    return await scheduler.chat(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": text}
         ],
+        model="gpt-4o-mini",
+        expected_output_tokens=2048,
         temperature=0
     )
 
-    summary = response.choices[0].message.content.strip()
-
-    with driver.session() as session:
-        session.run("""
-        MERGE (d:Document {name:$name})
-        SET d.text = $text, d.summary = $summary
-        WITH d
-            UNWIND $sections AS s
-                CREATE (sec:Section {text: s.text, embedding: s.embedding})
-                MERGE (d)-[:HAS_SECTION]->(sec)
-            WITH d
-        UNWIND $entities AS e
-            MERGE (ent:Entity {name: e.name})
-            SET ent.embedding = e.embedding
-            MERGE (d)-[:MENTIONS]->(ent)
-        WITH d
-        UNWIND $organisms AS o
-            MERGE (org:Organism {name: o.name})
-            SET org.embedding = o.embedding
-            MERGE (d)-[:MENTIONS_ORGANISM]->(org)
-        WITH d
-        UNWIND $compounds AS c
-            MERGE (cmp:Compound {name: c.name})
-            SET cmp.embedding = c.embedding
-            MERGE (d)-[:MENTIONS_COMPOUND]->(cmp)
-        WITH d
-        UNWIND $contributors AS a
-            MERGE (per:Person {name: a.name})
-            SET per.embedding = a.embedding
-            MERGE (d)-[:CONTRIBUTED_BY]->(per)
-        WITH d
-        UNWIND $mentioned AS m
-            MERGE (mp:Person {name: m.name})
-            SET mp.embedding = m.embedding
-            MERGE (d)-[:MENTIONS_PERSON]->(mp)
-        """,
-        name=doc_name,
-        text=text,
-        summary=summary,
-        sections=[{"text": s, "embedding": e} for s, e in zip(sections, section_embeddings)],
-        entities=[{"name": k, "embedding": v} for k, v in entity_embeddings.items()],
-        organisms=[{"name": k, "embedding": v} for k, v in organism_embeddings.items()],
-        compounds=[{"name": k, "embedding": v} for k, v in compound_embeddings.items()],
-        contributors=[{"name": k, "embedding": v} for k, v in contributor_embeddings.items()],
-        mentioned=[{"name": k, "embedding": v} for k, v in mentioned_embeddings.items()]
-        )
-
-print("Uploading docs + entities + persons + organisms + compounds in parallel...")
-def process_document(name, text):
-    ents, orgs, cmps, persons = extract_entities(text)
+
+async def build_record(doc_name, text, summary, entities, organisms, compounds, persons, scheduler):
+    """Writer record (see engine.graph_writer) for one document, with its embeddings."""
+    chunks = chunk_markdown(text)
+    # Sections stored with the same ordinal and hash are neither re-embedded nor rewritten.
+    stored = await asyncio.to_thread(section_hashes, driver, doc_name)
+    changed = [c for c in chunks if stored.get(c.ordinal) != c.content_hash]
+
+    mentioned = [p for p in persons["mentioned_persons"] if p not in persons["contributors"]]
+
+    # One batched, cached embedding pass for everything in the document.
+    texts = [c.text for c in changed] + entities + organisms + compounds + persons["contributors"] + mentioned
+    vectors = await embedding_service.aembed_many(texts, scheduler)
+    embedded = dict(zip(texts, vectors))
+    section_vectors = dict(zip([c.ordinal for c in changed], vectors))
+
+    record = {
+        "name": doc_name,
+        "text": text,
+        "summary": summary,
+        "sections": [{**c._asdict(), "embedding": section_vectors.get(c.ordinal)} for c in chunks],
+        "entities": {e: embedded[e] for e in entities},
+        "organisms": {o: embedded[o] for o in organisms},
+        "compounds": {c: embedded[c] for c in compounds},
+        "contributors": {p: embedded[p] for p in persons["contributors"]},
+        "mentioned": {p: embedded[p] for p in mentioned},
+    }
+    if canonicalizer is not None:
+        await asyncio.to_thread(canonicalizer.ensure_loaded, driver)
+        canonicalize_record(record)
+    return record
+
+
+def canonicalize_record(record):
+    """Rename the record's linked nodes to their canonical names, keeping the other spellings as aliases."""
+    aliases = {}
+    for key, (label, _) in LINKED_NODES.items():
+        resolved = {}
+        for name, embedding in record[key].items():
+            canonical, vector = canonicalizer.resolve(label, name, embedding)
+            resolved[canonical] = vector
+            if canonical != name:
+                aliases.setdefault(label, {}).setdefault(canonical, []).append(name)
+        record[key] = resolved
+    record["aliases"] = aliases
+
+
+async def process_document(name, text, scheduler):
+    # Entity extraction and the summary only need the text, so they run side by side.
+    (ents, orgs, cmps, persons), summary = await asyncio.gather(
+        extract_entities(text, scheduler), summarize_document(text, scheduler)
+    )
     name = name.replace(".txt", "")
-    add_document_with_entities(name, text, ents, orgs, cmps, persons)
-
-with ThreadPoolExecutor(max_workers=4) as executor:
-    futures = [executor.submit(process_document, name, text) for name, text in documents.items()]
-    for future in futures:
-        future.result()  
-
-print("✅ All documents processed in parallel.")
-
-
-def create_vector_index():
-    with driver.session() as session:
-        session.run("""
-        CREATE VECTOR INDEX entity_embeddings IF NOT EXISTS 
-        FOR (e:Entity) ON (e.embedding)
-        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
-        """)
-        session.run("""
-        CREATE VECTOR INDEX organism_embeddings IF NOT EXISTS 
-        FOR (o:Organism) ON (o.embedding)
-        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
-        """)
-        session.run("""
-        CREATE VECTOR INDEX compound_embeddings IF NOT EXISTS 
-        FOR (c:Compound) ON (c.embedding)
-        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
-        """)
-        session.run("""
-        CREATE VECTOR INDEX person_embeddings IF NOT EXISTS 
-        FOR (p:Person) ON (p.embedding)
-        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
-        """)
-        session.run("""
-        CREATE VECTOR INDEX section_embeddings IF NOT EXISTS 
-        FOR (sec:Section) ON (sec.embedding)
-        OPTIONS {indexConfig: {`vector.dimensions`: 1536, `vector.similarity_function`: 'cosine'}}
-        """)
-
-create_vector_index()
-print("✅ Vector indices created for Documents, Entities, Organisms, Compounds, and Persons")
+    record = await build_record(name, text, summary, ents, orgs, cmps, persons, scheduler)
+    scheduler.document_done()
+    return record
+
+
+def finalize(document_names):
+    """Snapshot, lexical index, related documents and graph version after ``document_names`` were (re)ingested."""
+    snapshot_dir = os.environ.get("VECTOR_SNAPSHOT_DIR")
+    if snapshot_dir:
+        counts = refresh_snapshot(driver, snapshot_dir, document_names)
+        print(f"✅ Vector snapshot refreshed in {snapshot_dir}: {counts}")
+
+    lexical_dir = os.environ.get("LEXICAL_INDEX_DIR")
+    if lexical_dir:
+        # BM25 statistics are corpus-wide, so the lexical index is rebuilt rather than patched.
+        counts = build_lexical_index(driver, lexical_dir)
+        print(f"✅ Lexical index rebuilt in {lexical_dir}: {counts}")
+
+    related_dir = os.environ.get("RELATED_DIR")
+    if related_dir:
+        # Only the ingested documents are re-pooled; the neighbour table is patched around them.
+        k = int(os.environ.get("RELATED_DOCUMENTS_K", 10))
+        counts = compute_related(driver, related_dir, k=k, documents=document_names)
+        print(f"✅ Related documents updated in {related_dir}: {counts}")
+
+    # Invalidate the API's cached catalog responses
+    print(f"✅ Graph version bumped to {bump_graph_version(driver)}")
+
+
+if __name__ == "__main__":
+    documents = {file.name: file.read_text(encoding="utf-8") for file in docs_path.glob("*.txt")}
+
+    # Constraints and indexes exist before the first MERGE.
+    print(f"✅ Schema ready: {migrate(driver)} added")
+    writer = GraphWriter(driver, batch_size=WRITE_BATCH_SIZE)
+
+    async def process_all(max_documents=4):
+        scheduler = create_scheduler()
+        semaphore = asyncio.Semaphore(max_documents)
+
+        async def run(name, text):
+            async with semaphore:
+                writer.add(await process_document(name, text, scheduler))
+            if len(writer) >= FLUSH_DOCUMENTS:
+                await asyncio.to_thread(writer.flush)
+
+        await asyncio.gather(*[run(name, text) for name, text in documents.items()])
+        await asyncio.to_thread(writer.flush)
+        print(scheduler.format_report())
+        print(f"Graph writer: {writer.report()}")
+
+    print("Uploading docs + entities + persons + organisms + compounds in parallel...")
+    asyncio.run(process_all())
+
+    print("✅ All documents processed in parallel.")
+    print(f"Embedding cache: {embedding_service.report()}")
+    if canonicalizer is not None:
+        print(f"Canonical names: {canonicalizer.report()}")
+
+    finalize([name.replace(".txt", "") for name in documents])
@@ -1,14 +1,31 @@
+import asyncio
 import os
+import sys
+import time
 import openai
-import textwrap
-from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-openai.api_key = "your api key"
+from bs4 import BeautifulSoup
+
+import html_to_markdown
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.scheduler import approx_tokens, create_scheduler
+
+openai.api_key = os.environ.get("OPENAI_API_KEY", "your api key")
 
 input_dir = "raw_data"
 output_dir = "cleaned_data"
 os.makedirs(output_dir, exist_ok=True)
 
+# "local": deterministic Markdown conversion, the LLM only repairs fragments it
+# cannot convert. "llm": the whole article goes through the LLM in chunks.
+CLEAN_HTML_MODE = os.environ.get("CLEAN_HTML_MODE", "local")
+CHUNK_SIZE = 20000
+
+# LLM input tokens the whole-article path would have sent vs. what was sent.
+token_report = {"documents": 0, "tokens_before": 0, "tokens_after": 0, "fragments": 0, "seconds": 0.0}
+
 PROMPT_TEMPLATE = """I have a NASA Biology publication in HTML format that is split into multiple chunks.
 A single paragraph, sentence, or section may look broken in the current chunk.
 Your task is to process only the current chunk and return a clean Markdown version without losing any meaningful scientific content.
@@ -60,21 +77,86 @@ Important Notes:
 Now process the following part of the HTML content:
 
 """
-def summarize_chunk(content):
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[
+# For fragments the local converter could not handle; the rest of the article is already Markdown.
+REPAIR_PROMPT = """Convert this HTML fragment of a NASA Biology publication to Markdown.
+- Keep all text exactly as it appears; do not rephrase or summarize.
+- Write math as LaTeX between $...$ (inline) or $$...$$ (display).
+- Write tables as Markdown tables, repeating the value of merged cells in every cell they span.
+- Output only the Markdown, without code fences.
+
+"""
+
+async def summarize_chunk(content, scheduler, prompt=PROMPT_TEMPLATE):
+    return await scheduler.chat(
+        [
             {"role": "system", "content": "You are a helpful assistant that processes NASA Biospace publications."},
-            {"role": "user", "content": PROMPT_TEMPLATE + content}
+            {"role": "user", "content": prompt + content}
         ],
+        model="gpt-4o-mini",
+        # Markdown output is a fraction of the HTML it is cleaned from.
+        expected_output_tokens=approx_tokens(content) // 2,
         temperature=0
     )
-    return response.choices[0].message.content.strip()
 
-def chunk_text(text, chunk_size=10000):
-    return textwrap.wrap(text, chunk_size)
+def chunk_html(html_content, chunk_size=CHUNK_SIZE):
+    """Split at element boundaries (never inside a tag) into chunks of about ``chunk_size`` characters."""
+    soup = BeautifulSoup(html_content, "html.parser")
+    root = soup.find("article") or soup.body or soup
+    nodes = list(root.children)
+    # Descend through single-wrapper elements so there are boundaries to split on.
+    while len([n for n in nodes if str(n).strip()]) == 1 and getattr(nodes[0], "contents", None) and len(str(root)) > chunk_size:
+        root = next(n for n in nodes if str(n).strip())
+        nodes = list(root.children)
+    chunks, current = [], ""
+    for node in nodes:
+        part = str(node)
+        if current and len(current) + len(part) > chunk_size:
+            chunks.append(current)
+            current = ""
+        current += part
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def llm_request_tokens(content, prompt=PROMPT_TEMPLATE):
+    return approx_tokens(prompt) + approx_tokens(content)
+
+async def clean_html(html_content, scheduler):
+    """Markdown for one publication's HTML; LLM requests for it run concurrently."""
+    started = time.perf_counter()
+    # What the whole page costs the LLM, without parsing it a second time.
+    before = approx_tokens(html_content)
+    if CLEAN_HTML_MODE == "llm":
+        chunks = chunk_html(html_content)
+        print(f"➡️ Processing {len(chunks)} chunks...")
+        summaries = await asyncio.gather(*[summarize_chunk(chunk, scheduler) for chunk in chunks])
+        markdown, fragments = "\n\n".join(summaries), len(chunks)
+        sent = sum(llm_request_tokens(chunk) for chunk in chunks)
+    else:
+        blocks = html_to_markdown.convert(html_content)
+        fragments = [b.html for b in blocks if b.html is not None]
+        repaired = await asyncio.gather(*[summarize_chunk(f, scheduler, REPAIR_PROMPT) for f in fragments])
+        markdown = html_to_markdown.render(blocks, repaired)
+        sent, fragments = sum(llm_request_tokens(f, REPAIR_PROMPT) for f in fragments), len(fragments)
+
+    token_report["documents"] += 1
+    token_report["tokens_before"] += before
+    token_report["tokens_after"] += sent
+    token_report["fragments"] += fragments
+    token_report["seconds"] += time.perf_counter() - started
+    print(f"➡️ LLM input tokens: {before} -> {sent} ({fragments} requests, {time.perf_counter() - started:.1f}s)")
+    return markdown
+
+def format_token_report():
+    r = token_report
+    ratio = r["tokens_before"] / max(r["tokens_after"], 1)
+    return (
+        f"Cleaning ({CLEAN_HTML_MODE}): {r['documents']} documents, LLM input tokens "
+        f"{r['tokens_before']} -> {r['tokens_after']} ({ratio:.1f}x fewer), {r['fragments']} requests, "
+        f"{r['seconds'] / max(r['documents'], 1):.1f}s per document"
+    )
 
-def process_file(filename):
+async def process_file(filename, scheduler):
     """Process a single file."""
     input_path = os.path.join(input_dir, filename)
     output_path = os.path.join(output_dir, filename.replace(".html", ".txt"))
@@ -87,26 +169,30 @@ def process_file(filename):
         html_content = f.read()
 
     try:
-        chunks = chunk_text(html_content, chunk_size=20000)
-        all_summaries = []
-
-        for i, chunk in enumerate(chunks, 1):
-            print(f"➡️ Processing chunk {i}/{len(chunks)} of {filename}...")
-            summary = summarize_chunk(chunk)
-            all_summaries.append(f"\n{summary}")
-
-        final_summary = "\n\n".join(all_summaries)
+        print(f"➡️ Cleaning {filename}...")
+        final_summary = await clean_html(html_content, scheduler)
 
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(final_summary)
 
+        scheduler.document_done()
         print(f"✅ Summarized and saved: {output_path}")
 
     except Exception as e:
         print(f"❌ Error processing {filename}: {e}")
 
+async def main(html_files, max_documents=6):
+    scheduler = create_scheduler()
+    semaphore = asyncio.Semaphore(max_documents)
+
+    async def run(filename):
+        async with semaphore:
+            await process_file(filename, scheduler)
+
+    await asyncio.gather(*[run(f) for f in html_files])
+    print(format_token_report())
+    print(scheduler.format_report())
+
 if __name__ == "__main__":
     html_files = [f for f in os.listdir(input_dir) if f.endswith(".html")]
-
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        executor.map(process_file, html_files)
\ No newline at end of file
+    asyncio.run(main(html_files))
@@ -0,0 +1,187 @@
+"""Pooled, conditional, streaming fetcher for publication pages.
+
+``HtmlFetcher`` keeps one ``requests.Session`` whose connection pool is shared
+by all worker threads, so consecutive pages reuse TCP/TLS connections. The
+ETag and Last-Modified of every page saved are kept in a small SQLite store;
+a revalidation sends ``If-None-Match``/``If-Modified-Since`` and an unchanged
+page costs a bodiless 304. Bodies are streamed and scanned for ``<article>``
+as they arrive; nothing after the closing tag is decoded or scanned, and the
+page is never parsed as a whole.
+"""
+import codecs
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FETCHED, NOT_MODIFIED = "fetched", "not_modified"
+
+FetchResult = namedtuple("FetchResult", "url status content bytes seconds")
+
+ARTICLE_TAG = re.compile(r"<(/?)article\b[^>]*>", re.IGNORECASE)
+
+
+class ArticleScanner:
+    """Finds the outermost ``<article>`` element in text fed chunk by chunk."""
+
+    def __init__(self):
+        self._chunks = []
+        self._tail = ""  # unscanned text, from the first position a tag may still start at
+        self._offset = 0  # position of _tail in the text
+        self._depth = 0
+        self._start = None
+        self.end = None
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+        tail = self._tail + chunk
+        for match in ARTICLE_TAG.finditer(tail):
+            if not match.group(1):
+                if self._depth == 0:
+                    self._start = self._offset + match.start()
+                self._depth += 1
+            elif self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._offset + match.end()
+                    return True
+        # Every tag ending at or before the last ">" has been seen; only one cut by the chunk
+        # boundary is left, starting at the first "<" after it.
+        start = tail.find("<", tail.rfind(">") + 1)
+        resume = start if start != -1 else len(tail)
+        self._tail = tail[resume:]
+        self._offset += resume
+        return False
+
+    def article(self):
+        if self.end is None:
+            return None
+        return self.text[self._start:self.end]
+
+
+def extract_article(html):
+    scanner = ArticleScanner()
+    scanner.feed(html)
+    return scanner.article()
+
+
+class ValidatorStore:
+    """``url -> (etag, last_modified)`` of the copy saved on disk."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified FROM validators WHERE url = ?", (url,)).fetchone()
+        return row or (None, None)
+
+    def put(self, url, etag, last_modified):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified) VALUES (?, ?, ?)",
+                (url, etag, last_modified),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class HtmlFetcher:
+    def __init__(self, validators=None, headers=None, pool_size=10, timeout=15, retries=3, chunk_size=16384):
+        self.validators = validators
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._results = []
+        self.failures = 0
+
+    def close(self):
+        self.session.close()
+
+    def fetch(self, url, conditional=True):
+        """Article HTML for ``url``; ``content`` is ``None`` when the saved copy is still current.
+
+        ``conditional`` should only be set when a saved copy exists. Raises
+        ``requests.HTTPError`` for error statuses.
+        """
+        started = time.perf_counter()
+        request_headers = {}
+        if conditional and self.validators is not None:
+            etag, last_modified = self.validators.get(url)
+            if etag:
+                request_headers["If-None-Match"] = etag
+            if last_modified:
+                request_headers["If-Modified-Since"] = last_modified
+
+        try:
+            with self.session.get(url, headers=request_headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304:
+                    response.content  # consume the empty body so the connection goes back to the pool
+                    return self._record(FetchResult(url, NOT_MODIFIED, None, 0, time.perf_counter() - started))
+                response.raise_for_status()
+
+                scanner = ArticleScanner()
+                decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+                done = False
+                for chunk in response.iter_content(self.chunk_size):
+                    # Once the article is closed the tail is only drained, not decoded or
+                    # scanned; reading it keeps the connection reusable by the pool.
+                    if not done:
+                        done = scanner.feed(decoder.decode(chunk))
+                if not done:
+                    scanner.feed(decoder.decode(b"", final=True))
+                received = response.raw.tell()
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        except requests.RequestException:
+            with self._lock:
+                self.failures += 1
+            raise
+
+        content = scanner.article()
+        if content is None:
+            content = "<!-- Article tag not found -->\n" + scanner.text
+        if self.validators is not None:
+            self.validators.put(url, etag, last_modified)
+        return self._record(FetchResult(url, FETCHED, content, received, time.perf_counter() - started))
+
+    def _record(self, result):
+        with self._lock:
+            self._results.append(result)
+        return result
+
+    def report(self):
+        """Pages, 304 hits, failures, bytes received and per-page latency so far."""
+        with self._lock:
+            results = list(self._results)
+        seconds = sorted(r.seconds for r in results)
+        hits = sum(r.status == NOT_MODIFIED for r in results)
+        return {
+            "pages": len(results),
+            "fetched": len(results) - hits,
+            "not_modified": hits,
+            "failed": self.failures,
+            "bytes": sum(r.bytes for r in results),
+            "mean_s": round(statistics.fmean(seconds), 4) if seconds else 0.0,
+            "p95_s": round(seconds[int(len(seconds) * 0.95) - 1], 4) if len(seconds) > 1 else (seconds[0] if seconds else 0.0),
+        }
@@ -3,7 +3,7 @@ import csv
 import requests
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from bs4 import BeautifulSoup
+from fetcher import FETCHED, HtmlFetcher, ValidatorStore
 
 csv_file = "SB_publication_PMC.csv"
 
@@ -16,44 +16,51 @@ headers = {
                   "Chrome/116.0 Safari/537.36"
 }
 
+max_workers = 10
+
+def create_fetcher(pool_size=max_workers):
+    """Fetcher sharing one connection pool, with validators kept next to the pages."""
+    validators = ValidatorStore(os.path.join(output_dir, "validators.sqlite"))
+    return HtmlFetcher(validators, headers=headers, pool_size=pool_size)
+
 def clean_filename(name):
     """Remove invalid characters for filenames"""
     return re.sub(r'[\\/*?:"<>|]', "_", name)
 
-def fetch_and_save(title, url, counter):
-    """Fetch a single URL, extract <article>, and save HTML"""
+def article_path(title):
+    return os.path.join(output_dir, f"{title}.html")
+
+def save_article(title, content):
+    file_path = article_path(title)
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    return file_path
+
+def fetch_and_save(fetcher, title, url, counter):
+    """Fetch a single URL (revalidating a saved copy), extract <article>, and save HTML"""
     try:
-        response = requests.get(url, headers=headers, timeout=15)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            article = soup.find("article")
-            if article:
-                content = str(article)
-            else:
-                content = "<!-- Article tag not found -->\n" + response.text
-
-            file_path = os.path.join(output_dir, f"{title}.html")
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(content)
-
-            return f"✅ [{counter}] Saved {title}.html"
-        else:
-            return f"❌ [{counter}] Failed {title}, Status: {response.status_code}"
+        result = fetcher.fetch(url, conditional=os.path.exists(article_path(title)))
+        if result.status != FETCHED:
+            return f"⏩ [{counter}] {title} unchanged"
+        save_article(title, result.content)
+        return f"✅ [{counter}] Saved {title}.html ({result.bytes} bytes, {result.seconds:.2f}s)"
+    except requests.HTTPError as e:
+        return f"❌ [{counter}] Failed {title}, Status: {e.response.status_code}"
     except Exception as e:
         return f"⚠️ [{counter}] Error fetching {title}: {e}"
 
-tasks = []
-with open(csv_file, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    counter = 1
-    for row in reader:
-        title = clean_filename(row["Title"].strip())
-        url = row["Link"].strip()
-        tasks.append((title, url, counter))
-        counter += 1
-
-max_workers = 10  
-with ThreadPoolExecutor(max_workers=max_workers) as executor:
-    futures = [executor.submit(fetch_and_save, t, u, c) for t, u, c in tasks]
-    for future in as_completed(futures):
-        print(future.result())
+def read_publications(path=csv_file):
+    """(title, url) pairs from the publications CSV, titles made filename-safe."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(clean_filename(row["Title"].strip()), row["Link"].strip()) for row in csv.DictReader(f)]
+
+if __name__ == "__main__":
+    tasks = [(title, url, counter) for counter, (title, url) in enumerate(read_publications(), 1)]
+
+    fetcher = create_fetcher()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_and_save, fetcher, t, u, c) for t, u, c in tasks]
+        for future in as_completed(futures):
+            print(future.result())
+    fetcher.close()
+    print(f"Fetch report: {fetcher.report()}")
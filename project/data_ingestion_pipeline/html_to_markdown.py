@@ -0,0 +1,265 @@
+"""Deterministic HTML -> Markdown pre-cleaning for publication pages.
+
+``convert`` strips navigation, scripts, buttons and other UI markup and turns
+headings, paragraphs, lists, tables, figures and links into Markdown locally.
+Only what cannot be converted reliably (MathML, tables with merged cells,
+nested tables) is kept as raw HTML "repair" fragments for the LLM;
+neighbouring fragments in the same section are merged so each needs one
+request. Blocks carry the index of the top-level section they belong to.
+
+    python html_to_markdown.py raw_data/*.html    # token report, no LLM calls
+"""
+import re
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+
+Block = namedtuple("Block", "section markdown html")  # exactly one of markdown / html is set
+
+DROP_TAGS = {
+    "script", "style", "noscript", "nav", "footer", "form", "button", "svg", "iframe",
+    "input", "select", "textarea", "link", "meta", "head", "template", "object",
+}
+DROP_ROLES = {"navigation", "banner", "contentinfo", "search", "toolbar", "menu", "dialog"}
+UI_CLASS = re.compile(r"(?:^|[-_])(nav|navbar|menu|toolbar|share|social|cookie|sidebar|breadcrumbs?|login|btn|button|skip)(?:$|[-_])")
+# Link texts of reference-list lookups that carry no content.
+BOILERPLATE_LINKS = {"google scholar", "pubmed", "pmc free article", "doi", "crossref", "free article", "view on publisher site"}
+
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "aside", "ul", "ol", "li", "dl", "dt", "dd",
+    "table", "figure", "figcaption", "blockquote", "pre", "hr", "caption", *HEADINGS,
+}
+REPAIR_TAGS = {"math", "mml:math"}
+
+BR = "\x00"
+
+
+class NeedsRepair(Exception):
+    pass
+
+
+def _dropped(tag):
+    if tag.name in DROP_TAGS or tag.get("role") in DROP_ROLES:
+        return True
+    if tag.get("aria-hidden") == "true" or tag.has_attr("hidden"):
+        return True
+    style = (tag.get("style") or "").replace(" ", "").lower()
+    if "display:none" in style:
+        return True
+    return any(UI_CLASS.search(c.lower()) for c in tag.get("class") or [])
+
+
+def _collapse(text):
+    return re.sub(r"[ \t\n\r\f\v]+", " ", text).replace(f" {BR} ", BR).replace(BR, "\n")
+
+
+def _inline(nodes):
+    """Inline Markdown for a run of nodes; raises NeedsRepair on unconvertible markup."""
+    parts = []
+    for node in nodes:
+        if isinstance(node, Comment):
+            continue
+        if isinstance(node, NavigableString):
+            parts.append(str(node))
+            continue
+        name = node.name
+        if _dropped(node):
+            continue
+        if name in REPAIR_TAGS or name == "table":
+            raise NeedsRepair
+        if name == "br":
+            parts.append(f" {BR} ")
+        elif name in ("em", "i"):
+            text = _inline(node.children).strip()
+            parts.append(f"*{text}*" if text else "")
+        elif name in ("strong", "b"):
+            text = _inline(node.children).strip()
+            parts.append(f"**{text}**" if text else "")
+        elif name == "a":
+            parts.append(_link(node))
+        elif name == "img":
+            alt = (node.get("alt") or "").strip()
+            if alt and node.get("src"):
+                parts.append(f"![{alt}]({node['src']})")
+        elif name in ("sup", "sub"):
+            # Kept as inline HTML (valid Markdown): exponents and subscripts change meaning.
+            text = _inline(node.children).strip()
+            parts.append(f"<{name}>{text}</{name}>" if text else "")
+        elif name == "code":
+            parts.append(f"`{node.get_text()}`")
+        else:
+            parts.append(_inline(node.children))
+    return "".join(parts)
+
+
+def _link(node):
+    text = _collapse(_inline(node.children)).strip()
+    href = node.get("href") or ""
+    if not text or text.strip("[]").lower() in BOILERPLATE_LINKS:
+        return ""
+    if href and not href.startswith(("#", "javascript:")) and text != href:
+        return f"[{text}]({href})"
+    return text
+
+
+def _list(node, depth=0):
+    lines = []
+    ordered = node.name == "ol"
+    for i, item in enumerate(node.find_all("li", recursive=False), 1):
+        nested = [c for c in item.children if getattr(c, "name", None) in ("ul", "ol")]
+        text = _collapse(_inline([c for c in item.children if c not in nested])).strip()
+        marker = f"{i}." if ordered else "-"
+        if text:
+            lines.append(f"{'   ' * depth}{marker} {text}")
+        for sub in nested:
+            lines.append(_list(sub, depth + 1))
+    return "\n".join(line for line in lines if line)
+
+
+def _cell(cell):
+    return _collapse(_inline(cell.children)).strip().replace("|", "\\|").replace("\n", " ")
+
+
+def _span(cell, attribute):
+    value = (cell.get(attribute) or "1").strip()
+    if not value.isdigit():
+        # Malformed ("2x"): the LLM sees the table as it is rather than a guessed layout.
+        raise NeedsRepair
+    return int(value)
+
+
+def _table(node):
+    rows = node.find_all("tr")
+    if not rows or node.find("table") or any(
+        _span(c, "rowspan") > 1 or _span(c, "colspan") > 1 for c in node.find_all(["td", "th"])
+    ):
+        raise NeedsRepair
+    cells = [[_cell(c) for c in row.find_all(["td", "th"], recursive=False)] for row in rows]
+    width = max(len(r) for r in cells)
+    cells = [r + [""] * (width - len(r)) for r in cells]
+    lines = ["| " + " | ".join(cells[0]) + " |", "|" + " --- |" * width]
+    lines += ["| " + " | ".join(r) + " |" for r in cells[1:]]
+    caption = node.find("caption")
+    if caption:
+        lines.insert(0, _collapse(_inline(caption.children)).strip() + "\n")
+    return "\n".join(lines)
+
+
+class _Converter:
+    def __init__(self):
+        self.blocks = []
+        self.section = 0
+
+    def markdown(self, text):
+        text = text.strip()
+        if text:
+            self.blocks.append(Block(self.section, text, None))
+
+    def repair(self, node):
+        self.blocks.append(Block(self.section, None, str(node)))
+
+    def paragraph(self, nodes, source):
+        if not nodes:
+            return
+        try:
+            self.markdown(_collapse(_inline(nodes)))
+        except NeedsRepair:
+            self.repair(source if source is not None else "".join(str(n) for n in nodes))
+
+    def walk(self, node):
+        pending = []
+        for child in list(node.children):
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString) or child.name not in BLOCK_TAGS:
+                if isinstance(child, NavigableString) or not _dropped(child):
+                    pending.append(child)
+                continue
+            self.paragraph(pending, None)
+            pending = []
+            if not _dropped(child):
+                self.block(child)
+        self.paragraph(pending, None)
+
+    def block(self, node):
+        name = node.name
+        if name in HEADINGS:
+            level = HEADINGS[name]
+            if level <= 2:
+                self.section += 1
+            text = _collapse(_inline(node.children)).strip()
+            if text:
+                self.markdown(f"{'#' * level} {text}")
+        elif name in ("ul", "ol"):
+            try:
+                self.markdown(_list(node))
+            except NeedsRepair:
+                self.repair(node)
+        elif name == "table":
+            try:
+                self.markdown(_table(node))
+            except NeedsRepair:
+                self.repair(node)
+        elif name == "pre":
+            self.markdown(f"```\n{node.get_text().strip()}\n```")
+        elif name == "hr":
+            self.markdown("---")
+        elif name == "blockquote":
+            before = len(self.blocks)
+            self.walk(node)
+            self.blocks[before:] = [
+                b._replace(markdown="\n".join(f"> {line}" for line in b.markdown.splitlines())) if b.markdown else b
+                for b in self.blocks[before:]
+            ]
+        elif any(getattr(c, "name", None) in BLOCK_TAGS for c in node.children):
+            self.walk(node)
+        else:
+            self.paragraph(list(node.children), node)
+
+
+def convert(html):
+    """Blocks of Markdown and repair fragments, in document order."""
+    soup = BeautifulSoup(html, "html.parser")
+    root = soup.find("article") or soup.body or soup
+    converter = _Converter()
+    converter.walk(root)
+    return merge_repairs(converter.blocks)
+
+
+def merge_repairs(blocks):
+    merged = []
+    for block in blocks:
+        if block.html is not None and merged and merged[-1].html is not None and merged[-1].section == block.section:
+            merged[-1] = merged[-1]._replace(html=merged[-1].html + "\n" + block.html)
+        else:
+            merged.append(block)
+    return merged
+
+
+def render(blocks, repaired):
+    """Markdown for ``blocks``, with ``repaired[i]`` standing in for the i-th repair fragment."""
+    repaired = iter(repaired)
+    parts = [b.markdown if b.markdown is not None else next(repaired).strip() for b in blocks]
+    return "\n\n".join(p for p in parts if p)
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from engine.scheduler import approx_tokens
+
+    total_before = total_after = 0
+    for path in sys.argv[1:]:
+        html = Path(path).read_text(encoding="utf-8")
+        blocks = convert(html)
+        fragments = [b.html for b in blocks if b.html is not None]
+        before = approx_tokens(html)
+        after = sum(approx_tokens(f) for f in fragments)
+        local = approx_tokens(render(blocks, fragments))
+        total_before, total_after = total_before + before, total_after + after
+        print(f"{Path(path).name}: {before} HTML tokens -> {after} sent for repair ({len(fragments)} fragments), {local} Markdown tokens")
+    if total_before:
+        print(f"total: {total_before} -> {total_after} tokens to the LLM ({total_before / max(total_after, 1):.1f}x fewer)")
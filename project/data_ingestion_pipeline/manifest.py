@@ -0,0 +1,94 @@
+"""SQLite work manifest for the ingestion pipeline (see pipeline.py).
+
+One row per (document, stage) records the stage status and the hash of the
+input it was run on. A stage is only redone for a document when it did not
+finish (``running``/``failed``) or when its input changed since it did.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+# Graph stage: extracted and embedded, waiting for the batched writer to flush it.
+EXTRACTED = "extracted"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    doc TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_hash TEXT,
+    output_hash TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (doc, stage)
+)
+"""
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = str(path)
+        # Stage workers are threads; one connection guarded by a lock is plenty.
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, doc, stage):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, input_hash, output_hash, error FROM stages WHERE doc = ? AND stage = ?",
+                (doc, stage),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "input_hash": row[1], "output_hash": row[2], "error": row[3]}
+
+    def is_done(self, doc, stage, input_hash):
+        row = self.get(doc, stage)
+        return row is not None and row["status"] == DONE and row["input_hash"] == input_hash
+
+    def mark(self, doc, stage, status, input_hash=None, output_hash=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO stages (doc, stage, status, input_hash, output_hash, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doc, stage) DO UPDATE SET
+                    status = excluded.status,
+                    input_hash = excluded.input_hash,
+                    output_hash = coalesce(excluded.output_hash, stages.output_hash),
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (doc, stage, status, input_hash, output_hash, error, time.time()),
+            )
+
+    def summary(self):
+        """``{stage: {status: count}}`` over the whole manifest."""
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, status, count(*) FROM stages GROUP BY stage, status").fetchall()
+        counts = {}
+        for stage, status, n in rows:
+            counts.setdefault(stage, {})[status] = n
+        return counts
+
+    def failures(self, stage=None):
+        query = "SELECT doc, stage, error FROM stages WHERE status = ?"
+        params = [FAILED]
+        if stage:
+            query += " AND stage = ?"
+            params.append(stage)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY doc", params).fetchall()
@@ -0,0 +1,215 @@
+"""Resumable ingestion: fetch -> clean -> graph, checkpointed in a SQLite manifest.
+
+Each stage records per document whether it finished and the hash of the input
+it ran on (the URL for ``fetch``, the raw HTML for ``clean``, the cleaned text
+for ``graph``). A rerun, or a run after a crash, skips documents whose stage is
+done for the same input, so only new or changed publications reach the LLM.
+
+    python pipeline.py                          # all stages
+    python pipeline.py --stages clean,graph     # reuse raw_data as is
+    python pipeline.py --status                 # manifest summary only
+
+Outputs written before the manifest existed are adopted on the first run
+instead of being regenerated.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from manifest import DONE, EXTRACTED, FAILED, RUNNING, Manifest, content_hash
+from engine.scheduler import create_scheduler
+
+STAGES = ("fetch", "clean", "graph")
+
+
+async def run_stage(manifest, stage, items, work, workers, mark_done=True):
+    """Await ``work(doc, payload)``, ``workers`` at a time, for items not done for their input hash.
+
+    ``items`` are ``(doc, input_hash, payload, adopt, force)``. ``adopt`` marks
+    an item without a manifest row as done without running ``work`` (its output
+    already exists); ``force`` runs it whatever the manifest says (its output
+    is missing). With ``mark_done=False`` the work marks completion itself.
+    Returns ``(counts, processed_docs)``.
+    """
+    counts = {"processed": 0, "skipped": 0, "adopted": 0, "failed": 0}
+    processed = []
+
+    pending = []
+    for doc, input_hash, payload, adopt, force in items:
+        if force:
+            pending.append((doc, input_hash, payload))
+        elif manifest.is_done(doc, stage, input_hash):
+            counts["skipped"] += 1
+        elif adopt and manifest.get(doc, stage) is None:
+            manifest.mark(doc, stage, DONE, input_hash)
+            counts["adopted"] += 1
+        else:
+            pending.append((doc, input_hash, payload))
+
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(item):
+        doc, input_hash, payload = item
+        async with semaphore:
+            manifest.mark(doc, stage, RUNNING, input_hash)
+            try:
+                output_hash = await work(doc, payload)
+            except Exception as e:
+                manifest.mark(doc, stage, FAILED, input_hash, error=str(e))
+                print(f"❌ [{stage}] {doc}: {e}")
+                return doc, False
+            if mark_done:
+                manifest.mark(doc, stage, DONE, input_hash, output_hash)
+            print(f"✅ [{stage}] {doc}")
+            return doc, True
+
+    for doc, ok in await asyncio.gather(*[run(item) for item in pending]):
+        counts["processed" if ok else "failed"] += 1
+        if ok:
+            processed.append(doc)
+    return counts, processed
+
+
+async def fetch_stage(manifest, csv_file, workers, refetch):
+    import get_raw_html_data as pages
+    from fetcher import FETCHED
+
+    fetcher = pages.create_fetcher(pool_size=workers)
+
+    async def work(title, url):
+        # Saved pages are revalidated; a 304 keeps the copy and its hash.
+        result = await asyncio.to_thread(fetcher.fetch, url, os.path.exists(pages.article_path(title)))
+        if result.status != FETCHED:
+            return None
+        pages.save_article(title, result.content)
+        return content_hash(result.content)
+
+    items = []
+    for title, url in pages.read_publications(csv_file):
+        exists = os.path.exists(pages.article_path(title))
+        items.append((title, content_hash(url), url, exists, refetch or not exists))
+    try:
+        return await run_stage(manifest, "fetch", items, work, workers)
+    finally:
+        fetcher.close()
+        print(f"Fetch report: {fetcher.report()}")
+
+
+async def clean_stage(manifest, workers, scheduler):
+    import clean_data
+
+    async def work(doc, path):
+        text = await clean_data.clean_html(path.read_text(encoding="utf-8"), scheduler)
+        Path(clean_data.output_dir, f"{doc}.txt").write_text(text, encoding="utf-8")
+        scheduler.document_done()
+        return content_hash(text)
+
+    items = []
+    for path in sorted(Path(clean_data.input_dir).glob("*.html")):
+        exists = Path(clean_data.output_dir, f"{path.stem}.txt").exists()
+        items.append((path.stem, content_hash(path.read_bytes()), path, exists, not exists))
+    result = await run_stage(manifest, "clean", items, work, workers)
+    print(clean_data.format_token_report())
+    return result
+
+
+def ingested_text_hashes(driver):
+    with driver.session() as session:
+        result = session.run("MATCH (d:Document) WHERE d.summary IS NOT NULL RETURN d.name AS name, d.text AS text")
+        return {record["name"]: content_hash(record["text"] or "") for record in result}
+
+
+async def graph_stage(manifest, workers, scheduler):
+    import build_graph
+    from engine.graph_writer import GraphWriter
+    from engine.schema import migrate
+
+    # Constraints and indexes exist before the first MERGE.
+    await asyncio.to_thread(migrate, build_graph.driver)
+    writer = GraphWriter(build_graph.driver, batch_size=build_graph.WRITE_BATCH_SIZE)
+    hashes = {}
+
+    async def flush():
+        # Documents only count as done once the writer has committed them.
+        for name in await asyncio.to_thread(writer.flush):
+            manifest.mark(name, "graph", DONE, hashes[name])
+
+    async def work(doc, path):
+        record = await build_graph.process_document(doc, path.read_text(encoding="utf-8"), scheduler)
+        manifest.mark(doc, "graph", EXTRACTED, hashes[doc])
+        writer.add(record)
+        if len(writer) >= build_graph.FLUSH_DOCUMENTS:
+            await flush()
+
+    # On the first run against an existing graph, documents already stored with
+    # the same text are adopted instead of being re-extracted and re-summarized.
+    ingested = ingested_text_hashes(build_graph.driver) if "graph" not in manifest.summary() else {}
+
+    items = []
+    for path in sorted(build_graph.docs_path.glob("*.txt")):
+        hashes[path.stem] = input_hash = content_hash(path.read_text(encoding="utf-8"))
+        items.append((path.stem, input_hash, path, ingested.get(path.stem) == input_hash, False))
+    counts, processed = await run_stage(manifest, "graph", items, work, workers, mark_done=False)
+    await flush()
+    if processed:
+        await asyncio.to_thread(build_graph.finalize, processed)
+    print(f"Embedding cache: {build_graph.embedding_service.report()}")
+    if build_graph.canonicalizer is not None:
+        print(f"Canonical names: {build_graph.canonicalizer.report()}")
+    print(f"Graph writer: {writer.report()}")
+    return counts, processed
+
+
+def print_status(manifest):
+    for stage in STAGES:
+        counts = manifest.summary().get(stage, {})
+        print(f"{stage:<6} " + ", ".join(f"{status}={n}" for status, n in sorted(counts.items())))
+    for doc, stage, error in manifest.failures():
+        print(f"  failed [{stage}] {doc}: {error}")
+
+
+async def main(stages, manifest_path, csv_file, workers, refetch):
+    manifest = Manifest(manifest_path)
+    # One scheduler for every LLM and embedding call, so all stages share the rate budgets.
+    scheduler = create_scheduler()
+    try:
+        for stage in stages:
+            if stage == "fetch":
+                counts, _ = await fetch_stage(manifest, csv_file, workers["fetch"], refetch)
+            elif stage == "clean":
+                counts, _ = await clean_stage(manifest, workers["clean"], scheduler)
+            else:
+                counts, _ = await graph_stage(manifest, workers["graph"], scheduler)
+            print(f"[{stage}] " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+        print(scheduler.format_report())
+        print_status(manifest)
+    finally:
+        manifest.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the ingestion stages, resuming from the manifest')
+    parser.add_argument('--stages', default=",".join(STAGES), help='Comma-separated subset of fetch,clean,graph')
+    parser.add_argument('--manifest', default='pipeline_manifest.sqlite', help='SQLite manifest path')
+    parser.add_argument('--csv', default='SB_publication_PMC.csv', help='Publications CSV for the fetch stage')
+    parser.add_argument('--fetch-workers', type=int, default=10, help='Pages downloaded at once')
+    parser.add_argument('--clean-workers', type=int, default=6, help='Documents cleaned at once (their chunks run in parallel)')
+    parser.add_argument('--graph-workers', type=int, default=4, help='Documents ingested into the graph at once')
+    parser.add_argument('--refetch', action='store_true', help='Revalidate every saved page (conditional requests)')
+    parser.add_argument('--status', action='store_true', help='Print the manifest summary and exit')
+    args = parser.parse_args()
+
+    if args.status:
+        manifest = Manifest(args.manifest)
+        print_status(manifest)
+        manifest.close()
+    else:
+        stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        workers = {"fetch": args.fetch_workers, "clean": args.clean_workers, "graph": args.graph_workers}
+        asyncio.run(main(stages, args.manifest, args.csv, workers, args.refetch))
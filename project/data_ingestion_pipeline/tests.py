@@ -0,0 +1,151 @@
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# The pipeline modules import each other as scripts run from this directory.
+sys.path.append(str(Path(__file__).resolve().parent))
+import fetcher
+import html_to_markdown
+import pipeline
+from manifest import DONE, FAILED, Manifest
+from benchmarks.html_fetcher import StandIn
+
+
+class HtmlToMarkdownTests(unittest.TestCase):
+    def markdown(self, html):
+        blocks = html_to_markdown.convert(f"<article>{html}</article>")
+        return [b.markdown for b in blocks], [b.html for b in blocks if b.html is not None]
+
+    def test_simple_table_is_converted_locally(self):
+        markdown, repairs = self.markdown("<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table>")
+        self.assertEqual(markdown, ["| a | b |\n| --- | --- |\n| 1 | 2 |"])
+        self.assertEqual(repairs, [])
+
+    def test_merged_or_malformed_spans_go_to_repair(self):
+        for span in ('rowspan="2"', 'colspan="2x"', 'rowspan="-1"'):
+            with self.subTest(span=span):
+                _, repairs = self.markdown(f"<p>before</p><table><tr><td {span}>a</td></tr></table>")
+                self.assertEqual(len(repairs), 1)
+                self.assertIn("<table>", repairs[0])
+
+    def test_repairs_merge_within_a_section_only(self):
+        math = '<math><mi>x</mi></math>'
+        blocks = html_to_markdown.convert(f"<article><h2>A</h2><p>{math}</p><p>{math}</p><h2>B</h2><p>{math}</p></article>")
+        self.assertEqual([(b.section, b.html.count("<math>")) for b in blocks if b.html is not None], [(1, 2), (2, 1)])
+
+    def test_reference_lookup_links_are_dropped_but_content_links_kept(self):
+        markdown, _ = self.markdown(
+            '<p>See <a href="/x">Article</a> and <a href="https://scholar.google.com">Google Scholar</a>.</p>'
+        )
+        self.assertEqual(markdown, ["See [Article](/x) and ."])
+
+
+class RunStageTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manifest = Manifest(Path(directory.name, "manifest.sqlite"))
+        self.addCleanup(self.manifest.close)
+        self.calls = []
+
+    async def work(self, doc, payload):
+        self.calls.append(doc)
+        if payload == "boom":
+            raise RuntimeError("LLM error")
+        return f"out-{payload}"
+
+    def run_stage(self, items):
+        self.calls = []
+        counts, processed = asyncio.run(pipeline.run_stage(self.manifest, "clean", items, self.work, workers=2))
+        return counts, sorted(processed)
+
+    def test_rerun_skips_done_and_retries_failed_documents(self):
+        items = [("a", "h1", "x", False, False), ("b", "h2", "boom", False, False)]
+        counts, processed = self.run_stage(items)
+        self.assertEqual(counts, {"processed": 1, "skipped": 0, "adopted": 0, "failed": 1})
+        self.assertEqual(processed, ["a"])
+        self.assertEqual(self.manifest.get("a", "clean")["output_hash"], "out-x")
+        self.assertEqual(self.manifest.failures(), [("b", "clean", "LLM error")])
+
+        items[1] = ("b", "h2", "y", False, False)
+        counts, processed = self.run_stage(items)
+        self.assertEqual((counts["skipped"], self.calls), (1, ["b"]))
+        self.assertEqual(self.manifest.get("b", "clean")["status"], DONE)
+
+    def test_changed_input_is_redone(self):
+        self.run_stage([("a", "h1", "x", False, False)])
+        self.run_stage([("a", "h2", "x2", False, False)])
+        self.assertEqual(self.calls, ["a"])
+        self.assertTrue(self.manifest.is_done("a", "clean", "h2"))
+
+    def test_existing_outputs_are_adopted_once_and_forced_items_always_run(self):
+        counts, _ = self.run_stage([("a", "h1", "x", True, False)])
+        self.assertEqual((counts["adopted"], self.calls), (1, []))
+        self.assertTrue(self.manifest.is_done("a", "clean", "h1"))
+
+        # Adoption only applies without a manifest row: a failed document is retried.
+        self.manifest.mark("b", "clean", FAILED, "h2", error="crash")
+        self.run_stage([("b", "h2", "y", True, False)])
+        self.assertEqual(self.calls, ["b"])
+
+        self.run_stage([("a", "h1", "x", False, True)])
+        self.assertEqual(self.calls, ["a"])
+
+    def test_summary_counts_statuses_per_stage(self):
+        self.run_stage([("a", "h1", "x", False, False), ("b", "h2", "boom", False, False)])
+        self.assertEqual(self.manifest.summary(), {"clean": {DONE: 1, FAILED: 1}})
+
+
+class ArticleScannerTests(unittest.TestCase):
+    PAGE = "<nav><a>x</a></nav><ARTICLE class='a'><p>one</p><article>inner</article><p>two</p></article><footer>f</footer>"
+
+    def test_outermost_article_is_found_in_any_chunking(self):
+        expected = "<ARTICLE class='a'><p>one</p><article>inner</article><p>two</p></article>"
+        for size in (1, 3, 7, len(self.PAGE)):
+            with self.subTest(size=size):
+                scanner = fetcher.ArticleScanner()
+                chunks = [self.PAGE[i:i + size] for i in range(0, len(self.PAGE), size)]
+                fed = next(i for i, chunk in enumerate(chunks) if scanner.feed(chunk))
+                self.assertEqual(scanner.article(), expected)
+                # Scanning stops with the chunk holding the closing tag.
+                self.assertEqual(fed, (self.PAGE.index("<footer>") - 1) // size)
+
+    def test_unclosed_or_missing_article(self):
+        self.assertIsNone(fetcher.extract_article("<body><p>no article</p></body>"))
+        self.assertIsNone(fetcher.extract_article("<article><p>cut off"))
+
+
+class HtmlFetcherTests(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = StandIn(pages=2, article_kb=1, latency=0).__enter__()
+        self.addCleanup(self.stand_in.__exit__)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.validators = fetcher.ValidatorStore(Path(directory.name, "validators.sqlite"))
+        self.addCleanup(self.validators.close)
+        self.fetcher = fetcher.HtmlFetcher(self.validators, pool_size=2)
+        self.addCleanup(self.fetcher.close)
+
+    def test_revalidation_is_a_304_until_the_page_changes(self):
+        url = self.stand_in.urls()[0]
+        first = self.fetcher.fetch(url, conditional=False)
+        self.assertEqual(first.status, fetcher.FETCHED)
+        self.assertTrue(first.content.startswith("<article><h1>Paper 0</h1>"))
+        self.assertTrue(first.content.endswith("</article>"))
+        self.assertEqual(self.validators.get(url)[0], self.stand_in.page(0)[1])
+
+        self.assertEqual(self.fetcher.fetch(url).status, fetcher.NOT_MODIFIED)
+        self.stand_in.revisions[0] += 1
+        changed = self.fetcher.fetch(url)
+        self.assertEqual(changed.status, fetcher.FETCHED)
+        self.assertIn("revision 1", changed.content)
+
+        report = self.fetcher.report()
+        self.assertEqual((report["pages"], report["fetched"], report["not_modified"]), (3, 2, 1))
+
+    def test_connections_are_reused(self):
+        for url in self.stand_in.urls() * 3:
+            self.fetcher.fetch(url, conditional=False)
+        self.assertEqual((self.stand_in.requests, len(self.stand_in.connections)), (6, 1))
@@ -0,0 +1,95 @@
+"""Semantic cache of RAG answers, keyed on the query embedding.
+
+Cached query vectors are rows of one preallocated, normalized float32 matrix,
+so a lookup is a single matrix-vector product over all entries. The nearest
+entry is a hit when its cosine similarity is at least ``threshold``, it was
+stored under the current graph version and it is younger than ``ttl``
+seconds. At most ``max_entries`` answers are kept; when full, an expired or
+stale slot is reused first, then the least recently used one.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from engine.vector_index import normalize_rows
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=0.95, max_entries=2000, ttl=3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix = None  # allocated on the first store, once the dimensions are known
+        self._versions = np.full(max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._values = [None] * max_entries
+        self._lru = OrderedDict()  # slot -> None, least recently used first
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _live(self, version, now):
+        return (self._versions == version) & (self._expires > now)
+
+    def lookup(self, embedding, version):
+        """``(value, similarity)`` of the nearest live entry within the threshold, or ``None``."""
+        query = normalize_rows(embedding)[0]
+        with self._lock:
+            if self._matrix is None or query.shape[0] != self._matrix.shape[1]:
+                self.stats["misses"] += 1
+                return None
+            scores = np.where(self._live(version, time.time()), self._matrix @ query, -np.inf)
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.stats["hits"] += 1
+            return self._values[slot], float(scores[slot])
+
+    def store(self, embedding, version, value):
+        vector = normalize_rows(embedding)[0]
+        with self._lock:
+            if self._matrix is None or vector.shape[0] != self._matrix.shape[1]:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._versions[:] = -1
+                self._values = [None] * self.max_entries
+                self._lru.clear()
+            slot = self._free_slot(version)
+            self._matrix[slot] = vector
+            self._versions[slot] = version
+            self._expires[slot] = time.time() + self.ttl
+            self._values[slot] = value
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+            self.stats["stores"] += 1
+
+    def _free_slot(self, version):
+        if len(self._lru) < self.max_entries:
+            return next(i for i in range(self.max_entries) if i not in self._lru)
+        dead = np.flatnonzero(~self._live(version, time.time()))
+        if dead.size:
+            slot = int(dead[0])
+        else:
+            slot = next(iter(self._lru))
+            self.stats["evictions"] += 1
+        del self._lru[slot]
+        return slot
+
+    def clear(self):
+        with self._lock:
+            self._versions[:] = -1
+            self._values = [None] * self.max_entries
+            self._lru.clear()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._lru)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
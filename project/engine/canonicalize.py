@@ -0,0 +1,327 @@
+"""Canonical names for ``Entity``, ``Organism``, ``Compound`` and ``Person`` nodes.
+
+Extraction returns free text, and the writer MERGEs on ``name``, so every
+spelling ("microgravity", "Microgravity", "simulated microgravity (SMG)")
+used to become its own node, vector and search hit. Names are grouped in two
+steps:
+
+* ``canonical_key``: NFKC, case-folded, hyphens and runs of whitespace
+  unified, a trailing acronym in parentheses dropped. Equal keys are the same
+  node.
+* embedding similarity: a name whose embedding has a cosine of at least the
+  label's threshold with a group's canonical name joins that group. Pairs
+  above the threshold only propose candidates, so a chain A~B~C never puts A
+  and C together unless C is also close to A. ``Person`` names are only
+  grouped by key, since similar names are often different people.
+
+A group keeps the name of its most linked member as ``name``, and every other
+spelling goes in ``aliases``.
+
+``canonicalize_graph`` is the one-off migration. It clusters the nodes
+already stored with a blocked similarity join (``block_size`` rows of the
+matrix product at a time), moves each alias node's relationships onto the
+canonical node, and deletes the alias nodes. ``Canonicalizer`` does the same
+inline during ingestion: ``resolve`` maps a newly extracted name onto a known
+node, or registers it as a new one, before the writer sees it.
+"""
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from engine.embedding_storage import default_storage
+from engine.vector_index import NODE_LABELS, normalize_rows
+
+DEFAULT_THRESHOLD = 0.92
+# label -> cosine threshold; None groups by canonical_key only.
+THRESHOLDS = {"Person": None}
+
+TRAILING_ACRONYM = re.compile(r"\s*\((?=[^)]*[A-Z])[A-Za-z0-9αβγ\-]{1,12}\)\s*$")
+SEPARATORS = re.compile(r"[\s\-_‐‑–—]+")
+
+NODES_QUERY = """
+MATCH (n:`{label}`)
+OPTIONAL MATCH (n)<-[:{rels}]-(d:Document)
+RETURN n.name AS name, n.embedding AS embedding, n.embedding_int8 AS codes, n.embedding_scale AS scale,
+       coalesce(n.aliases, []) AS aliases, count(DISTINCT d) AS documents
+ORDER BY documents DESC, size(n.name), n.name
+"""
+
+# One per relationship type, since Cypher cannot MERGE a relationship of a parameterized type.
+RELINK_QUERY = """
+UNWIND $rows AS row
+MATCH (c:`{label}` {{name: row.canonical}})
+MATCH (d:Document)-[:{rel}]->(a:`{label}`)
+WHERE a.name IN row.aliases
+MERGE (d)-[:{rel}]->(c)
+"""
+
+MERGE_QUERY = """
+UNWIND $rows AS row
+MATCH (c:`{label}` {{name: row.canonical}})
+SET c.aliases = row.aliases
+WITH row
+MATCH (a:`{label}`)
+WHERE a.name IN row.aliases
+DETACH DELETE a
+"""
+
+COUNT_QUERY = """
+MATCH (n:`{label}`)
+RETURN count(n) AS nodes, count(n.embedding) AS vectors
+"""
+
+
+def canonical_key(name):
+    text = unicodedata.normalize("NFKC", name).strip()
+    text = TRAILING_ACRONYM.sub("", text) or text
+    return SEPARATORS.sub(" ", text.casefold()).strip(" .,;:'\"")
+
+
+def threshold_for(label, default=DEFAULT_THRESHOLD):
+    return THRESHOLDS.get(label, default)
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        a, b = self.find(i), self.find(j)
+        if a != b:
+            # The lower index (more linked, see NODES_QUERY) stays the root.
+            self.parent[max(a, b)] = min(a, b)
+
+
+def similar_pairs(matrix, threshold, block_size=1024):
+    """``(i, j)`` arrays, ``i < j``, of the rows of a normalized ``matrix`` with cosine >= ``threshold``."""
+    left, right = [], []
+    for start in range(0, matrix.shape[0], block_size):
+        similarity = matrix[start:start + block_size] @ matrix[start:].T
+        # Only the upper triangle: each pair once, never a row with itself.
+        similarity[np.tril_indices(similarity.shape[0], m=similarity.shape[1])] = -np.inf
+        i, j = np.nonzero(similarity >= threshold)
+        left.append(i + start)
+        right.append(j + start)
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def cluster(names, embeddings, threshold=DEFAULT_THRESHOLD, block_size=1024):
+    """Groups of indices into ``names`` (each in input order, two or more members) that are one node.
+
+    ``embeddings`` may hold ``None`` for names without a vector; those are grouped by key only.
+    """
+    # Names with equal keys form one unit, compared through its first embedded member.
+    units = {}
+    for i, name in enumerate(names):
+        units.setdefault(canonical_key(name), []).append(i)
+    units = list(units.values())
+    if threshold is None:
+        return [u for u in units if len(u) > 1]
+
+    embedded = [k for k, unit in enumerate(units) if any(embeddings[i] is not None for i in unit)]
+    row = {k: r for r, k in enumerate(embedded)}
+    matrix = normalize_rows([next(embeddings[i] for i in units[k] if embeddings[i] is not None) for k in embedded]) \
+        if embedded else None
+    # Connected components of the similar pairs are only candidates (blocking) ...
+    groups = _UnionFind(len(units))
+    if len(embedded) > 1:
+        for i, j in zip(*similar_pairs(matrix, threshold, block_size)):
+            groups.union(embedded[i], embedded[j])
+    candidates = {}
+    for k in range(len(units)):
+        candidates.setdefault(groups.find(k), []).append(k)
+
+    clusters = []
+    for candidate in candidates.values():
+        # ... and a unit joins a cluster only when it is close to the cluster's canonical (first) unit.
+        while candidate:
+            head, rest = candidate[0], candidate[1:]
+            joined = []
+            if rest:
+                scores = matrix[[row[k] for k in rest]] @ matrix[row[head]]
+                joined = [k for k, score in zip(rest, scores) if score >= threshold]
+                rest = [k for k, score in zip(rest, scores) if score < threshold]
+            members = sorted(i for k in (head, *joined) for i in units[k])
+            if len(members) > 1:
+                clusters.append(members)
+            candidate = rest
+    return clusters
+
+
+def plan_merges(nodes, clusters):
+    """Writer rows ``{"canonical", "aliases"}`` for ``clusters`` of ``nodes`` (dicts with name and aliases).
+
+    The first member of a cluster is its canonical node; the order of ``nodes`` decides which that is.
+    """
+    rows = []
+    for members in clusters:
+        canonical = nodes[members[0]]["name"]
+        aliases = []
+        for i in members:
+            for alias in [nodes[i]["name"], *nodes[i]["aliases"]]:
+                if alias != canonical and alias not in aliases:
+                    aliases.append(alias)
+        rows.append({"canonical": canonical, "aliases": aliases})
+    return rows
+
+
+def load_nodes(session, label, storage=None):
+    """Nodes of ``label`` with their full-precision embeddings, the space extracted names are embedded in."""
+    storage = storage or default_storage()
+    query = NODES_QUERY.format(label=label, rels="|".join(NODE_LABELS[label]))
+    return [
+        {
+            "name": r["name"], "embedding": storage.full_vector(r["embedding"], r["codes"], r["scale"]),
+            "aliases": list(r["aliases"]), "documents": r["documents"],
+        }
+        for r in session.run(query) if r["name"]
+    ]
+
+
+def node_counts(driver, labels=tuple(NODE_LABELS)):
+    """``{label: {"nodes", "vectors"}}``: nodes, and nodes in the label's vector index."""
+    with driver.session() as session:
+        return {label: dict(session.run(COUNT_QUERY.format(label=label)).single()) for label in labels}
+
+
+def merge_nodes(driver, label, rows, batch_size=500):
+    with driver.session() as session:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            for rel in NODE_LABELS[label]:
+                session.execute_write(lambda tx: tx.run(RELINK_QUERY.format(label=label, rel=rel), rows=batch).consume())
+            session.execute_write(lambda tx: tx.run(MERGE_QUERY.format(label=label), rows=batch).consume())
+
+
+def canonicalize_graph(driver, labels=tuple(NODE_LABELS), threshold=DEFAULT_THRESHOLD, block_size=1024, dry_run=False):
+    """Merge the near-duplicate nodes of ``labels``; returns the per-label report, before and after counts."""
+    before = node_counts(driver, labels)
+    report = {}
+    for label in labels:
+        with driver.session() as session:
+            nodes = load_nodes(session, label)
+        clusters = cluster(
+            [n["name"] for n in nodes], [n["embedding"] for n in nodes], threshold_for(label, threshold), block_size,
+        )
+        rows = plan_merges(nodes, clusters)
+        if rows and not dry_run:
+            merge_nodes(driver, label, rows)
+        report[label] = {
+            "clusters": len(rows),
+            "merged": sum(len(members) - 1 for members in clusters),
+            "merged_vectors": sum(nodes[i]["embedding"] is not None for members in clusters for i in members[1:]),
+            "examples": rows[:5],
+        }
+    if dry_run:
+        # What the merge would leave behind.
+        after = {label: {
+            "nodes": before[label]["nodes"] - report[label]["merged"],
+            "vectors": before[label]["vectors"] - report[label]["merged_vectors"],
+        } for label in labels}
+    else:
+        after = node_counts(driver, labels)
+    return report, before, after
+
+
+def _shrink(before, after):
+    fewer = f" ({100.0 * (before - after) / before:.1f}% fewer)" if before else ""
+    return f"{before} -> {after}{fewer}"
+
+
+def format_shrink(before, after):
+    """One line per label plus a total, for the node and vector counts."""
+    totals = {key: [sum(c[key] for c in before.values()), sum(c[key] for c in after.values())] for key in ("nodes", "vectors")}
+    lines = [
+        f"{label}: nodes {_shrink(counts['nodes'], after[label]['nodes'])}, "
+        f"vectors {_shrink(counts['vectors'], after[label]['vectors'])}"
+        for label, counts in before.items()
+    ]
+    lines.append(f"total: nodes {_shrink(*totals['nodes'])}, vectors {_shrink(*totals['vectors'])}")
+    return "\n".join(lines)
+
+
+class _LabelIndex:
+    def __init__(self):
+        self.names, self.vectors, self.keys = [], [], {}
+        self.matrix = None  # allocated with the first vector, once the dimensions are known
+
+    def add(self, name, embedding, aliases=()):
+        row = len(self.names)
+        if embedding is not None:
+            if self.matrix is None:
+                self.matrix = np.zeros((max(1024, 2 * row), len(embedding)), dtype=np.float32)
+            elif row >= self.matrix.shape[0]:
+                self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+            self.matrix[row] = normalize_rows(embedding)[0]
+        self.names.append(name)
+        self.vectors.append(embedding)
+        for alias in (name, *aliases):
+            self.keys.setdefault(canonical_key(alias), row)
+        return row
+
+    def nearest(self, embedding):
+        """``(row, cosine)`` of the closest embedded name, or ``(None, -inf)``."""
+        rows = min(len(self.names), self.matrix.shape[0]) if self.matrix is not None else 0
+        if not rows or embedding is None:
+            return None, -np.inf
+        scores = self.matrix[:rows] @ normalize_rows(embedding)[0]
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class Canonicalizer:
+    """Maps extracted names onto the nodes already in the graph, or ones seen earlier in the run."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._labels = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.stats = {"names": 0, "same_key": 0, "similar": 0, "new": 0}
+
+    def ensure_loaded(self, driver):
+        with self._lock:
+            if self._loaded:
+                return
+            with driver.session() as session:
+                for label in NODE_LABELS:
+                    index = self._labels.setdefault(label, _LabelIndex())
+                    for node in load_nodes(session, label):
+                        index.add(node["name"], node["embedding"], node["aliases"])
+            self._loaded = True
+
+    def resolve(self, label, name, embedding):
+        """``(canonical name, its embedding)`` for ``name``; an unknown name becomes its own canonical."""
+        with self._lock:
+            self.stats["names"] += 1
+            index = self._labels.setdefault(label, _LabelIndex())
+            key = canonical_key(name)
+            row = index.keys.get(key)
+            if row is not None:
+                self.stats["same_key"] += index.names[row] != name
+            else:
+                threshold = threshold_for(label, self.threshold)
+                best, score = index.nearest(embedding)
+                if threshold is not None and score >= threshold:
+                    row = index.keys[key] = best
+                    self.stats["similar"] += 1
+            if row is None:
+                self.stats["new"] += 1
+                row = index.add(name, embedding)
+            return index.names[row], index.vectors[row] if index.vectors[row] is not None else embedding
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,133 @@
+"""Markdown-heading-aware chunking of cleaned publications into sections.
+
+Chunk boundaries fall on headings. A section under ``min_tokens`` is packed
+together with the ones that follow it, up to ``target_tokens`` (``max_tokens``
+rather than leave it on its own). A section over ``max_tokens`` is split at
+paragraphs, then at lines or sentences, packing the pieces the same way; an
+undersized section before it joins its first piece, and an undersized last
+piece joins the sections after it. A document that ends on an undersized
+section adds it to the previous chunk when that stays within ``max_tokens``.
+``#`` lines inside fenced code are not headings. Each chunk carries its heading
+path and a content hash, so re-ingestion can tell unchanged chunks apart.
+"""
+import os
+import re
+from collections import namedtuple
+
+from engine.embeddings import text_hash
+from engine.scheduler import approx_tokens
+
+Chunk = namedtuple("Chunk", "ordinal heading text token_count content_hash")
+
+TARGET_TOKENS = int(os.environ.get("CHUNK_TARGET_TOKENS", 512))
+MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 1024))
+MIN_TOKENS = int(os.environ.get("CHUNK_MIN_TOKENS", 128))
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _sections(text):
+    """``(heading path, markdown)`` for each heading and the text up to the next one."""
+    path, lines, fenced = [], [], False
+    for line in text.splitlines():
+        if FENCE.match(line):
+            fenced = not fenced
+        match = None if fenced else HEADING.match(line)
+        if match:
+            if any(l.strip() for l in lines):
+                yield " > ".join(title for _, title in path), "\n".join(lines).strip()
+            level = len(match.group(1))
+            path = [(l, t) for l, t in path if l < level] + [(level, match.group(2))]
+            lines = []
+        lines.append(line)
+    if any(l.strip() for l in lines):
+        yield " > ".join(title for _, title in path), "\n".join(lines).strip()
+
+
+def _pieces(text, max_tokens, separator="\n\n"):
+    """``(separator, piece)`` pairs under ``max_tokens``: cut at paragraphs, then lines or sentences, then characters."""
+    if approx_tokens(text) <= max_tokens:
+        return [(separator, text)]
+    for inner, parts in (
+        ("\n\n", re.split(r"\n\s*\n", text)),
+        ("\n", text.split("\n")),
+        (" ", SENTENCE_END.split(text)),
+    ):
+        parts = [p for p in parts if p.strip()]
+        if len(parts) > 1:
+            pieces = []
+            for i, part in enumerate(parts):
+                pieces += _pieces(part, max_tokens, separator if i == 0 else inner)
+            return pieces
+    size = max_tokens * 4
+    return [(separator if i == 0 else "", text[i:i + size]) for i in range(0, len(text), size)]
+
+
+def _full(tokens, added, target_tokens, max_tokens, min_tokens):
+    # Pieces under min_tokens (a lone heading, a one-line paragraph) stay with what follows.
+    return tokens + added > max_tokens or (tokens + added > target_tokens and tokens >= min_tokens)
+
+
+def _pack(pieces, target_tokens, max_tokens, min_tokens):
+    packed, current, tokens = [], "", 0
+    for separator, piece in pieces:
+        piece_tokens = approx_tokens(piece)
+        if current and _full(tokens, piece_tokens, target_tokens, max_tokens, min_tokens):
+            packed.append(current)
+            current, tokens = "", 0
+        current = f"{current}{separator}{piece}" if current else piece
+        tokens += piece_tokens
+    if current:
+        packed.append(current)
+    return packed
+
+
+def chunk_markdown(text, target_tokens=TARGET_TOKENS, max_tokens=MAX_TOKENS, min_tokens=MIN_TOKENS):
+    """``Chunk``s of ``text`` in document order, with ordinals from 0."""
+    chunks = []
+    pending, pending_heading = [], None
+
+    def flush():
+        if pending:
+            chunks.append((pending_heading, "\n\n".join(pending)))
+            pending.clear()
+
+    for heading, body in _sections(text):
+        tokens = approx_tokens(body)
+        pending_tokens = approx_tokens("\n\n".join(pending)) if pending else 0
+        if tokens > max_tokens:
+            carried = pending and pending_tokens < min_tokens
+            if carried:
+                # Leave room in the first piece for the undersized section carried into it.
+                pieces = [("\n\n", "\n\n".join(pending)), *_pieces(body, max_tokens - pending_tokens - 1)]
+                first_heading = pending_heading
+                pending.clear()
+            else:
+                flush()
+                pieces, first_heading = _pieces(body, max_tokens), heading
+            packed = _pack(pieces, target_tokens, max_tokens, min_tokens)
+            if len(packed) > 1 and approx_tokens(packed[-1]) < min_tokens:
+                pending_heading = heading
+                pending.append(packed.pop())
+            chunks.extend((first_heading if i == 0 else heading, piece) for i, piece in enumerate(packed))
+            continue
+        if pending and (pending_tokens >= min_tokens or _full(pending_tokens, tokens, target_tokens, max_tokens, min_tokens)):
+            flush()
+        if not pending:
+            pending_heading = heading
+        pending.append(body)
+
+    tail = "\n\n".join(pending)
+    if chunks and pending and approx_tokens(tail) < min_tokens:
+        previous_heading, previous = chunks[-1]
+        if approx_tokens(f"{previous}\n\n{tail}") <= max_tokens:
+            chunks[-1] = (previous_heading, f"{previous}\n\n{tail}")
+            pending.clear()
+    flush()
+
+    return [
+        Chunk(ordinal, heading, chunk_text, approx_tokens(chunk_text), text_hash(chunk_text))
+        for ordinal, (heading, chunk_text) in enumerate(chunks)
+    ]
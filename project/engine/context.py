@@ -0,0 +1,173 @@
+"""Token-budgeted context assembly for RAG prompts.
+
+``ContextBuilder.build(query, sections)`` takes retrieved sections (the rows
+of ``engine.retrieval``), best score first, and packs them under a token
+budget:
+
+* text shared with a section already taken from the same document (the
+  500-character overlap of the old splitter) is cut off;
+* a section whose word shingles are mostly contained in the context so far is
+  dropped as a near-duplicate;
+* a section that does not fit is trimmed to the passages around the query
+  terms when ``trim`` is set, and skipped otherwise.
+
+Tokens are counted locally, with tiktoken when it is installed and the
+4-characters-per-token estimate otherwise.
+
+``neighbour_targets``/``add_neighbours`` extend the best retrieved sections
+with the sections either side of them in their document (the retrievers'
+``neighbours``). Neighbours rank below every retrieved section, so they only
+fill budget the hits leave over.
+"""
+import re
+from collections import namedtuple
+
+from engine.scheduler import approx_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+Context = namedtuple("Context", "sections text tokens dropped")
+
+WORD = re.compile(r"\w+")
+PASSAGE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "what", "which", "how", "are", "was", "were", "from",
+    "about", "does", "did", "into", "their", "there", "have", "has", "its", "can", "you", "when", "why",
+}
+
+_encoding = None
+
+
+def count_tokens(text):
+    global _encoding
+    if tiktoken is None:
+        return approx_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _shingles(text, size=5):
+    words = WORD.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def strip_overlap(text, previous, min_overlap=50):
+    """``text`` without a leading or trailing run it shares with the edges of ``previous``."""
+    if len(text) < min_overlap or len(previous) < min_overlap:
+        return text
+    # text starts with the end of previous
+    at = previous.find(text[:min_overlap])
+    while at >= 0:
+        if text.startswith(previous[at:]):
+            return text[len(previous) - at:].lstrip()
+        at = previous.find(text[:min_overlap], at + 1)
+    # text ends with the start of previous
+    at = text.find(previous[:min_overlap])
+    while at >= 0:
+        if previous.startswith(text[at:]):
+            return text[:at].rstrip()
+        at = text.find(previous[:min_overlap], at + 1)
+    return text
+
+
+def trim_to_query(text, query, max_tokens, window=1):
+    """The passages of ``text`` that mention query terms, ``window`` passages either side, under ``max_tokens``."""
+    terms = {w for w in WORD.findall(query.lower()) if len(w) > 2 and w not in STOPWORDS}
+    passages = [p for p in PASSAGE_END.split(text) if p and p.strip()]
+    hits = [i for i, p in enumerate(passages) if terms & set(WORD.findall(p.lower()))]
+    # Passages with the most distinct query terms are kept first.
+    hits.sort(key=lambda i: -len(terms & set(WORD.findall(passages[i].lower()))))
+
+    chosen, tokens = set(), 0
+    for i in hits:
+        for j in range(max(0, i - window), min(len(passages), i + window + 1)):
+            if j in chosen:
+                continue
+            cost = count_tokens(passages[j]) + 1  # the joining space / ellipsis
+            if tokens + cost > max_tokens:
+                continue
+            chosen.add(j)
+            tokens += cost
+    if not chosen:
+        return ""
+    parts, last = [], None
+    for j in sorted(chosen):
+        if last is not None and j != last + 1:
+            parts.append("…")
+        parts.append(passages[j].strip())
+        last = j
+    return " ".join(parts)
+
+
+def neighbour_targets(sections, count):
+    """The ``count`` best ``sections`` that have an ordinal to look around."""
+    ranked = sorted(sections, key=lambda s: s.get("score") or 0.0, reverse=True)
+    return [s for s in ranked if s.get("ordinal") is not None][:count]
+
+
+def add_neighbours(sections, neighbours):
+    """``sections`` followed by the rows of ``neighbours`` (one list per target) not already among them."""
+    seen = {(s["doc_name"], s.get("ordinal")) for s in sections}
+    score = min((s.get("score") or 0.0 for s in sections), default=0.0)
+    extended = list(sections)
+    for rows in neighbours:
+        for row in rows:
+            key = (row["doc_name"], row["ordinal"])
+            if key not in seen:
+                seen.add(key)
+                extended.append({**row, "score": score})
+    return extended
+
+
+def format_section(number, section):
+    heading = f" — {section['heading']}" if section.get("heading") else ""
+    return f"[Section {number}] {section['doc_name']}{heading}\n{section['section_text'].strip()}"
+
+
+class ContextBuilder:
+    def __init__(self, budget_tokens=6000, duplicate_threshold=0.8, trim=False, min_section_tokens=40):
+        self.budget_tokens = budget_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.trim = trim
+        self.min_section_tokens = min_section_tokens
+
+    def build(self, query, sections):
+        ranked = sorted(sections, key=lambda s: s.get("score") or 0.0, reverse=True)
+        kept, seen, text = [], set(), ""
+        dropped = {"duplicates": 0, "over_budget": 0, "trimmed": 0}
+
+        for section in ranked:
+            section_text = section["section_text"] or ""
+            for other in kept:
+                if other["doc_name"] == section["doc_name"]:
+                    section_text = strip_overlap(section_text, other["section_text"])
+            shingles = _shingles(section_text)
+            if not section_text.strip() or len(shingles & seen) >= self.duplicate_threshold * len(shingles):
+                dropped["duplicates"] += 1
+                continue
+
+            candidate = {**section, "section_text": section_text}
+            extended = _join(text, format_section(len(kept) + 1, candidate))
+            if count_tokens(extended) > self.budget_tokens:
+                header = _join(text, format_section(len(kept) + 1, {**candidate, "section_text": ""}))
+                room = self.budget_tokens - count_tokens(header)
+                candidate["section_text"] = trim_to_query(section_text, query, room) if self.trim else ""
+                extended = _join(text, format_section(len(kept) + 1, candidate))
+                if count_tokens(candidate["section_text"]) < self.min_section_tokens or count_tokens(extended) > self.budget_tokens:
+                    dropped["over_budget"] += 1
+                    continue
+                dropped["trimmed"] += 1
+
+            kept.append(candidate)
+            seen |= _shingles(candidate["section_text"])
+            text = extended
+
+        return Context(kept, text, count_tokens(text), dropped)
+
+
+def _join(text, block):
+    return f"{text}\n\n{block}" if text else block
@@ -0,0 +1,174 @@
+"""Instrumented Neo4j access: named queries, timeouts and read/write routing.
+
+Statements go through ``Database.execute_read`` / ``execute_write`` (or the
+``aexecute_*`` coroutines) under a short name such as ``"get_document"``.
+Each call runs as a managed transaction, so the driver retries transient
+errors and a cluster routes reads to a follower. ``timeout_`` (default
+``query_timeout``) is the server-side transaction timeout in seconds. The
+query name is attached as transaction metadata, so it also shows up in
+``SHOW TRANSACTIONS`` and the query log.
+
+Per query name the calls record, in ``engine.metrics``:
+
+* ``neo4j_query_seconds``: client-side latency, including pool acquisition;
+* ``neo4j_query_server_available_seconds`` / ``..._consumed_seconds``: the
+  server's ``result_available_after`` and ``result_consumed_after``;
+* ``neo4j_query_records`` and ``neo4j_query_bytes``: rows returned and their
+  approximate size (UTF-8 strings, 8 bytes per number);
+* ``neo4j_query_errors_total``, by exception class.
+
+Within a request, each call is also a ``db.<name>`` span (see ``engine.profiling``).
+
+Parameters are keyword arguments; the name, Cypher and ``timeout_`` come first
+and are positional-only, so a query may use ``$name`` or ``$query`` itself.
+"""
+import time
+from collections.abc import Mapping
+
+from neo4j import unit_of_work
+
+from engine import metrics
+from engine.profiling import span
+
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+BYTE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def approximate_bytes(value):
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8", "replace"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, Mapping) or hasattr(value, "items"):
+        return sum(len(str(k)) + approximate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(approximate_bytes(v) for v in value)
+    return len(str(value))
+
+
+class QueryMetrics:
+    def __init__(self, name):
+        labels = {"query": name}
+        self.seconds = metrics.histogram("neo4j_query_seconds", "Client-side latency of a named Cypher query", labels=labels)
+        self.available = metrics.histogram(
+            "neo4j_query_server_available_seconds", "Server time until the first record was available", labels=labels,
+        )
+        self.consumed = metrics.histogram(
+            "neo4j_query_server_consumed_seconds", "Server time until the result was consumed", labels=labels,
+        )
+        self.records = metrics.histogram("neo4j_query_records", "Records returned by a named query", COUNT_BUCKETS, labels)
+        self.bytes = metrics.histogram("neo4j_query_bytes", "Approximate bytes returned by a named query", BYTE_BUCKETS, labels)
+        self.labels = labels
+
+    def observe(self, seconds, records, summary):
+        self.seconds.observe(seconds)
+        self.records.observe(len(records))
+        self.bytes.observe(sum(approximate_bytes(dict(r.items())) for r in records))
+        if summary.result_available_after is not None:
+            self.available.observe(summary.result_available_after / 1000.0)
+        if summary.result_consumed_after is not None:
+            self.consumed.observe(summary.result_consumed_after / 1000.0)
+
+    def error(self, exc, seconds):
+        self.seconds.observe(seconds)
+        metrics.counter(
+            "neo4j_query_errors_total", "Named queries that raised", {**self.labels, "error": type(exc).__name__},
+        ).inc()
+
+
+_query_metrics = {}
+
+
+def query_metrics(name):
+    if name not in _query_metrics:
+        _query_metrics[name] = QueryMetrics(name)
+    return _query_metrics[name]
+
+
+def _work(name, cypher, params, timeout):
+    @unit_of_work(timeout=timeout, metadata={"query": name})
+    def work(tx):
+        result = tx.run(cypher, params)
+        records = list(result)
+        return records, result.consume()
+    return work
+
+
+def _async_work(name, cypher, params, timeout):
+    @unit_of_work(timeout=timeout, metadata={"query": name})
+    async def work(tx):
+        result = await tx.run(cypher, params)
+        records = [record async for record in result]
+        return records, await result.consume()
+    return work
+
+
+class Database:
+    """``driver`` is a Neo4j driver; ``async_driver`` an async driver, or a callable creating one on first use."""
+
+    def __init__(self, driver, async_driver=None, query_timeout=None, database=None):
+        self.driver = driver
+        self._async_driver = async_driver
+        self.query_timeout = query_timeout
+        self.database = database
+
+    @property
+    def async_driver(self):
+        if callable(self._async_driver):
+            self._async_driver = self._async_driver()
+        return self._async_driver
+
+    def session(self, **config):
+        """A raw session, for callers that manage their own transactions."""
+        return self.driver.session(database=self.database, **config)
+
+    def _execute(self, method, query_name, cypher, timeout, params):
+        observer = query_metrics(query_name)
+        started = time.perf_counter()
+        try:
+            with span(f"db.{query_name}"), self.session() as session:
+                records, summary = getattr(session, method)(_work(query_name, cypher, params, timeout))
+        except Exception as e:
+            observer.error(e, time.perf_counter() - started)
+            raise
+        observer.observe(time.perf_counter() - started, records, summary)
+        return records
+
+    async def _aexecute(self, method, query_name, cypher, timeout, params):
+        observer = query_metrics(query_name)
+        started = time.perf_counter()
+        try:
+            with span(f"db.{query_name}"):
+                async with self.async_driver.session(database=self.database) as session:
+                    records, summary = await getattr(session, method)(_async_work(query_name, cypher, params, timeout))
+        except Exception as e:
+            observer.error(e, time.perf_counter() - started)
+            raise
+        observer.observe(time.perf_counter() - started, records, summary)
+        return records
+
+    def execute_read(self, query_name, cypher, /, timeout_=None, **params):
+        """Records of ``cypher`` run in a read transaction."""
+        return self._execute("execute_read", query_name, cypher, timeout_ or self.query_timeout, params)
+
+    def execute_write(self, query_name, cypher, /, timeout_=None, **params):
+        """Records of ``cypher`` run in a write transaction."""
+        return self._execute("execute_write", query_name, cypher, timeout_ or self.query_timeout, params)
+
+    async def aexecute_read(self, query_name, cypher, /, timeout_=None, **params):
+        return await self._aexecute("execute_read", query_name, cypher, timeout_ or self.query_timeout, params)
+
+    async def aexecute_write(self, query_name, cypher, /, timeout_=None, **params):
+        return await self._aexecute("execute_write", query_name, cypher, timeout_ or self.query_timeout, params)
+
+    def close(self):
+        if self.driver:
+            self.driver.close()
+
+    async def aclose(self):
+        if self._async_driver is not None and not callable(self._async_driver):
+            await self._async_driver.close()
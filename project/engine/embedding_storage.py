@@ -0,0 +1,315 @@
+"""How node and section embeddings are stored in the graph.
+
+By default ``embedding`` holds the model's full output as a float32 vector
+property (``db.create.setNodeVectorProperty``). Graphs written before the
+batched writer may still hold float64 lists, twice the size;
+``migrate_embeddings`` rewrites them.
+
+With ``EMBEDDING_INDEX_DIMENSIONS`` below ``EMBEDDING_DIMENSIONS`` the storage
+is compact. ``embedding``, the property the vector indexes cover, keeps only
+the first ``index_dimensions`` components, renormalized. text-embedding-3
+models are trained so that such prefixes remain usable embeddings. The full
+vector is kept as ``embedding_int8``, a byte array of int8 codes, with its
+scale in ``embedding_scale``. That is a quarter of the float32 size, and it is
+outside any index. A search asks the index for ``rerank_candidates`` times
+as many hits, then re-ranks them by cosine against the decoded vectors, which
+restores (nearly) the full-precision order. Query embeddings are truncated
+the same way before they reach an index (``index_vector``).
+
+``storage_report`` estimates the property and index sizes of a storage
+choice; ``recall_report`` measures its recall@k against exact float32 search
+over a sample of real vectors.
+"""
+import os
+
+import numpy as np
+
+from engine.embeddings import DEFAULT_DIMENSIONS
+from engine.vector_index import NODE_LABELS, SECTION_LABEL, normalize_rows, top_k
+
+DEFAULT_INDEX_DIMENSIONS = int(os.environ.get("EMBEDDING_INDEX_DIMENSIONS", 0)) or DEFAULT_DIMENSIONS
+DEFAULT_RERANK_CANDIDATES = int(os.environ.get("EMBEDDING_RERANK_CANDIDATES", 4))
+
+# Rough size of one vector's HNSW links in a Neo4j (Lucene) vector index: M=16
+# neighbours on the base layer counted twice, 4-byte ids, plus upper layers.
+HNSW_LINK_BYTES = 2 * 16 * 4 + 16
+
+LABELS = [*NODE_LABELS, SECTION_LABEL]
+
+# Keyset-paged by element id: Sections written before sections had ids have no other key.
+READ_QUERY = """
+MATCH (n:`{label}`)
+WHERE elementId(n) > $after AND (n.embedding IS NOT NULL OR n.embedding_int8 IS NOT NULL)
+RETURN elementId(n) AS key, n.embedding AS embedding, n.embedding_int8 AS codes, n.embedding_scale AS scale
+ORDER BY key
+LIMIT $limit
+"""
+
+WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (n:`{label}`)
+WHERE elementId(n) = row.key
+SET n.embedding_int8 = row.embedding_int8, n.embedding_scale = row.embedding_scale
+WITH n, row
+CALL db.create.setNodeVectorProperty(n, 'embedding', row.embedding)
+"""
+
+COUNT_QUERY = "MATCH (n:`{label}`) WHERE n.embedding IS NOT NULL RETURN count(n) AS vectors"
+
+# Nodes whose full vector is gone: reduced ``embedding`` and no int8 copy.
+UNCONVERTIBLE_QUERY = """
+MATCH (n:`{label}`)
+WHERE n.embedding_int8 IS NULL AND n.embedding IS NOT NULL AND size(n.embedding) <> $dimensions
+RETURN count(n) AS nodes
+"""
+
+QUANTIZED_QUERY = "MATCH (n:`{label}`) WHERE n.embedding_int8 IS NOT NULL RETURN count(n) AS nodes"
+
+
+class EmbeddingMigrationError(ValueError):
+    pass
+
+
+def truncate(vectors, dimensions):
+    """The first ``dimensions`` components of each row, renormalized to unit length."""
+    return normalize_rows(np.asarray(vectors, dtype=np.float32)[..., :dimensions])
+
+
+def quantize(vectors):
+    """``(codes, scales)``: int8 codes and one float32 scale per row (``row ~ codes * scale``)."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes, scales):
+    return np.asarray(codes, dtype=np.int8).astype(np.float32) * np.asarray(scales, dtype=np.float32).reshape(-1, 1)
+
+
+class EmbeddingStorage:
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, index_dimensions=DEFAULT_INDEX_DIMENSIONS,
+                 rerank_candidates=DEFAULT_RERANK_CANDIDATES):
+        if index_dimensions > dimensions:
+            raise ValueError(f"index_dimensions ({index_dimensions}) exceeds the model's {dimensions} dimensions")
+        self.dimensions = dimensions
+        self.index_dimensions = index_dimensions
+        self.rerank_candidates = max(1, rerank_candidates)
+
+    @property
+    def compact(self):
+        return self.index_dimensions < self.dimensions
+
+    def index_vector(self, vector):
+        """``vector`` as stored in, or compared against, the ``embedding`` property."""
+        if not self.compact or vector is None:
+            return vector
+        return truncate(vector, self.index_dimensions)[0].tolist()
+
+    def properties(self, vector):
+        """``{"embedding", "embedding_int8", "embedding_scale"}`` to write for a full-precision ``vector``."""
+        return self.properties_batch([vector])[0]
+
+    def properties_batch(self, vectors):
+        """``properties`` of each of ``vectors``, converted as one matrix."""
+        if not self.compact:
+            return [{"embedding": v, "embedding_int8": None, "embedding_scale": None} for v in vectors]
+        if not vectors:
+            return []
+        matrix = np.asarray(vectors, dtype=np.float32)
+        codes, scales = quantize(matrix)
+        reduced = truncate(matrix, self.index_dimensions).tolist()
+        return [
+            {"embedding": e, "embedding_int8": c.tobytes(), "embedding_scale": s}
+            for e, c, s in zip(reduced, codes, scales.tolist())
+        ]
+
+    def full_vector(self, embedding, codes=None, scale=None):
+        """The full-precision vector of a stored node (decoded from ``embedding_int8`` when present)."""
+        if codes is not None and scale is not None:
+            return dequantize(np.frombuffer(bytes(codes), dtype=np.int8), [scale])[0].tolist()
+        if embedding is None:
+            return None
+        return list(embedding)
+
+    def candidates(self, k):
+        """How many index hits to fetch for ``k`` results."""
+        return k * self.rerank_candidates if self.compact else k
+
+    def rerank(self, query, rows, k):
+        """The ``k`` best of ``[(row, index score, codes, scale), ...]`` as ``[(row, score)]``.
+
+        Rows with codes are scored ``(1 + cos) / 2`` against the full query,
+        the scale of Neo4j's cosine scores; rows without keep their index score.
+        """
+        scores = np.array([score for _, score, _, _ in rows], dtype=np.float64)
+        coded = [i for i, (_, _, codes, scale) in enumerate(rows) if codes is not None and scale is not None]
+        if coded:
+            # The scale cancels out of the cosine, so the int8 codes are compared directly.
+            matrix = normalize_rows(
+                np.frombuffer(b"".join(bytes(rows[i][2]) for i in coded), dtype=np.int8).reshape(len(coded), -1)
+            )
+            scores[coded] = (1.0 + matrix @ normalize_rows(query)[0]) / 2.0
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(rows[i][0], float(scores[i])) for i in order]
+
+
+def default_storage():
+    return EmbeddingStorage()
+
+
+def _read_batches(session, label, batch_size):
+    after = ""
+    query = READ_QUERY.format(label=label)
+    while True:
+        records = list(session.run(query, after=after, limit=batch_size))
+        if not records:
+            return
+        yield records
+        after = records[-1]["key"]
+
+
+def _count(session, query, labels, **params):
+    counts = {label: session.run(query.format(label=label), **params).single()["nodes"] for label in labels}
+    return {label: n for label, n in counts.items() if n}
+
+
+def check_migration(driver, storage, labels=LABELS, allow_lossy=False):
+    """Raise ``EmbeddingMigrationError`` unless every stored vector converts to ``storage`` without loss.
+
+    A node whose ``embedding`` was already reduced and has no int8 copy
+    cannot be restored to full precision. Writing float32 vectors for nodes
+    only kept as int8 stores the decoded codes, not the model's vectors; that
+    is refused unless ``allow_lossy`` (re-ingesting restores them exactly).
+    """
+    with driver.session() as session:
+        unconvertible = _count(session, UNCONVERTIBLE_QUERY, labels, dimensions=storage.dimensions)
+        quantized = {} if storage.compact else _count(session, QUANTIZED_QUERY, labels)
+    if unconvertible:
+        details = ", ".join(f"{label}: {n}" for label, n in unconvertible.items())
+        raise EmbeddingMigrationError(
+            f"Vectors without a full-precision copy ({details}); re-ingest those documents before migrating"
+        )
+    if quantized and not allow_lossy:
+        details = ", ".join(f"{label}: {n}" for label, n in quantized.items())
+        raise EmbeddingMigrationError(
+            f"Vectors stored only as int8 ({details}) would be written back as lossy float32 decodings; "
+            "re-ingest for exact vectors, or allow the lossy conversion"
+        )
+
+
+def migrate_embeddings(driver, storage, labels=LABELS, batch_size=1000, allow_lossy=False):
+    """Rewrite stored embeddings in ``storage``'s layout; returns ``{label: {"converted", "skipped"}}``.
+
+    The full vector comes from ``embedding_int8`` when present, else from
+    ``embedding``. ``check_migration`` runs first, and a node skipped
+    anyway (written concurrently) raises ``EmbeddingMigrationError`` once
+    the rest are converted. Drop the vector indexes first if their
+    dimensions change (see ``engine.schema.drop_vector_indexes``).
+    """
+    check_migration(driver, storage, labels, allow_lossy)
+    write = {label: WRITE_QUERY.format(label=label) for label in labels}
+    report = {}
+    with driver.session() as reader, driver.session() as writer:
+        for label in labels:
+            counts = report[label] = {"converted": 0, "skipped": 0}
+            for records in _read_batches(reader, label, batch_size):
+                rows, keys = [], []
+                for r in records:
+                    vector = storage.full_vector(r["embedding"], r["codes"], r["scale"])
+                    if vector is None or len(vector) != storage.dimensions:
+                        counts["skipped"] += 1
+                        continue
+                    rows.append(vector)
+                    keys.append(r["key"])
+                rows = [{"key": key, **p} for key, p in zip(keys, storage.properties_batch(rows))]
+                if rows:
+                    writer.execute_write(lambda tx: tx.run(write[label], rows=rows).consume())
+                counts["converted"] += len(rows)
+    skipped = {label: counts["skipped"] for label, counts in report.items() if counts["skipped"]}
+    if skipped:
+        details = ", ".join(f"{label}: {n}" for label, n in skipped.items())
+        raise EmbeddingMigrationError(f"Vectors left unconverted ({details}); re-ingest those documents")
+    return report
+
+
+def vector_counts(driver, labels=LABELS):
+    with driver.session() as session:
+        return {label: session.run(COUNT_QUERY.format(label=label)).single()["vectors"] for label in labels}
+
+
+def storage_bytes(dimensions, index_dimensions=None, layout="float32"):
+    """Approximate bytes per node: ``{"properties", "index"}``.
+
+    ``layout`` is ``float64`` (legacy lists), ``float32`` or ``compact``
+    (``index_dimensions`` float32 in the index plus the int8 full vector).
+    """
+    index_dimensions = index_dimensions or dimensions
+    if layout == "float64":
+        return {"properties": 8 * dimensions, "index": 4 * dimensions + HNSW_LINK_BYTES}
+    if layout == "float32":
+        return {"properties": 4 * dimensions, "index": 4 * dimensions + HNSW_LINK_BYTES}
+    return {"properties": 4 * index_dimensions + dimensions + 4, "index": 4 * index_dimensions + HNSW_LINK_BYTES}
+
+
+def storage_report(counts, dimensions, index_dimensions=(1024, 512, 256)):
+    """Total property and index bytes per layout for ``counts`` (``{label: vectors}``)."""
+    vectors = sum(counts.values())
+    layouts = [("float64 lists", "float64", dimensions), (f"float32 {dimensions}-d", "float32", dimensions)]
+    layouts += [(f"{d}-d index + int8", "compact", d) for d in index_dimensions if d < dimensions]
+    report = []
+    for name, layout, dims in layouts:
+        per_vector = storage_bytes(dimensions, dims, layout)
+        report.append({
+            "layout": name, "index_dimensions": dims,
+            "property_bytes": per_vector["properties"] * vectors, "index_bytes": per_vector["index"] * vectors,
+        })
+    return report
+
+
+def _exact_neighbours(matrix, queries, k):
+    # Leave-one-out: each query is a stored row and must not find itself.
+    scores = matrix[queries] @ matrix.T
+    scores[np.arange(len(queries)), queries] = -np.inf
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def _recall(found, exact, k):
+    return float(np.mean([len(f & e) / k for f, e in zip(found, exact)]))
+
+
+def recall_report(vectors, k=10, index_dimensions=(1024, 512, 256), rerank_candidates=DEFAULT_RERANK_CANDIDATES,
+                  queries=200, seed=0):
+    """recall@k of each storage choice against exact float32 search, over ``queries`` sampled rows of ``vectors``."""
+    matrix = normalize_rows(vectors)
+    rows, dimensions = matrix.shape
+    sample = np.random.default_rng(seed).choice(rows, size=min(queries, rows), replace=False)
+    exact = _exact_neighbours(matrix, sample, k)
+    codes, scales = quantize(matrix)
+    decoded = normalize_rows(dequantize(codes, scales))
+
+    def search(index, q, n):
+        idx, _ = top_k(index, matrix[q][:index.shape[1]], n + 1)
+        return [i for i in idx.tolist() if i != q][:n]
+
+    report = [{"layout": f"int8 {dimensions}-d", "index_dimensions": dimensions, "recall": _recall(
+        [set(search(decoded, q, k)) for q in sample], exact, k)}]
+    for dims in index_dimensions:
+        if dims >= dimensions:
+            continue
+        reduced = truncate(matrix, dims)
+        plain, reranked = [], []
+        for q in sample:
+            candidates = search(reduced, q, k * rerank_candidates)
+            plain.append(set(candidates[:k]))
+            order = np.argsort(-(decoded[candidates] @ matrix[q]))[:k]
+            reranked.append({candidates[i] for i in order})
+        report.append({"layout": f"{dims}-d index", "index_dimensions": dims, "recall": _recall(plain, exact, k)})
+        report.append({
+            "layout": f"{dims}-d index + int8 re-rank x{rerank_candidates}", "index_dimensions": dims,
+            "recall": _recall(reranked, exact, k),
+        })
+    return report
@@ -0,0 +1,255 @@
+"""Shared embedding service used by ingestion and the API.
+
+Texts are deduplicated, looked up in a persistent cache keyed by
+(model, sha256(text)) and only the misses are sent upstream, in batches.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import openai
+
+DEFAULT_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+DEFAULT_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", 1536))
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _as_list(vector):
+    # The Neo4j driver and JSON responses want plain lists, not numpy rows.
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+class OpenAIEmbeddingBackend:
+    """Calls the OpenAI embeddings endpoint with a list of inputs per request."""
+
+    def __init__(self, model=DEFAULT_MODEL, dimensions=DEFAULT_DIMENSIONS):
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        response = openai.Embedding.create(model=self.model, input=list(texts))
+        data = sorted(response["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+    async def aembed(self, texts):
+        response = await openai.Embedding.acreate(model=self.model, input=list(texts))
+        data = sorted(response["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+
+class FakeEmbeddingBackend:
+    """Deterministic local backend: the same text always maps to the same unit vector.
+
+    ``latency`` (seconds per request) stands in for the network round trip.
+    """
+
+    def __init__(self, model="fake-embedding", dimensions=DEFAULT_DIMENSIONS, latency=0.0):
+        self.model = model
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+
+    def embed(self, texts):
+        time.sleep(self.latency)
+        return self._vectors(texts)
+
+    async def aembed(self, texts):
+        await asyncio.sleep(self.latency)
+        return self._vectors(texts)
+
+    def _vectors(self, texts):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            seed = int(text_hash(text)[:16], 16)
+            vec = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+            vec /= np.linalg.norm(vec)
+            vectors.append(vec.tolist())
+        return vectors
+
+
+class EmbeddingCache:
+    """Append-only on-disk float32 store, one directory per model and dimensions.
+
+    ``keys.txt`` holds one text hash per line and ``vectors.f32`` the matching
+    rows, so the whole cache is loaded with a single ``np.fromfile``. Rows are
+    appended before their keys; loading cuts both files back to the entries
+    complete in each, so a crash between (or during) the two writes cannot
+    pair later keys with the wrong rows.
+    """
+
+    def __init__(self, root, model, dimensions=DEFAULT_DIMENSIONS):
+        self.dimensions = dimensions
+        self.path = Path(root) / f"{model.replace('/', '_')}-{dimensions}"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._keys_path = self.path / "keys.txt"
+        self._vectors_path = self.path / "vectors.f32"
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._load()
+
+    def _load(self):
+        if not self._keys_path.exists() or not self._vectors_path.exists():
+            return
+        data = self._keys_path.read_bytes()
+        # Only newline-terminated keys were written completely.
+        keys = data[:data.rfind(b"\n") + 1].decode("utf-8").splitlines()
+        vectors = np.fromfile(self._vectors_path, dtype=np.float32)
+        n = min(len(keys), vectors.size // self.dimensions)
+        keys = keys[:n]
+        vectors = vectors[: n * self.dimensions].reshape(n, self.dimensions)
+        key_bytes = sum(len(k) + 1 for k in keys)
+        if len(data) != key_bytes:
+            os.truncate(self._keys_path, key_bytes)
+        if self._vectors_path.stat().st_size != vectors.nbytes:
+            os.truncate(self._vectors_path, vectors.nbytes)
+        self._rows = dict(zip(keys, vectors))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key):
+        return self._rows.get(key)
+
+    def put_many(self, items):
+        """Store ``(key, vector)`` pairs and append them to disk."""
+        with self._lock:
+            items = [(k, v) for k, v in items if k not in self._rows]
+            if not items:
+                return
+            block = np.asarray([v for _, v in items], dtype=np.float32).reshape(len(items), self.dimensions)
+            with open(self._vectors_path, "ab") as f:
+                block.tofile(f)
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{k}\n" for k, _ in items))
+            for (key, _), row in zip(items, block):
+                self._rows[key] = row
+
+
+class EmbeddingService:
+    """Batching, deduplicating and caching front for an embedding backend."""
+
+    def __init__(self, backend, cache=None, batch_size=256, max_batch_chars=400_000):
+        self.backend = backend
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "cache_hits": 0, "embedded": 0, "requests": 0}
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    def _lookup(self, key):
+        vector = self._memory.get(key)
+        if vector is None and self.cache is not None:
+            vector = self.cache.get(key)
+        return vector
+
+    def _batches(self, texts):
+        batch, chars = [], 0
+        for text in texts:
+            if batch and (len(batch) >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                yield batch
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def _partition(self, texts):
+        keys = [text_hash(t) for t in texts]
+        found, missing = {}, {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+        return keys, found, missing
+
+    def _store(self, batch, vectors, found):
+        batch_keys = [text_hash(t) for t in batch]
+        if self.cache is not None:
+            self.cache.put_many(zip(batch_keys, vectors))
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["embedded"] += len(batch)
+            for key, vector in zip(batch_keys, vectors):
+                if self.cache is None:
+                    self._memory[key] = np.asarray(vector, dtype=np.float32)
+                found[key] = vector
+
+    def _finish(self, keys, found, missing):
+        with self._lock:
+            self.stats["texts"] += len(keys)
+            self.stats["cache_hits"] += len(keys) - len(missing)
+        return [_as_list(found[key]) for key in keys]
+
+    def embed_many(self, texts):
+        """Return one embedding per input text, in input order."""
+        keys, found, missing = self._partition(list(texts))
+        for batch in self._batches(list(missing.values())):
+            self._store(batch, self.backend.embed(batch), found)
+        return self._finish(keys, found, missing)
+
+    async def aembed_many(self, texts, scheduler=None):
+        """Async ``embed_many``; batches run concurrently, through ``scheduler`` when given."""
+        keys, found, missing = self._partition(list(texts))
+
+        async def run(batch):
+            if scheduler is not None:
+                vectors = await scheduler.embed(self.backend, batch)
+            else:
+                vectors = await self.backend.aembed(batch)
+            self._store(batch, vectors, found)
+
+        await asyncio.gather(*[run(batch) for batch in self._batches(list(missing.values()))])
+        return self._finish(keys, found, missing)
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def report(self):
+        """Counters plus derived hit rate and round trips saved versus one call per text."""
+        stats = dict(self.stats)
+        stats["hit_rate"] = stats["cache_hits"] / stats["texts"] if stats["texts"] else 0.0
+        stats["requests_saved"] = stats["texts"] - stats["requests"]
+        return stats
+
+
+def create_backend(name=None, model=DEFAULT_MODEL, dimensions=DEFAULT_DIMENSIONS):
+    name = name or os.environ.get("EMBEDDING_BACKEND", "openai")
+    if name == "openai":
+        return OpenAIEmbeddingBackend(model=model, dimensions=dimensions)
+    if name == "fake":
+        latency = float(os.environ.get("FAKE_EMBEDDING_LATENCY", 0.0))
+        return FakeEmbeddingBackend(dimensions=dimensions, latency=latency)
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service():
+    """Process-wide service configured from ``EMBEDDING_BACKEND`` / ``EMBEDDING_CACHE_DIR``."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            backend = create_backend()
+            cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "embedding_cache")
+            cache = EmbeddingCache(cache_dir, backend.model, backend.dimensions) if cache_dir else None
+            _service = EmbeddingService(backend, cache=cache)
+        return _service
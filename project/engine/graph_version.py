@@ -0,0 +1,56 @@
+"""Graph version stamp bumped by ingestion and read by the API's caches.
+
+The stamp lives on a single ``GraphMeta`` node. Readers keep the last value
+for ``ttl`` seconds, so cached responses can be validated without a Bolt
+round trip per request.
+"""
+import asyncio
+import threading
+import time
+
+GRAPH_META_LABEL = "GraphMeta"
+
+BUMP_QUERY = f"""
+MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime()
+RETURN m.version AS version
+"""
+
+READ_QUERY = f"MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}}) RETURN m.version AS version"
+
+
+def bump_graph_version(driver):
+    """Mark the graph as changed; call after every ingestion write."""
+    with driver.session() as session:
+        return session.run(BUMP_QUERY).single()["version"]
+
+
+def read_graph_version(driver):
+    with driver.session() as session:
+        record = session.run(READ_QUERY).single()
+        return record["version"] if record else 0
+
+
+class GraphVersionTracker:
+    def __init__(self, read, ttl=5.0):
+        self._read = read
+        self.ttl = ttl
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return self._version is not None and time.monotonic() - self._checked < self.ttl
+
+    def refresh(self):
+        with self._lock:
+            if not self._fresh():
+                self._version = self._read()
+                self._checked = time.monotonic()
+            return self._version
+
+    def current(self):
+        return self._version if self._fresh() else self.refresh()
+
+    async def acurrent(self):
+        return self._version if self._fresh() else await asyncio.to_thread(self.refresh)
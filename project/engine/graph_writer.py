@@ -0,0 +1,197 @@
+"""Batched writer for ingested documents.
+
+``build_graph`` hands one record per document to ``GraphWriter.add``;
+``flush`` writes everything accumulated so far in phases, one label or
+relationship type at a time, each as ``UNWIND`` batches of ``batch_size`` rows
+in their own managed transaction. Shared nodes (an ``Entity`` mentioned by
+many documents) are merged once per flush rather than once per document, and a
+single writer avoids the lock contention of concurrent per-document
+statements. Embeddings are set with ``db.create.setNodeVectorProperty`` so
+they are stored as vector-typed properties. The MERGE keys are backed by the
+uniqueness constraints in ``engine.schema``.
+
+A record is::
+
+    {"name": str, "text": str, "summary": str,
+     "sections": [{"ordinal", "heading", "text", "token_count", "content_hash", "embedding"}, ...],
+     "entities": {name: embedding}, "organisms": {...}, "compounds": {...},
+     "contributors": {...}, "mentioned": {...},
+     "aliases": {label: {name: [alias, ...]}}}
+
+``aliases`` (optional) lists other spellings that ``engine.canonicalize``
+resolved to a node name; they are added to the node's ``aliases``.
+
+Embeddings are the model's full output; ``storage`` (see
+``engine.embedding_storage``) decides what is written for them.
+
+A section whose ``embedding`` is ``None`` is unchanged since the last ingest
+(same ordinal and ``content_hash``, see ``section_hashes``) and is left as it
+is; sections past the new last ordinal are deleted.
+"""
+import threading
+import time
+
+from engine.embedding_storage import default_storage
+
+# record key -> (label, relationship from Document)
+LINKED_NODES = {
+    "entities": ("Entity", "MENTIONS"),
+    "organisms": ("Organism", "MENTIONS_ORGANISM"),
+    "compounds": ("Compound", "MENTIONS_COMPOUND"),
+    "contributors": ("Person", "CONTRIBUTED_BY"),
+    "mentioned": ("Person", "MENTIONS_PERSON"),
+}
+
+# Re-ingested documents replace their sections and links rather than adding to them. Sections
+# written before sections had ids are always replaced.
+CLEAR_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {name: row.name})
+OPTIONAL MATCH (d)-[:HAS_SECTION]->(old:Section)
+WHERE old.id IS NULL OR NOT old.id IN row.keep
+DETACH DELETE old
+WITH DISTINCT d
+MATCH (d)-[r:MENTIONS|MENTIONS_ORGANISM|MENTIONS_COMPOUND|CONTRIBUTED_BY|MENTIONS_PERSON]->()
+DELETE r
+"""
+
+DOCUMENT_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Document {name: row.name})
+SET d.text = row.text, d.summary = row.summary
+"""
+
+NODE_QUERY = """
+UNWIND $rows AS row
+MERGE (n:{label} {{name: row.name}})
+SET n.aliases = CASE WHEN size(row.aliases) = 0 THEN n.aliases
+    ELSE coalesce(n.aliases, []) + [a IN row.aliases WHERE NOT a IN coalesce(n.aliases, [])] END,
+    n.embedding_int8 = row.embedding_int8, n.embedding_scale = row.embedding_scale
+WITH n, row
+CALL db.create.setNodeVectorProperty(n, 'embedding', row.embedding)
+"""
+
+SECTION_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {name: row.doc})
+MERGE (sec:Section {id: row.id})
+SET sec.text = row.text, sec.doc = row.doc, sec.ordinal = row.ordinal, sec.heading = row.heading,
+    sec.token_count = row.token_count, sec.content_hash = row.content_hash,
+    sec.embedding_int8 = row.embedding_int8, sec.embedding_scale = row.embedding_scale
+MERGE (d)-[:HAS_SECTION]->(sec)
+WITH sec, row
+CALL db.create.setNodeVectorProperty(sec, 'embedding', row.embedding)
+"""
+
+LINK_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {{name: row.doc}})
+MATCH (n:{label} {{name: row.name}})
+MERGE (d)-[:{rel}]->(n)
+"""
+
+
+# Only sections with ids can be kept (see CLEAR_QUERY).
+SECTION_HASHES_QUERY = """
+MATCH (:Document {name: $doc})-[:HAS_SECTION]->(s:Section)
+WHERE s.id IS NOT NULL
+RETURN s.ordinal AS ordinal, s.content_hash AS content_hash
+"""
+
+
+def section_id(doc_name, ordinal):
+    return f"{doc_name}#{ordinal}"
+
+
+def section_hashes(driver, doc_name):
+    """``{ordinal: content_hash}`` of the sections stored for ``doc_name``."""
+    with driver.session() as session:
+        return {r["ordinal"]: r["content_hash"] for r in session.run(SECTION_HASHES_QUERY, doc=doc_name)}
+
+
+class GraphWriter:
+    def __init__(self, driver, batch_size=1000, storage=None):
+        self.driver = driver
+        self.batch_size = batch_size
+        self.storage = storage or default_storage()
+        self._records = {}
+        self._lock = threading.Lock()
+        # Flushes from concurrent callers run one after another, never interleaved.
+        self._flush_lock = threading.Lock()
+        self.stats = {
+            "documents": 0, "nodes": 0, "relationships": 0, "sections_unchanged": 0, "transactions": 0, "seconds": 0.0,
+        }
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, record):
+        with self._lock:
+            self._records[record["name"]] = record
+
+    def _write(self, session, query, rows):
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+            self.stats["transactions"] += 1
+
+    def flush(self):
+        """Write all pending records; returns the names of the documents written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            records, self._records = list(self._records.values()), {}
+        if not records:
+            return []
+
+        started = time.perf_counter()
+        names = [r["name"] for r in records]
+        nodes, aliases = {}, {}
+        sections, links, unchanged = [], {}, 0
+        for r in records:
+            for section in r["sections"]:
+                if section["embedding"] is None:
+                    unchanged += 1
+                    continue
+                sections.append({**section, "id": section_id(r["name"], section["ordinal"]), "doc": r["name"]})
+            for key, (label, rel) in LINKED_NODES.items():
+                for name, embedding in r[key].items():
+                    nodes.setdefault(label, {})[name] = embedding
+                    links.setdefault((label, rel), []).append({"doc": r["name"], "name": name})
+            for label, label_aliases in r.get("aliases", {}).items():
+                for name, spellings in label_aliases.items():
+                    known = aliases.setdefault(label, {}).setdefault(name, [])
+                    known.extend(a for a in spellings if a not in known)
+
+        with self.driver.session() as session:
+            self._write(session, CLEAR_QUERY, [
+                {"name": r["name"], "keep": [section_id(r["name"], s["ordinal"]) for s in r["sections"]]} for r in records
+            ])
+            self._write(session, DOCUMENT_QUERY, [
+                {"name": r["name"], "text": r["text"], "summary": r["summary"]} for r in records
+            ])
+            for label, embeddings in nodes.items():
+                vectors = self.storage.properties_batch(list(embeddings.values()))
+                rows = [
+                    {"name": name, **v, "aliases": aliases.get(label, {}).get(name, [])}
+                    for name, v in zip(embeddings, vectors)
+                ]
+                self._write(session, NODE_QUERY.format(label=label), rows)
+            vectors = self.storage.properties_batch([s["embedding"] for s in sections])
+            self._write(session, SECTION_QUERY, [{**s, **v} for s, v in zip(sections, vectors)])
+            for (label, rel), rows in links.items():
+                self._write(session, LINK_QUERY.format(label=label, rel=rel), rows)
+
+        self.stats["documents"] += len(records)
+        self.stats["nodes"] += len(records) + len(sections) + sum(len(e) for e in nodes.values())
+        self.stats["relationships"] += len(sections) + sum(len(rows) for rows in links.values())
+        self.stats["sections_unchanged"] += unchanged
+        self.stats["seconds"] += time.perf_counter() - started
+        return names
+
+    def report(self):
+        stats = dict(self.stats)
+        stats["nodes_per_s"] = round(stats["nodes"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        return stats
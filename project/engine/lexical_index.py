@@ -0,0 +1,275 @@
+"""BM25 inverted index over section text and graph node names.
+
+Two indexes are kept: ``sections`` (one unit per ``Section``, scored back to
+its document) and ``names`` (one unit per ``Document``, ``Entity``,
+``Organism``, ``Compound`` and ``Person`` name, scored back to the documents
+linked to it). Each is stored compactly as CSR postings: ``offsets`` into
+``postings`` (unit ids, int32) and ``tfs`` (uint16), with the sorted
+vocabulary and unit metadata beside them in JSON. Queries are a handful of
+vectorized numpy adds, so the API can rank documents lexically in-process.
+
+``LexicalIndex.search_documents`` returns the ranked rows ``engine.search``
+fuses with the vector probes, plus whether a node name matched the query
+exactly. Gene names, formulas and authors usually do, and then the
+embedding call can be skipped.
+
+Files live in one directory with a versioned ``manifest.json``, like the
+vector snapshot (see ``engine.vector_index``); ``build_lexical_index`` reads
+the graph and replaces them.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from engine.vector_index import NODE_LABELS
+
+TOKEN = re.compile(r"\w+(?:[-./']\w+)*")
+TOKEN_PARTS = re.compile(r"[-./']")
+
+# Given to documents linked to a node whose name equals the query (as in engine.retrieval): above any
+# scaled BM25 score, so they rank first in the lexical list.
+EXACT_MATCH_SCORE = 100.0
+
+# Dropped from queries (not from the index): alone they would still produce a top hit scoring 1.0.
+STOPWORDS = frozenset("""
+a about an and are as at be by did do does for from has have how in into is it its of on or that the their
+these this those to was were what when where which who why with
+""".split())
+
+LexicalResult = namedtuple("LexicalResult", "rows exact")
+
+# Everything one published generation of the index needs, swapped in as one reference.
+Snapshot = namedtuple("Snapshot", "sections names documents section_documents name_units exact")
+
+
+def tokenize(text):
+    """Lowercased word tokens; compound tokens (``TGF-beta``, ``H2O2``, ``Smith's``) also add their parts."""
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if TOKEN_PARTS.search(token):
+            tokens.extend(part for part in TOKEN_PARTS.split(token) if part)
+    return tokens
+
+
+def normalize_name(text):
+    return " ".join(TOKEN.findall(text.lower()))
+
+
+class Bm25:
+    def __init__(self, terms, offsets, postings, tfs, lengths, k1=1.2, b=0.75):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.vocabulary = list(terms)
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        n = len(lengths)
+        self.average_length = float(lengths.mean()) if n else 0.0
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        # Per-unit length normalization, computed once.
+        self._norm = (k1 * (1.0 - b + b * lengths / self.average_length)).astype(np.float32) if n else np.empty(0, np.float32)
+
+    @classmethod
+    def build(cls, texts):
+        counts = [Counter(tokenize(text)) for text in texts]
+        terms = sorted({term for c in counts for term in c})
+        term_ids = {term: i for i, term in enumerate(terms)}
+        per_term = [[] for _ in terms]
+        for unit, c in enumerate(counts):
+            for term, tf in c.items():
+                per_term[term_ids[term]].append((unit, tf))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in per_term])
+        postings = np.fromiter((u for p in per_term for u, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((min(tf, 65535) for p in per_term for _, tf in p), dtype=np.uint16, count=int(offsets[-1]))
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.int32)
+        return cls(terms, offsets, postings, tfs, lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def scores(self, tokens):
+        """BM25 score of every unit for the query ``tokens`` (zero where nothing matched)."""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for token in set(tokens):
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            units = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[units] += self.idf[term] * tf * (self.k1 + 1.0) / (tf + self._norm[units])
+        return scores
+
+    def arrays(self):
+        return {"offsets": self.offsets, "postings": self.postings, "tfs": self.tfs, "lengths": self.lengths}
+
+
+def _top_documents(unit_scores, unit_docs, limit):
+    """``{document: best unit score}`` over the units that scored, best ``limit`` units first."""
+    hit = np.flatnonzero(unit_scores > 0)
+    hit = hit[np.argsort(-unit_scores[hit])][: limit * 20]
+    best = {}
+    for unit in hit:
+        for document in unit_docs(unit):
+            best.setdefault(document, float(unit_scores[unit]))
+    return best
+
+
+class LexicalIndex:
+    """Lazily loaded, auto-reloading view over an index directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = None
+
+    @property
+    def manifest_path(self):
+        return self.path / "manifest.json"
+
+    def available(self):
+        try:
+            self._maybe_reload()
+        except FileNotFoundError:
+            return False
+        return self._snapshot is not None
+
+    def _maybe_reload(self):
+        mtime = self.manifest_path.stat().st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            version = json.loads(self.manifest_path.read_text(encoding="utf-8"))["version"]
+            loaded = {}
+            for name in ("sections", "names"):
+                meta = json.loads((self.path / f"{name}.{version}.json").read_text(encoding="utf-8"))
+                with np.load(self.path / f"{name}.{version}.npz") as npz:
+                    arrays = {k: npz[k] for k in npz.files}
+                index = Bm25(meta["terms"], *(arrays.pop(k) for k in ("offsets", "postings", "tfs", "lengths")))
+                loaded[name] = (meta, index, arrays)
+            (section_meta, sections, section_arrays), (name_meta, names, _) = loaded["sections"], loaded["names"]
+            exact = {}
+            for unit, (_, name, _) in enumerate(name_meta["units"]):
+                exact.setdefault(normalize_name(name), []).append(unit)
+            # Queries hold on to whichever snapshot they started with.
+            self._snapshot = Snapshot(
+                sections, names, section_meta["documents"], section_arrays["unit_documents"], name_meta["units"], exact,
+            )
+            self._mtime = mtime
+
+    def search_documents(self, query, limit=50):
+        """``LexicalResult(rows, exact)``: ``rows`` is ``[(document, score, matched_names), ...]``, best first.
+
+        Section and name scores are each scaled to [0, 1] by their best hit and
+        a document keeps the higher of the two; documents linked to a node
+        whose name equals the query score ``EXACT_MATCH_SCORE``. The scaling
+        makes the best hit 1.0 whatever it matched, so these scores only order
+        this list; ``engine.search`` fuses it with the vector probes by rank.
+        """
+        self._maybe_reload()
+        snapshot = self._snapshot
+        tokens = [token for token in tokenize(query) if token not in STOPWORDS]
+        scores, names = {}, {}
+
+        section_scores = snapshot.sections.scores(tokens)
+        top = float(section_scores.max()) if len(section_scores) else 0.0
+        if top > 0:
+            documents = lambda u: [snapshot.documents[snapshot.section_documents[u]]]
+            for document, score in _top_documents(section_scores, documents, limit).items():
+                scores[document] = score / top
+
+        name_scores = snapshot.names.scores(tokens)
+        top = float(name_scores.max()) if len(name_scores) else 0.0
+        if top > 0:
+            for document, score in _top_documents(name_scores, lambda u: snapshot.name_units[u][2], limit).items():
+                scores[document] = max(scores.get(document, 0.0), score / top)
+            for unit in np.argsort(-name_scores)[:limit]:
+                if name_scores[unit] <= 0:
+                    break
+                _, name, documents = snapshot.name_units[unit]
+                for document in documents:
+                    names.setdefault(document, []).append(name)
+
+        exact = snapshot.exact.get(normalize_name(query), [])
+        for unit in exact:
+            _, name, documents = snapshot.name_units[unit]
+            for document in documents:
+                scores[document] = EXACT_MATCH_SCORE
+                if name not in names.setdefault(document, []):
+                    names[document].append(name)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return LexicalResult([(d, s, names.get(d, [])) for d, s in ranked], bool(exact))
+
+
+def _section_units(session):
+    result = session.run("MATCH (d:Document)-[:HAS_SECTION]->(s:Section) RETURN d.name AS doc, s.text AS text")
+    return [(r["doc"], r["text"] or "") for r in result]
+
+
+def _name_units(session):
+    units = [("Document", r["name"], [r["name"]]) for r in session.run("MATCH (d:Document) RETURN d.name AS name")]
+    for label, rels in NODE_LABELS.items():
+        result = session.run(f"""
+            MATCH (n:`{label}`)
+            OPTIONAL MATCH (n)<-[:{"|".join(rels)}]-(d:Document)
+            RETURN n.name AS name, coalesce(n.aliases, []) AS aliases, collect(DISTINCT d.name) AS docs
+        """)
+        # Aliases (see engine.canonicalize) are matched like names and score the same documents.
+        for r in result:
+            units.extend((label, name, r["docs"]) for name in [r["name"], *r["aliases"]] if name)
+    return units
+
+
+def write_index(path, sections, names):
+    """Build and publish the index from ``[(document, text)]`` and ``[(label, name, documents)]``."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_path = path / "manifest.json"
+    previous = json.loads(manifest_path.read_text(encoding="utf-8"))["version"] if manifest_path.exists() else 0
+    version = previous + 1
+
+    documents = sorted({doc for doc, _ in sections})
+    doc_ids = {doc: i for i, doc in enumerate(documents)}
+    section_index = Bm25.build([text for _, text in sections])
+    name_index = Bm25.build([name for _, name, _ in names])
+    tables = {
+        "sections": (section_index, {"documents": documents}, {
+            "unit_documents": np.array([doc_ids[doc] for doc, _ in sections], dtype=np.int32),
+        }),
+        "names": (name_index, {"units": [list(unit) for unit in names]}, {}),
+    }
+    for name, (index, meta, extra) in tables.items():
+        np.savez(path / f"{name}.{version}.npz", **index.arrays(), **extra)
+        (path / f"{name}.{version}.json").write_text(json.dumps({"terms": index.vocabulary, **meta}), encoding="utf-8")
+
+    tmp = manifest_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": version}), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+    # Keep the previous generation for readers that have not reloaded yet.
+    for old in path.glob("*.*.*"):
+        parts = old.name.split(".")
+        if parts[-1] in ("npz", "json") and parts[-2].isdigit() and int(parts[-2]) < previous:
+            old.unlink(missing_ok=True)
+    return {"sections": len(section_index), "names": len(name_index), "terms": len(section_index.vocabulary) + len(name_index.vocabulary)}
+
+
+def build_lexical_index(driver, path):
+    """Read every section and node name from Neo4j and publish a fresh index in ``path``."""
+    with driver.session() as session:
+        sections = _section_units(session)
+        names = _name_units(session)
+    return write_index(path, sections, names)
@@ -0,0 +1,80 @@
+"""Completion backends for the RAG endpoint, with a streaming interface.
+
+``complete(prompt)`` returns the whole text, ``stream(prompt)`` yields text
+deltas as the model produces them; ``acomplete``/``astream`` are the asyncio
+equivalents. ``FakeLLMBackend`` produces a deterministic answer with a
+configurable per-token delay so streaming can be exercised offline.
+"""
+import asyncio
+import os
+import time
+
+import openai
+
+DEFAULT_MODEL = os.environ.get("LLM_MODEL", "gpt-4o-mini")
+
+
+class OpenAICompletionBackend:
+    def __init__(self, model=DEFAULT_MODEL):
+        self.model = model
+
+    def complete(self, prompt, **kwargs):
+        response = openai.Completion.create(model=self.model, prompt=prompt, **kwargs)
+        return response["choices"][0]["text"].strip()
+
+    def stream(self, prompt, **kwargs):
+        for chunk in openai.Completion.create(model=self.model, prompt=prompt, stream=True, **kwargs):
+            text = chunk["choices"][0].get("text")
+            if text:
+                yield text
+
+    async def acomplete(self, prompt, **kwargs):
+        response = await openai.Completion.acreate(model=self.model, prompt=prompt, **kwargs)
+        return response["choices"][0]["text"].strip()
+
+    async def astream(self, prompt, **kwargs):
+        async for chunk in await openai.Completion.acreate(model=self.model, prompt=prompt, stream=True, **kwargs):
+            text = chunk["choices"][0].get("text")
+            if text:
+                yield text
+
+
+class FakeLLMBackend:
+    def __init__(self, model="fake-llm", token_delay=0.0, first_token_delay=0.0):
+        self.model = model
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+
+    def _tokens(self, prompt):
+        words = prompt.split()[-40:]
+        return [f"{w} " for w in ["**Answer:**"] + words]
+
+    def complete(self, prompt, **kwargs):
+        return "".join(self.stream(prompt, **kwargs)).strip()
+
+    def stream(self, prompt, **kwargs):
+        time.sleep(self.first_token_delay)
+        for token in self._tokens(prompt):
+            time.sleep(self.token_delay)
+            yield token
+
+    async def acomplete(self, prompt, **kwargs):
+        return "".join([token async for token in self.astream(prompt, **kwargs)]).strip()
+
+    async def astream(self, prompt, **kwargs):
+        await asyncio.sleep(self.first_token_delay)
+        for token in self._tokens(prompt):
+            await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def create_llm(name=None, model=DEFAULT_MODEL):
+    name = name or os.environ.get("LLM_BACKEND", "openai")
+    if name == "openai":
+        return OpenAICompletionBackend(model=model)
+    if name == "fake":
+        return FakeLLMBackend(
+            token_delay=float(os.environ.get("FAKE_LLM_TOKEN_DELAY", 0.0)),
+            first_token_delay=float(os.environ.get("FAKE_LLM_FIRST_TOKEN_DELAY", 0.0)),
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
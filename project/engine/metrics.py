@@ -0,0 +1,130 @@
+"""Small in-process metrics registry (latency histograms and counters).
+
+Metrics may carry labels (``histogram("neo4j_query_seconds", labels={"query": "get_document"})``);
+each label set is its own series. ``prometheus_text`` renders every series in
+the Prometheus text exposition format.
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return name + "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = _label_key(labels)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum": self._sum,
+                "buckets": dict(zip(self.buckets + (float("inf"),), self._counts)),
+            }
+
+    def samples(self):
+        snapshot = self.snapshot()
+        cumulative = 0
+        for bound, count in snapshot["buckets"].items():
+            cumulative += count
+            yield _series(f"{self.name}_bucket", self.labels, [("le", _number(bound))]), cumulative
+        yield _series(f"{self.name}_sum", self.labels), snapshot["sum"]
+        yield _series(f"{self.name}_count", self.labels), snapshot["count"]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = _label_key(labels)
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        with self._lock:
+            return self._value
+
+    def samples(self):
+        yield _series(self.name, self.labels), self.snapshot()
+
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _get(cls, name, labels, *args):
+    key = (name, _label_key(labels))
+    with _lock:
+        if key not in _metrics:
+            _metrics[key] = cls(name, *args, labels=labels)
+        return _metrics[key]
+
+
+def histogram(name, description="", buckets=DEFAULT_BUCKETS, labels=None):
+    """Get or create the process-wide histogram called ``name`` with ``labels``."""
+    return _get(Histogram, name, labels, description, buckets)
+
+
+def counter(name, description="", labels=None):
+    """Get or create the process-wide counter called ``name`` with ``labels``."""
+    return _get(Counter, name, labels, description)
+
+
+def snapshot():
+    with _lock:
+        metrics = list(_metrics.values())
+    return {_series(m.name, m.labels): m.snapshot() for m in metrics}
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        metrics = sorted(_metrics.values(), key=lambda m: (m.name, m.labels))
+    lines, described = [], set()
+    for metric in metrics:
+        if metric.name not in described:
+            described.add(metric.name)
+            if metric.description:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{series} {_number(value)}" for series, value in metric.samples())
+    return "\n".join(lines) + "\n"
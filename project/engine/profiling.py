@@ -0,0 +1,78 @@
+"""Per-request stage timings.
+
+``RequestTimingMiddleware`` (see ``base.middleware``) opens a ``Timings``
+for each request. Code anywhere below it marks stages with::
+
+    with span("embed"):
+        q_emb = get_query_embedding(user_query)
+
+Spans with the same name add up. Outside a request, or in a thread that did
+not inherit the request's context (``ThreadPoolExecutor.submit`` does not;
+``asyncio.to_thread`` and tasks do), ``span`` only reads a context variable and
+costs next to nothing.
+"""
+import time
+from contextvars import ContextVar
+
+_timings = ContextVar("request_timings", default=None)
+
+
+class Timings:
+    __slots__ = ("spans",)
+
+    def __init__(self):
+        self.spans = {}  # name -> [seconds, count], in first-seen order
+
+    def add(self, name, seconds):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def as_dict(self):
+        """``{name: milliseconds}``."""
+        return {name: round(seconds * 1000, 3) for name, (seconds, _) in self.spans.items()}
+
+    def server_timing(self, total=None):
+        """``Server-Timing`` header value; spans entered more than once carry their count."""
+        parts = [
+            f"{name};dur={seconds * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+            for name, (seconds, count) in self.spans.items()
+        ]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class span:
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.started)
+
+
+def current():
+    """The ``Timings`` of the request being served, or ``None``."""
+    return _timings.get()
+
+
+def begin():
+    """Start collecting spans in this context; returns ``(timings, token)`` for ``end``."""
+    timings = Timings()
+    return timings, _timings.set(timings)
+
+
+def end(token):
+    _timings.reset(token)
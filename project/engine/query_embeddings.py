@@ -0,0 +1,216 @@
+"""Process-wide cache for query embeddings used by the search and RAG endpoints.
+
+Queries are keyed with their whitespace collapsed, kept in a bounded LRU with a
+TTL, and concurrent misses for the same query share one upstream call. The text
+is embedded as given: case carries meaning in gene and protein symbols. When ``QUERY_EMBEDDING_CACHE_ALIAS``
+names a Django cache, it is used as a second tier shared between workers.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from engine.embeddings import create_backend
+
+
+def normalize_query(text):
+    """Cache key of a query; case is kept, since ``BRCA1`` and ``brca1`` embed differently."""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, embed, model="default", maxsize=1024, ttl=3600, shared_cache=None, aembed=None):
+        self._embed = embed
+        self._aembed = aembed
+        self.model = model
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._ainflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0}
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, vector = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def _put_local(self, key, vector):
+        self._entries[key] = (time.monotonic() + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _shared_key(self, key):
+        return f"qemb:{self.model}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _fetch(self, key, text):
+        if self.shared_cache is not None:
+            raw = self.shared_cache.get(self._shared_key(key))
+            if raw is not None:
+                self._count("shared_hits")
+                return np.frombuffer(raw, dtype=np.float32).tolist()
+        vector = self._embed(text)
+        if self.shared_cache is not None:
+            payload = np.asarray(vector, dtype=np.float32).tobytes()
+            self.shared_cache.set(self._shared_key(key), payload, timeout=self.ttl)
+        return vector
+
+    def get(self, text):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._get_local(key)
+            if vector is not None:
+                self.stats["hits"] += 1
+                return vector
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = {"event": threading.Event()}
+                leader = True
+                self.stats["misses"] += 1
+            else:
+                leader = False
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            waiter["event"].wait()
+            if "error" in waiter:
+                raise waiter["error"]
+            return waiter["vector"]
+
+        try:
+            vector = self._fetch(key, text)
+            waiter["vector"] = vector
+            with self._lock:
+                self._put_local(key, vector)
+            return vector
+        except Exception as e:
+            waiter["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            waiter["event"].set()
+
+    async def aget(self, text):
+        """Async variant of ``get``; concurrent misses share one awaited upstream call."""
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._get_local(key)
+            if vector is not None:
+                self.stats["hits"] += 1
+                return vector
+            future = self._ainflight.get(key)
+            if future is None:
+                future = self._ainflight[key] = asyncio.get_running_loop().create_future()
+                leader = True
+                self.stats["misses"] += 1
+            else:
+                leader = False
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The leader was cancelled, not this request: try again, likely as the new leader.
+            return await self.aget(text)
+
+        try:
+            vector = await self._afetch(key, text)
+            with self._lock:
+                self._put_local(key, vector)
+            future.set_result(vector)
+            return vector
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure with no waiters is not reported as unhandled.
+            future.exception()
+            raise
+        finally:
+            # Cancellation is a BaseException; waiters must not be left pending.
+            if not future.done():
+                future.cancel()
+            with self._lock:
+                del self._ainflight[key]
+
+    async def _afetch(self, key, text):
+        if self.shared_cache is not None:
+            raw = await self.shared_cache.aget(self._shared_key(key))
+            if raw is not None:
+                self._count("shared_hits")
+                return np.frombuffer(raw, dtype=np.float32).tolist()
+        vector = await self._aembed(text)
+        if self.shared_cache is not None:
+            payload = np.asarray(vector, dtype=np.float32).tobytes()
+            await self.shared_cache.aset(self._shared_key(key), payload, timeout=self.ttl)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _django_cache():
+    alias = os.environ.get("QUERY_EMBEDDING_CACHE_ALIAS")
+    try:
+        from django.conf import settings
+        if settings.configured:
+            alias = getattr(settings, "QUERY_EMBEDDING_CACHE_ALIAS", None) or alias
+        if alias:
+            from django.core.cache import caches
+            return caches[alias]
+    except ImportError:
+        pass
+    return None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend = create_backend()
+
+            async def aembed(text):
+                return (await backend.aembed([text]))[0]
+
+            _cache = QueryEmbeddingCache(
+                lambda text: backend.embed([text])[0],
+                aembed=aembed,
+                model=backend.model,
+                maxsize=int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 1024)),
+                ttl=float(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", 3600)),
+                shared_cache=_django_cache(),
+            )
+        return _cache
+
+
+def get_query_embedding(text):
+    """Embedding for a search/RAG query, served from the shared cache when possible."""
+    return get_query_cache().get(text)
+
+
+async def get_query_embedding_async(text):
+    return await get_query_cache().aget(text)
@@ -0,0 +1,210 @@
+"""Precomputed document-to-document similarity.
+
+A document's embedding is the token-weighted mean of its normalized
+``Section`` embeddings. The top ``k`` neighbours of every document come from
+blocked matrix products (``block_size`` rows at a time, so memory stays at
+``block_size x n`` scores), and are kept in a compact table on disk
+(``documents.json``, ``embeddings.npy``, ``neighbours.npy`` int32 and
+``scores.npy`` float32, all ``n x k``). The graph gets them as
+``(:Document)-[:SIMILAR_TO {score, rank}]->(:Document)`` edges, which the
+``related-documents/`` endpoint reads with one index seek and ``k`` hops.
+
+``update`` is incremental: only the new or changed documents are pooled and
+ranked against everything. An existing document is re-ranked in full only
+when a changed document was one of its neighbours; otherwise the changed
+documents are merged into its current list. Only the documents whose lists
+changed get their edges rewritten.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from engine.vector_index import normalize_rows
+
+POOLED_SECTIONS_QUERY = """
+MATCH (d:Document)-[:HAS_SECTION]->(s:Section)
+WHERE s.embedding IS NOT NULL AND ($documents IS NULL OR d.name IN $documents)
+RETURN d.name AS name, collect(s.embedding) AS embeddings, collect(coalesce(s.token_count, 1)) AS weights
+"""
+
+WRITE_EDGES_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {name: row.name})
+OPTIONAL MATCH (d)-[old:SIMILAR_TO]->()
+DELETE old
+WITH DISTINCT d, row
+UNWIND row.neighbours AS n
+MATCH (o:Document {name: n.name})
+CREATE (d)-[:SIMILAR_TO {score: n.score, rank: n.rank}]->(o)
+"""
+
+# One row of nulls when the document exists without neighbours, none when it does not exist.
+RELATED_QUERY = """
+MATCH (d:Document {name: $name})
+OPTIONAL MATCH (d)-[r:SIMILAR_TO]->(o:Document)
+WITH r, o ORDER BY r.rank LIMIT $k
+RETURN o.name AS name, r.score AS score
+"""
+
+
+def pooled_embeddings(session, documents=None):
+    """``(names, matrix)``: one normalized, token-weighted mean section embedding per document."""
+    names, rows = [], []
+    for record in session.run(POOLED_SECTIONS_QUERY, documents=documents):
+        sections = normalize_rows(record["embeddings"])
+        weights = np.asarray(record["weights"], dtype=np.float32)
+        names.append(record["name"])
+        rows.append(weights @ sections)
+    if not rows:
+        return names, np.empty((0, 0), dtype=np.float32)
+    return names, normalize_rows(rows)
+
+
+def top_k_neighbours(matrix, k, rows=None, block_size=1024):
+    """``(indices, scores)``, ``len(rows) x k``, best first, of each row's nearest other rows."""
+    rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows, dtype=np.int64)
+    k = min(k, matrix.shape[0] - 1)
+    indices = np.zeros((len(rows), max(k, 0)), dtype=np.int32)
+    scores = np.zeros((len(rows), max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        similarity = matrix[block] @ matrix.T
+        similarity[np.arange(len(block)), block] = -np.inf  # not its own neighbour
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+
+class NeighbourTable:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.names, self.embeddings = [], np.empty((0, 0), dtype=np.float32)
+        self.neighbours = np.empty((0, 0), dtype=np.int32)
+        self.scores = np.empty((0, 0), dtype=np.float32)
+        if (self.path / "documents.json").exists():
+            self.names = json.loads((self.path / "documents.json").read_text(encoding="utf-8"))
+            self.embeddings = np.load(self.path / "embeddings.npy")
+            self.neighbours = np.load(self.path / "neighbours.npy")
+            self.scores = np.load(self.path / "scores.npy")
+
+    @property
+    def k(self):
+        return self.neighbours.shape[1] if self.neighbours.ndim == 2 else 0
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name, array in (("embeddings", self.embeddings), ("neighbours", self.neighbours), ("scores", self.scores)):
+            with open(self.path / f"{name}.tmp.npy", "wb") as f:
+                np.save(f, array)
+            os.replace(self.path / f"{name}.tmp.npy", self.path / f"{name}.npy")
+        tmp = self.path / "documents.json.tmp"
+        tmp.write_text(json.dumps(self.names), encoding="utf-8")
+        os.replace(tmp, self.path / "documents.json")
+
+    def rebuild(self, names, embeddings, k, block_size=1024):
+        self.names, self.embeddings = list(names), embeddings
+        self.neighbours, self.scores = top_k_neighbours(embeddings, k, block_size=block_size)
+        return list(range(len(self.names)))
+
+    def update(self, names, embeddings, k, block_size=1024):
+        """Add or replace ``names``; returns the rows whose neighbour lists changed."""
+        if self.names and embeddings.shape[1] != self.embeddings.shape[1]:
+            # A different embedding model: nothing stored is comparable any more.
+            self.names, self.embeddings = [], np.empty((0, embeddings.shape[1]), dtype=np.float32)
+        old_rows, old_k = len(self.names), self.k
+        positions = {name: i for i, name in enumerate(self.names)}
+        new = [name for name in names if name not in positions]
+        self.names.extend(new)
+        positions.update({name: old_rows + i for i, name in enumerate(new)})
+        self.embeddings = np.vstack([
+            self.embeddings.reshape(old_rows, embeddings.shape[1]),
+            np.zeros((len(new), embeddings.shape[1]), dtype=np.float32),
+        ])
+        changed = np.array([positions[name] for name in names], dtype=np.int64)
+        self.embeddings[changed] = embeddings
+        n, k = len(self.names), min(k, len(self.names) - 1)
+        if not old_rows or k != old_k or self.neighbours.shape[0] != old_rows:
+            return self.rebuild(self.names, self.embeddings, k, block_size)
+
+        neighbours = np.zeros((n, k), dtype=np.int32)
+        scores = np.full((n, k), -np.inf, dtype=np.float32)
+        neighbours[:old_rows], scores[:old_rows] = self.neighbours[:, :k], self.scores[:, :k]
+
+        # Rows that must be ranked in full: the changed documents themselves and any row
+        # that listed one of them (its list may lose that neighbour).
+        is_changed = np.zeros(n, dtype=bool)
+        is_changed[changed] = True
+        listed_changed = np.zeros(n, dtype=bool)
+        listed_changed[:old_rows] = is_changed[self.neighbours[:, :k]].any(axis=1) if k else False
+        full = np.flatnonzero(is_changed | listed_changed)
+        merge = np.flatnonzero(~(is_changed | listed_changed))
+
+        touched = set(full.tolist())
+        if len(full):
+            neighbours[full], scores[full] = top_k_neighbours(self.embeddings, k, rows=full, block_size=block_size)
+        for start in range(0, len(merge), block_size):
+            block = merge[start:start + block_size]
+            candidate_scores = self.embeddings[block] @ self.embeddings[changed].T
+            all_scores = np.concatenate([scores[block], candidate_scores], axis=1)
+            all_ids = np.concatenate([neighbours[block], np.broadcast_to(changed.astype(np.int32), candidate_scores.shape)], axis=1)
+            order = np.argsort(-all_scores, axis=1)[:, :k]
+            new_ids = np.take_along_axis(all_ids, order, axis=1)
+            touched.update(block[(new_ids != neighbours[block]).any(axis=1)].tolist())
+            neighbours[block], scores[block] = new_ids, np.take_along_axis(all_scores, order, axis=1)
+
+        self.neighbours, self.scores = neighbours, scores
+        return sorted(touched)
+
+    def rows(self, positions):
+        return [
+            {
+                "name": self.names[i],
+                "neighbours": [
+                    {"name": self.names[j], "score": float(s), "rank": rank}
+                    for rank, (j, s) in enumerate(zip(self.neighbours[i], self.scores[i]), 1)
+                    if np.isfinite(s)
+                ],
+            }
+            for i in positions
+        ]
+
+
+def write_edges(driver, rows, batch_size=500):
+    with driver.session() as session:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            session.execute_write(lambda tx: tx.run(WRITE_EDGES_QUERY, rows=batch).consume())
+
+
+def compute_related(driver, path, k=10, documents=None, block_size=1024):
+    """Pool, rank and write ``SIMILAR_TO`` edges; incremental when ``documents`` is given.
+
+    Returns ``{"documents", "updated"}``: documents in the table and documents whose edges were rewritten.
+    """
+    table = NeighbourTable(path)
+    incremental = bool(documents) and bool(table.names)
+    with driver.session() as session:
+        names, embeddings = pooled_embeddings(session, list(documents) if incremental else None)
+    if not names:
+        touched = []
+    elif incremental:
+        touched = table.update(names, embeddings, k, block_size)
+    else:
+        touched = table.rebuild(names, embeddings, k, block_size)
+    write_edges(driver, table.rows(touched))
+    table.save()
+    return {"documents": len(table.names), "updated": len(touched)}
+
+
+def related_rows(records):
+    """``[{"document", "score"}, ...]`` from ``RELATED_QUERY`` records, or ``None`` for an unknown document."""
+    if not records:
+        return None
+    return [{"document": r["name"], "score": r["score"]} for r in records if r["name"] is not None]
@@ -0,0 +1,345 @@
+"""Retrieval backends behind one interface.
+
+Every backend answers the three questions the API asks of the vector indexes:
+
+* ``document_matches(node_type, embedding, query, top_k, limit)`` ->
+  ``[(document, score, matched_names), ...]`` best first, one row per document;
+* ``sections(embedding, top_k)`` ->
+  ``[{"doc_name", "section_text", "ordinal", "heading", "score"}, ...]``;
+* ``neighbours(doc_name, ordinal, window)`` -> the sections of ``doc_name``
+  within ``window`` ordinals of ``ordinal`` (itself included), in order, as
+  ``[{"doc_name", "section_text", "ordinal", "heading"}, ...]``.
+
+``Neo4jRetriever`` uses the graph's vector indexes over Bolt, ``NumpyRetriever``
+an in-process snapshot (see ``engine.vector_index``) and ``FakeRetriever`` a
+deterministic stand-in for offline runs. The ``Async*`` classes expose the
+same methods as coroutines for the ASGI views.
+
+With compact embedding storage (see ``engine.embedding_storage``) query
+embeddings are truncated to the index dimensions, and the Neo4j retrievers
+re-rank a larger candidate set by the stored int8 full vectors.
+"""
+import asyncio
+import os
+import time
+
+from engine.database import Database
+from engine.embedding_storage import default_storage
+from engine.vector_index import NODE_LABELS, SECTION_LABEL, NumpyVectorIndex
+
+# type -> (vector index, label)
+NODE_INDEXES = {
+    "entity": ("entity_embeddings", "Entity"),
+    "organism": ("organism_embeddings", "Organism"),
+    "compound": ("compound_embeddings", "Compound"),
+    "person": ("person_embeddings", "Person"),
+}
+
+# Score given to a node whose name equals the query exactly: above any cosine, so the node ranks first in
+# its list. Under "max" fusion it is also the document's score; "rrf" only sees the rank.
+EXACT_MATCH_SCORE = 100.0
+
+DOCUMENT_MATCH_QUERY = """
+CALL db.index.vector.queryNodes($index, $top_k, $embedding)
+YIELD node, score
+MATCH (node)<-[:{rel}]-(doc:Document)
+WITH doc.name AS document, node.name AS name,
+     CASE WHEN node.name = $query THEN $exact_score ELSE score END AS score
+WITH document, max(score) AS score, collect(name) AS names
+RETURN document, score, names
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+SECTION_QUERY = """
+CALL db.index.vector.queryNodes('section_embeddings', $top_k, $embedding)
+YIELD node AS section_node, score AS section_score
+MATCH (section_node)<-[:HAS_SECTION]-(doc:Document)
+RETURN doc.name AS doc_name, section_node.text AS section_text, section_node.ordinal AS ordinal,
+       section_node.heading AS heading, section_score
+"""
+
+# Compact storage: index candidates with their int8 full vectors, re-ranked in Python.
+RERANK_DOCUMENT_MATCH_QUERY = """
+CALL db.index.vector.queryNodes($index, $candidates, $embedding)
+YIELD node, score
+MATCH (node)<-[:{rel}]-(doc:Document)
+RETURN node.name AS name, score, node.embedding_int8 AS codes, node.embedding_scale AS scale,
+       collect(doc.name) AS documents
+"""
+
+RERANK_SECTION_QUERY = """
+CALL db.index.vector.queryNodes('section_embeddings', $candidates, $embedding)
+YIELD node AS section_node, score AS section_score
+MATCH (section_node)<-[:HAS_SECTION]-(doc:Document)
+RETURN doc.name AS doc_name, section_node.text AS section_text, section_node.ordinal AS ordinal,
+       section_node.heading AS heading, section_score,
+       section_node.embedding_int8 AS codes, section_node.embedding_scale AS scale
+"""
+
+# Served by the range index on Section.doc.
+NEIGHBOURS_QUERY = """
+MATCH (s:Section {doc: $doc})
+WHERE $low <= s.ordinal <= $high
+RETURN s.doc AS doc_name, s.text AS section_text, s.ordinal AS ordinal, s.heading AS heading
+ORDER BY s.ordinal
+"""
+
+
+def _section(record):
+    return {
+        "doc_name": record["doc_name"], "section_text": record["section_text"],
+        "ordinal": record["ordinal"], "heading": record["heading"], "score": record["section_score"],
+    }
+
+
+def _neighbour(record):
+    return {k: record[k] for k in ("doc_name", "section_text", "ordinal", "heading")}
+
+
+def _reranked_documents(storage, records, embedding, query, top_k, limit):
+    rows = [(r, r["score"], r["codes"], r["scale"]) for r in records]
+    scores, names = {}, {}
+    for record, score in storage.rerank(embedding, rows, top_k):
+        if record["name"] == query:
+            score = EXACT_MATCH_SCORE
+        for document in record["documents"]:
+            scores[document] = max(scores.get(document, float("-inf")), score)
+            names.setdefault(document, []).append(record["name"])
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(document, score, names[document]) for document, score in ranked]
+
+
+def _reranked_sections(storage, records, embedding, top_k):
+    rows = [(r, r["section_score"], r["codes"], r["scale"]) for r in records]
+    return [{**_section(record), "score": score} for record, score in storage.rerank(embedding, rows, top_k)]
+
+
+def _database(db):
+    # Scripts pass a bare driver; the API passes its instrumented connection.
+    return db if isinstance(db, Database) else Database(db)
+
+
+class Neo4jRetriever:
+    name = "neo4j"
+
+    def __init__(self, db, storage=None):
+        self.db = _database(db)
+        self.storage = storage or default_storage()
+
+    def document_matches(self, node_type, embedding, query, top_k, limit):
+        index, label = NODE_INDEXES[node_type]
+        rel = "|".join(NODE_LABELS[label])
+        if self.storage.compact:
+            records = self.db.execute_read(
+                f"vector_{node_type}_candidates", RERANK_DOCUMENT_MATCH_QUERY.replace("{rel}", rel),
+                index=index, candidates=self.storage.candidates(top_k), embedding=self.storage.index_vector(embedding),
+            )
+            return _reranked_documents(self.storage, records, embedding, query, top_k, limit)
+        records = self.db.execute_read(
+            f"vector_{node_type}_documents", DOCUMENT_MATCH_QUERY.replace("{rel}", rel),
+            index=index, top_k=top_k, embedding=embedding, query=query,
+            exact_score=EXACT_MATCH_SCORE, limit=limit,
+        )
+        return [(r["document"], r["score"], r["names"]) for r in records]
+
+    def sections(self, embedding, top_k):
+        if self.storage.compact:
+            records = self.db.execute_read(
+                "vector_section_candidates", RERANK_SECTION_QUERY,
+                embedding=self.storage.index_vector(embedding), candidates=self.storage.candidates(top_k),
+            )
+            return _reranked_sections(self.storage, records, embedding, top_k)
+        return [_section(r) for r in self.db.execute_read("vector_sections", SECTION_QUERY, embedding=embedding, top_k=top_k)]
+
+    def neighbours(self, doc_name, ordinal, window=1):
+        records = self.db.execute_read(
+            "section_neighbours", NEIGHBOURS_QUERY, doc=doc_name, low=ordinal - window, high=ordinal + window,
+        )
+        return [_neighbour(r) for r in records]
+
+
+class AsyncNeo4jRetriever:
+    name = "neo4j"
+
+    def __init__(self, db, storage=None):
+        # Its async driver is created lazily on the serving event loop.
+        self.db = db
+        self.storage = storage or default_storage()
+
+    async def document_matches(self, node_type, embedding, query, top_k, limit):
+        index, label = NODE_INDEXES[node_type]
+        rel = "|".join(NODE_LABELS[label])
+        if self.storage.compact:
+            records = await self.db.aexecute_read(
+                f"vector_{node_type}_candidates", RERANK_DOCUMENT_MATCH_QUERY.replace("{rel}", rel),
+                index=index, candidates=self.storage.candidates(top_k), embedding=self.storage.index_vector(embedding),
+            )
+            return _reranked_documents(self.storage, records, embedding, query, top_k, limit)
+        records = await self.db.aexecute_read(
+            f"vector_{node_type}_documents", DOCUMENT_MATCH_QUERY.replace("{rel}", rel),
+            index=index, top_k=top_k, embedding=embedding, query=query,
+            exact_score=EXACT_MATCH_SCORE, limit=limit,
+        )
+        return [(r["document"], r["score"], r["names"]) for r in records]
+
+    async def sections(self, embedding, top_k):
+        if self.storage.compact:
+            records = await self.db.aexecute_read(
+                "vector_section_candidates", RERANK_SECTION_QUERY,
+                embedding=self.storage.index_vector(embedding), candidates=self.storage.candidates(top_k),
+            )
+            return _reranked_sections(self.storage, records, embedding, top_k)
+        records = await self.db.aexecute_read("vector_sections", SECTION_QUERY, embedding=embedding, top_k=top_k)
+        return [_section(r) for r in records]
+
+    async def neighbours(self, doc_name, ordinal, window=1):
+        records = await self.db.aexecute_read(
+            "section_neighbours", NEIGHBOURS_QUERY, doc=doc_name, low=ordinal - window, high=ordinal + window,
+        )
+        return [_neighbour(r) for r in records]
+
+
+class AsyncRetrieverAdapter:
+    """Runs a synchronous retriever's calls in a worker thread."""
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.name = retriever.name
+
+    async def document_matches(self, node_type, embedding, query, top_k, limit):
+        return await asyncio.to_thread(self.retriever.document_matches, node_type, embedding, query, top_k, limit)
+
+    async def sections(self, embedding, top_k):
+        return await asyncio.to_thread(self.retriever.sections, embedding, top_k)
+
+    async def neighbours(self, doc_name, ordinal, window=1):
+        return await asyncio.to_thread(self.retriever.neighbours, doc_name, ordinal, window)
+
+
+class NumpyRetriever:
+    name = "numpy"
+
+    def __init__(self, index, storage=None):
+        self.index = index
+        # The snapshot holds the stored ``embedding`` property: compare in the index dimensions.
+        self.storage = storage or default_storage()
+
+    def document_matches(self, node_type, embedding, query, top_k, limit):
+        label = NODE_INDEXES[node_type][1]
+        hits = self.index.search(label, self.storage.index_vector(embedding), top_k)
+        exact = self.index.exact_row(label, query)
+        if exact is not None:
+            hits = [(meta, score) for meta, score in hits if meta["name"] != query]
+            hits.append((exact, EXACT_MATCH_SCORE))
+
+        scores, names = {}, {}
+        for meta, score in hits:
+            for document in meta["docs"]:
+                scores[document] = max(scores.get(document, float("-inf")), score)
+                names.setdefault(document, []).append(meta["name"])
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(document, score, names[document]) for document, score in ranked]
+
+    def sections(self, embedding, top_k):
+        return [
+            {
+                "doc_name": meta["doc"], "section_text": meta["text"],
+                "ordinal": meta.get("ordinal"), "heading": meta.get("heading"), "score": score,
+            }
+            for meta, score in self.index.search(SECTION_LABEL, self.storage.index_vector(embedding), top_k)
+        ]
+
+    def neighbours(self, doc_name, ordinal, window=1):
+        rows = [
+            m for m in self.index.rows(SECTION_LABEL)
+            if m["doc"] == doc_name and m.get("ordinal") is not None and abs(m["ordinal"] - ordinal) <= window
+        ]
+        return [
+            {"doc_name": m["doc"], "section_text": m["text"], "ordinal": m["ordinal"], "heading": m.get("heading")}
+            for m in sorted(rows, key=lambda m: m["ordinal"])
+        ]
+
+
+class FakeRetriever:
+    """Deterministic stand-in with a fixed per-call ``latency`` (seconds)."""
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, documents=100):
+        self.latency = latency
+        self.documents = documents
+
+    def _document_rows(self, node_type, query, limit):
+        start = sum(map(ord, node_type + query)) % self.documents
+        return [
+            (f"Document {(start + i) % self.documents}", 0.9 - 0.01 * i, [f"{node_type} {i}"])
+            for i in range(min(limit, self.documents))
+        ]
+
+    def _section_rows(self, top_k):
+        return [
+            {
+                "doc_name": f"Document {i}", "section_text": f"Section text {i} " * 50,
+                "ordinal": 0, "heading": f"Heading {i}", "score": 0.9 - 0.01 * i,
+            }
+            for i in range(min(top_k, self.documents))
+        ]
+
+    def _neighbour_rows(self, doc_name, ordinal, window):
+        return [
+            {"doc_name": doc_name, "section_text": f"Section text {o} " * 50, "ordinal": o, "heading": f"Heading {o}"}
+            for o in range(max(0, ordinal - window), ordinal + window + 1)
+        ]
+
+    def document_matches(self, node_type, embedding, query, top_k, limit):
+        time.sleep(self.latency)
+        return self._document_rows(node_type, query, limit)
+
+    def sections(self, embedding, top_k):
+        time.sleep(self.latency)
+        return self._section_rows(top_k)
+
+    def neighbours(self, doc_name, ordinal, window=1):
+        time.sleep(self.latency)
+        return self._neighbour_rows(doc_name, ordinal, window)
+
+
+class AsyncFakeRetriever(FakeRetriever):
+    async def document_matches(self, node_type, embedding, query, top_k, limit):
+        await asyncio.sleep(self.latency)
+        return self._document_rows(node_type, query, limit)
+
+    async def sections(self, embedding, top_k):
+        await asyncio.sleep(self.latency)
+        return self._section_rows(top_k)
+
+    async def neighbours(self, doc_name, ordinal, window=1):
+        await asyncio.sleep(self.latency)
+        return self._neighbour_rows(doc_name, ordinal, window)
+
+
+def create_retriever(db, backend=None, snapshot_dir=None):
+    """Retriever selected by ``backend`` or ``RETRIEVAL_BACKEND`` (``neo4j``, ``numpy`` or ``fake``).
+
+    ``db`` is a Neo4j driver or an ``engine.database.Database``.
+    """
+    backend = backend or os.environ.get("RETRIEVAL_BACKEND", "neo4j")
+    if backend == "neo4j":
+        return Neo4jRetriever(db)
+    if backend == "fake":
+        return FakeRetriever(latency=float(os.environ.get("FAKE_RETRIEVAL_LATENCY", 0.0)))
+    if backend == "numpy":
+        snapshot_dir = snapshot_dir or os.environ.get("VECTOR_SNAPSHOT_DIR", "vector_snapshot")
+        return NumpyRetriever(NumpyVectorIndex(snapshot_dir))
+    raise ValueError(f"Unknown retrieval backend: {backend}")
+
+
+def create_async_retriever(db, backend=None, snapshot_dir=None):
+    """Async counterpart of ``create_retriever``; ``db`` is an ``engine.database.Database`` with an async driver."""
+    backend = backend or os.environ.get("RETRIEVAL_BACKEND", "neo4j")
+    if backend == "neo4j":
+        return AsyncNeo4jRetriever(db)
+    if backend == "fake":
+        return AsyncFakeRetriever(latency=float(os.environ.get("FAKE_RETRIEVAL_LATENCY", 0.0)))
+    return AsyncRetrieverAdapter(create_retriever(None, backend, snapshot_dir))
@@ -0,0 +1,174 @@
+"""Shared asyncio scheduler for OpenAI calls made during ingestion.
+
+Every chat and embedding request goes through one ``LLMScheduler``. The
+scheduler enforces per-bucket requests-per-minute and tokens-per-minute
+budgets, caps the number of requests in flight, and retries rate-limit and
+transient errors with jittered exponential backoff (or the server's
+``Retry-After``). Work for one document, such as the chunks of a page, can be
+fanned out with ``asyncio.gather`` and still stay inside the budgets.
+Throughput (tokens/s, docs/min) is printed as documents complete.
+
+Budgets come from ``LLM_RPM``/``LLM_TPM`` and ``EMBEDDING_RPM``/``EMBEDDING_TPM``
+(see ``create_scheduler``).
+"""
+import asyncio
+import os
+import random
+import time
+
+import openai
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    asyncio.TimeoutError,
+)
+
+
+def approx_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, refilled continuously."""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        # A request larger than the whole budget would otherwise wait forever.
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60 / self.rpm, (tokens - self._tokens) * 60 / self.tpm)
+                await asyncio.sleep(max(wait, 0.01))
+
+    def debit(self, tokens):
+        """Charge tokens used beyond the estimate (or refund, if negative)."""
+        self._refill()
+        self._tokens = min(self.tpm, self._tokens - tokens)
+
+
+class LLMScheduler:
+    def __init__(self, budgets, max_concurrency=16, max_retries=6, base_delay=1.0, max_delay=60.0, report_every=30.0):
+        self.limiters = {bucket: RateLimiter(rpm, tpm) for bucket, (rpm, tpm) in budgets.items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.report_every = report_every
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._started = time.monotonic()
+        self._reported = self._started
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "tokens": 0, "documents": 0}
+
+    def _backoff(self, attempt, error):
+        # Full jitter keeps concurrent workers from retrying in lockstep.
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0)
+
+    async def submit(self, fn, *args, tokens=1, bucket="llm", **kwargs):
+        """Await ``fn(*args, **kwargs)`` within ``bucket``'s budget, retrying transient errors.
+
+        ``tokens`` is the estimate charged up front; when the response reports
+        ``usage.total_tokens`` the bucket is corrected to the real figure.
+        """
+        limiter = self.limiters[bucket]
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(tokens)
+            try:
+                async with self._semaphore:
+                    result = await fn(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+
+            used = _usage(result)
+            if used is not None:
+                limiter.debit(used - tokens)
+            self.stats["requests"] += 1
+            self.stats["tokens"] += used if used is not None else tokens
+            return result
+
+    async def chat(self, messages, model="gpt-4o-mini", expected_output_tokens=1024, **kwargs):
+        """Chat completion text for ``messages``."""
+        tokens = sum(approx_tokens(m["content"]) for m in messages) + expected_output_tokens
+        response = await self.submit(
+            openai.ChatCompletion.acreate, model=model, messages=messages, tokens=tokens, bucket="llm", **kwargs
+        )
+        return response.choices[0].message.content.strip()
+
+    async def embed(self, backend, texts):
+        """``backend.aembed(texts)`` charged against the embedding budget."""
+        tokens = sum(approx_tokens(t) for t in texts)
+        return await self.submit(backend.aembed, texts, tokens=tokens, bucket="embedding")
+
+    def document_done(self):
+        self.stats["documents"] += 1
+        if time.monotonic() - self._reported >= self.report_every:
+            self._reported = time.monotonic()
+            print(f"⏱️ {self.format_report()}")
+
+    def report(self):
+        elapsed = time.monotonic() - self._started
+        stats = dict(self.stats)
+        stats["elapsed_s"] = round(elapsed, 1)
+        stats["tokens_per_s"] = round(stats["tokens"] / elapsed, 1) if elapsed else 0.0
+        stats["docs_per_min"] = round(stats["documents"] * 60 / elapsed, 2) if elapsed else 0.0
+        return stats
+
+    def format_report(self):
+        r = self.report()
+        return (
+            f"{r['documents']} docs in {r['elapsed_s']}s: {r['docs_per_min']} docs/min, "
+            f"{r['tokens_per_s']} tokens/s, {r['requests']} requests, {r['retries']} retries, {r['failures']} failed"
+        )
+
+
+def _usage(response):
+    usage = response.get("usage") if isinstance(response, dict) else None
+    return usage.get("total_tokens") if usage else None
+
+
+def create_scheduler(**kwargs):
+    """Scheduler with budgets from the environment (defaults suit a tier-1 gpt-4o-mini key)."""
+    env = os.environ.get
+    budgets = {
+        "llm": (float(env("LLM_RPM", 500)), float(env("LLM_TPM", 200_000))),
+        "embedding": (float(env("EMBEDDING_RPM", 3000)), float(env("EMBEDDING_TPM", 1_000_000))),
+    }
+    kwargs.setdefault("max_concurrency", int(env("LLM_MAX_CONCURRENCY", 16)))
+    kwargs.setdefault("max_retries", int(env("LLM_MAX_RETRIES", 6)))
+    return LLMScheduler(budgets, **kwargs)
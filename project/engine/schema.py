@@ -0,0 +1,132 @@
+"""Idempotent Neo4j schema: constraints, lookup indexes and vector indexes.
+
+``migrate`` is run by ingestion before its first write, by
+``scripts/migrate_schema.py`` and when a Django server starts (see
+``base.apps``). Every statement uses ``IF NOT EXISTS``, so
+running it again is a no-op. Uniqueness constraints give each MERGE and
+``{name: $name}`` lookup an index seek instead of a label scan. Existing
+vector indexes are checked against the configured index dimensions (the
+model's, unless embeddings are stored compact, see
+``engine.embedding_storage``): vectors of another size can neither be
+written to them nor queried.
+"""
+from neo4j.exceptions import Neo4jError
+
+from engine.embedding_storage import DEFAULT_INDEX_DIMENSIONS
+from engine.graph_version import GRAPH_META_LABEL
+
+UNIQUE_KEYS = {
+    "Document": "name",
+    "Entity": "name",
+    "Organism": "name",
+    "Compound": "name",
+    "Person": "name",
+    "Section": "id",
+    GRAPH_META_LABEL: "key",
+}
+
+# label -> property, for range indexes on non-unique lookup keys
+RANGE_INDEXES = {
+    "Section": "doc",
+}
+
+# Text indexes serve CONTAINS / ENDS WITH on names.
+TEXT_INDEXES = ["Document", "Entity", "Organism", "Compound", "Person"]
+
+VECTOR_INDEXES = {
+    "entity_embeddings": "Entity",
+    "organism_embeddings": "Organism",
+    "compound_embeddings": "Compound",
+    "person_embeddings": "Person",
+    "section_embeddings": "Section",
+}
+
+
+class SchemaError(RuntimeError):
+    pass
+
+
+class VectorDimensionError(SchemaError):
+    pass
+
+
+def _constraint_statements():
+    for label, key in UNIQUE_KEYS.items():
+        yield (
+            f"CREATE CONSTRAINT {label.lower()}_{key}_unique IF NOT EXISTS "
+            f"FOR (n:{label}) REQUIRE n.{key} IS UNIQUE"
+        )
+
+
+def _index_statements(dimensions):
+    for label, key in RANGE_INDEXES.items():
+        yield f"CREATE RANGE INDEX {label.lower()}_{key} IF NOT EXISTS FOR (n:{label}) ON (n.{key})"
+    for label in TEXT_INDEXES:
+        yield f"CREATE TEXT INDEX {label.lower()}_name_text IF NOT EXISTS FOR (n:{label}) ON (n.name)"
+    for name, label in VECTOR_INDEXES.items():
+        yield (
+            f"CREATE VECTOR INDEX {name} IF NOT EXISTS FOR (n:{label}) ON (n.embedding) "
+            f"OPTIONS {{indexConfig: {{`vector.dimensions`: {dimensions}, `vector.similarity_function`: 'cosine'}}}}"
+        )
+
+
+def create_constraints(driver):
+    """Only the uniqueness constraints (what the graph writer's MERGEs rely on)."""
+    with driver.session() as session:
+        for statement in _constraint_statements():
+            _run(session, statement)
+
+
+def _run(session, statement):
+    try:
+        return session.run(statement).consume().counters
+    except Neo4jError as e:
+        # Existing nodes breaking a new uniqueness constraint; other failures (an index already on the
+        # property, an unsupported statement) are explained by the server's own message.
+        hint = "; remove duplicate keys and rerun" if e.code == "Neo.ClientError.Schema.ConstraintCreationFailed" else ""
+        raise SchemaError(f"{statement!r} failed: {e.code}: {e.message}{hint}") from e
+
+
+def vector_index_dimensions(driver):
+    """``{index name: dimensions}`` for the vector indexes that exist."""
+    with driver.session() as session:
+        result = session.run("SHOW VECTOR INDEXES YIELD name, options RETURN name, options")
+        return {r["name"]: (r["options"] or {}).get("indexConfig", {}).get("vector.dimensions") for r in result}
+
+
+def drop_vector_indexes(driver):
+    """Drop the vector indexes, before their dimensions change; returns the names dropped."""
+    existing = [name for name in vector_index_dimensions(driver) if name in VECTOR_INDEXES]
+    with driver.session() as session:
+        for name in existing:
+            session.run(f"DROP INDEX {name} IF EXISTS").consume()
+    return existing
+
+
+def check_dimensions(driver, dimensions=DEFAULT_INDEX_DIMENSIONS):
+    existing = vector_index_dimensions(driver)
+    mismatched = {
+        name: dims for name, dims in existing.items()
+        if name in VECTOR_INDEXES and dims is not None and int(dims) != dimensions
+    }
+    if mismatched:
+        details = ", ".join(f"{name}={dims}" for name, dims in sorted(mismatched.items()))
+        raise VectorDimensionError(
+            f"Vector indexes do not match the configured {dimensions} dimensions ({details}); "
+            "drop and rebuild them (scripts/migrate_embedding_storage.py), or set EMBEDDING_DIMENSIONS "
+            "or EMBEDDING_INDEX_DIMENSIONS to match"
+        )
+
+
+def migrate(driver, dimensions=DEFAULT_INDEX_DIMENSIONS, wait=False):
+    """Create whatever is missing and verify vector dimensions; returns what was added."""
+    check_dimensions(driver, dimensions)
+    added = {"constraints": 0, "indexes": 0}
+    with driver.session() as session:
+        for statement in [*_constraint_statements(), *_index_statements(dimensions)]:
+            counters = _run(session, statement)
+            added["constraints"] += counters.constraints_added
+            added["indexes"] += counters.indexes_added
+        if wait:
+            session.run("CALL db.awaitIndexes(600)").consume()
+    return added
@@ -0,0 +1,125 @@
+"""Fused document search over the entity, organism, compound and person indexes.
+
+The four node indexes are probed in parallel through a retriever (see
+``engine.retrieval``). Each probe already aggregates to one row per document
+and cuts off at ``limit``, so Python only fuses a few small ranked lists.
+``hybrid_search`` adds the BM25 ranking of ``engine.lexical_index`` as one
+more list and skips the embedding call and the vector probes altogether when
+a node name matches the query exactly.
+
+The lexical scores are scaled per query and the vector scores are Neo4j
+cosines, so only ``rrf``, which looks at ranks alone, fuses them on an
+equal footing; it is the default. ``max`` and ``weighted`` compare the raw
+scores and suit the vector probes on their own. A result's ``score`` is what
+the method produced: a cosine (or an exact match's score) under ``max``, a
+weighted sum under ``weighted`` and a sum of reciprocal ranks, around 0.01 to
+0.1, under ``rrf``; it orders the results and is not comparable across methods.
+"""
+import asyncio
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from engine.profiling import span
+from engine.retrieval import NODE_INDEXES
+
+FUSION_METHODS = ("max", "rrf", "weighted")
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="search-probe")
+
+
+def fuse(ranked_lists, method="rrf", weights=None, limit=50, rrf_k=60):
+    """Combine per-type ranked lists into the top ``limit`` documents.
+
+    ``ranked_lists`` maps node type -> ``[(document, score, names), ...]`` sorted
+    by score. ``max`` keeps the best raw score, ``rrf`` sums ``1 / (rrf_k + rank)``
+    and ``weighted`` sums ``weights[type] * score``.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}")
+    weights = weights or {}
+    scores, names = {}, {}
+    for node_type, rows in ranked_lists.items():
+        weight = weights.get(node_type, 1.0)
+        for rank, (document, score, matched) in enumerate(rows, 1):
+            if method == "max":
+                scores[document] = max(scores.get(document, float("-inf")), score)
+            elif method == "rrf":
+                scores[document] = scores.get(document, 0.0) + 1.0 / (rrf_k + rank)
+            else:
+                scores[document] = scores.get(document, 0.0) + weight * score
+            names.setdefault(document, []).extend(matched)
+
+    top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    return [
+        {"document": document, "score": score, "matched_items": names[document]}
+        for document, score in top
+    ]
+
+
+def search_documents(retriever, embedding, query, top_k=20, limit=50, method="rrf", weights=None, node_types=None,
+                     extra_lists=None):
+    """Probe the node indexes in parallel and return fused top documents.
+
+    ``extra_lists`` (``{name: ranked rows}``) are fused along with the probes.
+    """
+    node_types = node_types or list(NODE_INDEXES)
+    with span("vector"):
+        futures = {
+            t: _executor.submit(retriever.document_matches, t, embedding, query, top_k, limit)
+            for t in node_types
+        }
+        ranked_lists = {t: f.result() for t, f in futures.items()}
+    with span("fuse"):
+        return fuse({**ranked_lists, **(extra_lists or {})}, method=method, weights=weights, limit=limit)
+
+
+async def asearch_documents(retriever, embedding, query, top_k=20, limit=50, method="rrf", weights=None, node_types=None,
+                            extra_lists=None):
+    """``search_documents`` for an async retriever: the probes run concurrently on the event loop."""
+    node_types = node_types or list(NODE_INDEXES)
+    with span("vector"):
+        results = await asyncio.gather(*[
+            retriever.document_matches(t, embedding, query, top_k, limit) for t in node_types
+        ])
+    ranked_lists = dict(zip(node_types, results))
+    with span("fuse"):
+        return fuse({**ranked_lists, **(extra_lists or {})}, method=method, weights=weights, limit=limit)
+
+
+def lexical_search(lexical_index, query, limit):
+    """``LexicalResult`` for ``query``, or ``None`` without a built index."""
+    if lexical_index is None or not lexical_index.available():
+        return None
+    with span("lexical"):
+        return lexical_index.search_documents(query, limit)
+
+
+def hybrid_search(retriever, lexical_index, embed, query, top_k=20, limit=50, method="rrf", weights=None,
+                  skip_embedding=True):
+    """Fused lexical + vector results and whether ``embed(query)`` was called."""
+    lexical = lexical_search(lexical_index, query, limit)
+    if lexical is not None and lexical.exact and skip_embedding:
+        with span("fuse"):
+            return fuse({"lexical": lexical.rows}, method=method, weights=weights, limit=limit), False
+    extra_lists = {"lexical": lexical.rows} if lexical is not None else None
+    with span("embed"):
+        embedding = embed(query)
+    return search_documents(
+        retriever, embedding, query, top_k=top_k, limit=limit, method=method, weights=weights, extra_lists=extra_lists,
+    ), True
+
+
+async def ahybrid_search(retriever, lexical_index, aembed, query, top_k=20, limit=50, method="rrf", weights=None,
+                         skip_embedding=True):
+    """``hybrid_search`` with an async retriever and embedding function."""
+    lexical = lexical_search(lexical_index, query, limit)
+    if lexical is not None and lexical.exact and skip_embedding:
+        with span("fuse"):
+            return fuse({"lexical": lexical.rows}, method=method, weights=weights, limit=limit), False
+    extra_lists = {"lexical": lexical.rows} if lexical is not None else None
+    with span("embed"):
+        embedding = await aembed(query)
+    return await asearch_documents(
+        retriever, embedding, query, top_k=top_k, limit=limit, method=method, weights=weights,
+        extra_lists=extra_lists,
+    ), True
@@ -0,0 +1,759 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+import openai
+
+from benchmarks.memory_graph import MemoryDriver, MemoryGraph
+from engine.answer_cache import SemanticAnswerCache
+from engine.canonicalize import Canonicalizer, canonical_key, cluster, plan_merges, similar_pairs
+from engine.chunking import chunk_markdown
+from engine import metrics
+from engine.context import ContextBuilder, add_neighbours, count_tokens, neighbour_targets, strip_overlap
+from engine.database import Database, approximate_bytes
+from engine.embedding_storage import (
+    QUANTIZED_QUERY, READ_QUERY, UNCONVERTIBLE_QUERY, WRITE_QUERY, EmbeddingMigrationError, EmbeddingStorage,
+    check_migration, dequantize, migrate_embeddings, quantize, recall_report, truncate,
+)
+from engine.embeddings import EmbeddingCache, text_hash
+from engine.graph_writer import GraphWriter, section_hashes
+from engine.lexical_index import EXACT_MATCH_SCORE, LexicalIndex, tokenize, write_index
+from engine.query_embeddings import QueryEmbeddingCache
+from engine.related_documents import NeighbourTable, related_rows, top_k_neighbours
+from engine.retrieval import NEIGHBOURS_QUERY, FakeRetriever, Neo4jRetriever
+from engine.scheduler import LLMScheduler, RateLimiter
+from engine.search import fuse, hybrid_search
+
+DIMENSIONS = 8
+
+
+def vector(seed):
+    return np.random.default_rng(seed).standard_normal(DIMENSIONS).astype(np.float32).tolist()
+
+
+def record(name, sections, entities=()):
+    return {
+        "name": name, "text": " ".join(sections), "summary": f"About {name}",
+        "sections": [
+            {"ordinal": i, "heading": f"H{i}", "text": text, "token_count": len(text.split()),
+             "content_hash": f"hash-{text}", "embedding": vector(i)}
+            for i, text in enumerate(sections)
+        ],
+        "entities": {e: vector(100 + j) for j, e in enumerate(entities)},
+        "organisms": {}, "compounds": {}, "contributors": {}, "mentioned": {},
+    }
+
+
+class GraphWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = MemoryGraph()
+        self.driver = MemoryDriver(self.graph)
+        self.writer = GraphWriter(self.driver, batch_size=2, storage=EmbeddingStorage(DIMENSIONS, DIMENSIONS))
+
+    def section_texts(self, doc):
+        return sorted(self.graph.sections[key]["text"] for key in self.graph.doc_sections.get(doc, ()))
+
+    def test_reingest_replaces_sections_without_ids(self):
+        # Sections as the ingester wrote them before sections had ids: no id, doc, ordinal or hash.
+        self.graph.documents["Paper"] = {"name": "Paper", "text": "old", "summary": None}
+        self.graph.sections.update({("legacy", i): {"text": f"old {i}", "embedding": np.ones(DIMENSIONS)} for i in range(3)})
+        self.graph.doc_sections["Paper"] = {("legacy", i) for i in range(3)}
+        self.assertEqual(section_hashes(self.driver, "Paper"), {})
+
+        self.writer.add(record("Paper", ["new a", "new b"]))
+        self.writer.flush()
+
+        self.assertEqual(self.section_texts("Paper"), ["new a", "new b"])
+        self.assertEqual(len(self.graph.sections), 2)
+
+    def test_reingest_keeps_unchanged_sections_and_drops_removed_ones(self):
+        self.writer.add(record("Paper", ["a", "b", "c"], entities=["microgravity"]))
+        self.writer.flush()
+        self.assertEqual(section_hashes(self.driver, "Paper"), {0: "hash-a", 1: "hash-b", 2: "hash-c"})
+
+        self.writer.add(record("Paper", ["a", "b2"], entities=["microgravity"]))
+        self.writer.flush()
+
+        self.assertEqual(self.section_texts("Paper"), ["a", "b2"])
+        self.assertEqual(section_hashes(self.driver, "Paper"), {0: "hash-a", 1: "hash-b2"})
+        self.assertEqual(self.graph.links["MENTIONS"]["microgravity"], {"Paper"})
+
+    def test_flush_returns_document_names_when_records_carry_aliases(self):
+        first = record("Paper", ["a"], entities=["Microgravity"])
+        first["aliases"] = {"Entity": {"Microgravity": ["microgravity"]}}
+        second = record("Other", ["b"], entities=["Microgravity"])
+        second["aliases"] = {"Entity": {"Microgravity": ["micro-gravity", "microgravity"]}}
+        self.writer.add(first)
+        self.writer.add(second)
+
+        self.assertEqual(self.writer.flush(), ["Paper", "Other"])
+        self.assertEqual(self.graph.nodes["Entity"]["Microgravity"]["aliases"], ["microgravity", "micro-gravity"])
+
+
+def section(doc, text, score, ordinal=0):
+    return {"doc_name": doc, "section_text": text, "ordinal": ordinal, "heading": None, "score": score}
+
+
+class ContextBuilderTests(unittest.TestCase):
+    def sentences(self, topic, count):
+        return " ".join(f"Sentence {i} is about {topic} number {i * 7}." for i in range(count))
+
+    def test_overlap_with_a_section_of_the_same_document_is_cut(self):
+        first = self.sentences("plants", 10)
+        shared = first[-120:]
+        second = shared + " " + self.sentences("roots", 5)
+        self.assertEqual(strip_overlap(second, first), self.sentences("roots", 5))
+
+        context = ContextBuilder().build("roots", [section("Paper", first, 0.9), section("Paper", second, 0.8, 1)])
+        self.assertEqual(context.sections[1]["section_text"], self.sentences("roots", 5))
+        self.assertEqual(context.text.count(shared), 1)
+
+    def test_near_duplicates_are_dropped_and_best_sections_come_first(self):
+        text = self.sentences("bone loss", 20)
+        context = ContextBuilder().build("bone", [
+            section("Other", self.sentences("muscle", 20), 0.5),
+            section("Copy", text + " One extra sentence.", 0.8),
+            section("Paper", text, 0.9),
+        ])
+        self.assertEqual([s["doc_name"] for s in context.sections], ["Paper", "Other"])
+        self.assertEqual(context.dropped["duplicates"], 1)
+        self.assertTrue(context.text.startswith("[Section 1] Paper\n"))
+
+    def test_sections_over_budget_are_skipped_or_trimmed_to_the_query(self):
+        long = " ".join([self.sentences("muscle", 30), "Radiation damages bone marrow cells.", self.sentences("muscle", 30)])
+        sections = [section("Short", self.sentences("radiation", 3), 0.9), section("Long", long, 0.8)]
+
+        skipped = ContextBuilder(budget_tokens=300).build("radiation and bone", sections)
+        self.assertEqual([s["doc_name"] for s in skipped.sections], ["Short"])
+        self.assertEqual(skipped.dropped["over_budget"], 1)
+
+        trimmed = ContextBuilder(budget_tokens=300, trim=True, min_section_tokens=5).build("radiation and bone", sections)
+        self.assertEqual([s["doc_name"] for s in trimmed.sections], ["Short", "Long"])
+        self.assertEqual(trimmed.dropped["trimmed"], 1)
+        self.assertIn("Radiation damages bone marrow cells.", trimmed.sections[1]["section_text"])
+        self.assertLessEqual(trimmed.tokens, 300)
+        self.assertEqual(trimmed.tokens, count_tokens(trimmed.text))
+
+
+class NeighbourTests(unittest.TestCase):
+    def setUp(self):
+        driver = MemoryDriver(MemoryGraph())
+        storage = EmbeddingStorage(DIMENSIONS, DIMENSIONS)
+        writer = GraphWriter(driver, storage=storage)
+        writer.add(record("Paper", ["a", "b", "c", "d"]))
+        writer.add(record("Other", ["x", "y"]))
+        writer.flush()
+        self.retriever = Neo4jRetriever(driver, storage=storage)
+
+    def test_neighbours_are_the_window_around_the_ordinal(self):
+        rows = self.retriever.neighbours("Paper", 2, window=1)
+        self.assertEqual([(r["ordinal"], r["section_text"]) for r in rows], [(1, "b"), (2, "c"), (3, "d")])
+        self.assertEqual([r["ordinal"] for r in self.retriever.neighbours("Other", 0, window=1)], [0, 1])
+
+    def test_neighbours_follow_the_hits_without_repeating_them(self):
+        hits = [
+            {"doc_name": "Paper", "section_text": "b", "ordinal": 1, "heading": "H1", "score": 0.9},
+            {"doc_name": "Paper", "section_text": "c", "ordinal": 2, "heading": "H2", "score": 0.7},
+            {"doc_name": "Other", "section_text": "x", "ordinal": None, "heading": None, "score": 0.8},
+        ]
+        targets = neighbour_targets(hits, 2)
+        self.assertEqual([t["ordinal"] for t in targets], [1, 2])
+
+        extended = add_neighbours(hits, [self.retriever.neighbours(t["doc_name"], t["ordinal"]) for t in targets])
+        self.assertEqual(extended[:3], hits)
+        self.assertEqual([(s["ordinal"], s["score"]) for s in extended[3:]], [(0, 0.7), (3, 0.7)])
+
+
+class DatabaseMetricsTests(unittest.TestCase):
+    def setUp(self):
+        driver = MemoryDriver(MemoryGraph())
+        self.db = Database(driver)
+        writer = GraphWriter(driver, storage=EmbeddingStorage(DIMENSIONS, DIMENSIONS))
+        writer.add(record("Paper", ["a", "b"]))
+        writer.flush()
+
+    def test_named_queries_record_latency_rows_and_bytes(self):
+        records = self.db.execute_read("test_neighbours", NEIGHBOURS_QUERY, doc="Paper", low=0, high=1)
+        self.assertEqual([r["section_text"] for r in records], ["a", "b"])
+
+        series = metrics.snapshot()
+        self.assertEqual(series['neo4j_query_seconds{query="test_neighbours"}']["count"], 1)
+        self.assertEqual(series['neo4j_query_records{query="test_neighbours"}']["buckets"][5], 1)
+        self.assertEqual(series['neo4j_query_bytes{query="test_neighbours"}']["count"], 1)
+
+    def test_errors_are_counted_by_class_and_raised(self):
+        with self.assertRaises(NotImplementedError):
+            self.db.execute_read("test_unknown", "MATCH (n) RETURN n")
+        series = metrics.snapshot()
+        self.assertEqual(series['neo4j_query_errors_total{error="NotImplementedError",query="test_unknown"}'], 1)
+        self.assertEqual(series['neo4j_query_seconds{query="test_unknown"}']["count"], 1)
+
+    def test_approximate_bytes(self):
+        self.assertEqual(approximate_bytes({"a": "hé", "b": [1, None, 2.5]}), (1 + 3) + (1 + 8 + 1 + 8))
+
+    def test_prometheus_text_renders_cumulative_buckets(self):
+        histogram = metrics.histogram("test_render_seconds", "Rendering test", buckets=(0.1, 1.0), labels={"q": 'a"b'})
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        text = metrics.prometheus_text()
+        self.assertIn("# HELP test_render_seconds Rendering test\n# TYPE test_render_seconds histogram\n", text)
+        for line in ('test_render_seconds_bucket{q="a\\"b",le="0.1"} 1', 'test_render_seconds_bucket{q="a\\"b",le="1.0"} 2',
+                     'test_render_seconds_bucket{q="a\\"b",le="+Inf"} 3', 'test_render_seconds_count{q="a\\"b"} 3'):
+            self.assertIn(line + "\n", text)
+
+
+def words(count, word):
+    return " ".join([word] * count)
+
+
+class ChunkMarkdownTests(unittest.TestCase):
+    # approx_tokens counts four characters as a token, so each five-character word is ~1.25 tokens.
+    LIMITS = {"target_tokens": 60, "max_tokens": 80, "min_tokens": 20}
+
+    def setUp(self):
+        paragraphs = "\n\n".join(words(30, f"p{i}xx") for i in range(6))
+        self.text = f"# Intro\n\n{words(8, 'tiny')}\n\n# Methods\n\n{paragraphs}\n\n# End\n\n{words(4, 'fin')}"
+        self.chunks = chunk_markdown(self.text, **self.LIMITS)
+
+    def test_chunks_are_numbered_hashed_and_within_max_tokens(self):
+        self.assertEqual([c.ordinal for c in self.chunks], list(range(len(self.chunks))))
+        for chunk in self.chunks:
+            self.assertEqual(chunk.content_hash, text_hash(chunk.text))
+            self.assertLessEqual(chunk.token_count, self.LIMITS["max_tokens"])
+
+    def test_undersized_section_joins_first_piece_of_split_section(self):
+        first = self.chunks[0]
+        self.assertEqual(first.heading, "Intro")
+        self.assertIn("tiny", first.text)
+        self.assertIn("p0xx", first.text)
+        self.assertTrue(all("tiny" not in c.text for c in self.chunks[1:]))
+
+    def test_trailing_undersized_section_joins_previous_chunk(self):
+        last = self.chunks[-1]
+        self.assertIn("p5xx", last.text)
+        self.assertTrue(last.text.endswith(words(4, "fin")))
+
+    def test_hash_lines_in_fenced_code_are_not_headings(self):
+        text = f"# A\n\n```\n# not a heading\n```\n\n{words(40, 'word')}\n\n# B\n\n{words(40, 'word')}"
+        chunks = chunk_markdown(text, target_tokens=30, max_tokens=80, min_tokens=5)
+        self.assertEqual([c.heading for c in chunks], ["A", "B"])
+        self.assertIn("# not a heading", chunks[0].text)
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+
+    def cache(self, model="org/model", dimensions=4):
+        return EmbeddingCache(self.root.name, model, dimensions)
+
+    def test_round_trip(self):
+        self.cache().put_many([("a", [1, 2, 3, 4]), ("b", [5, 6, 7, 8])])
+        reopened = self.cache()
+        self.assertEqual(len(reopened), 2)
+        np.testing.assert_array_equal(reopened.get("b"), [5, 6, 7, 8])
+
+    def test_directory_is_keyed_by_model_and_dimensions(self):
+        self.cache().put_many([("a", [1, 2, 3, 4])])
+        self.assertIsNone(self.cache(dimensions=2).get("a"))
+        self.assertIsNone(self.cache(model="other").get("a"))
+
+    def test_load_drops_entries_cut_short_by_a_crash(self):
+        cache = self.cache()
+        cache.put_many([("a", [1, 2, 3, 4])])
+        # Rows are appended before keys: a crash can leave a row without its key, or half a key.
+        with open(cache._vectors_path, "ab") as f:
+            np.asarray([9, 9, 9, 9, 9, 9], dtype=np.float32).tofile(f)
+        with open(cache._keys_path, "a", encoding="utf-8") as f:
+            f.write("b")
+
+        reopened = self.cache()
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(reopened._keys_path.read_text(encoding="utf-8"), "a\n")
+        self.assertEqual(reopened._vectors_path.stat().st_size, 4 * 4)
+
+        reopened.put_many([("c", [0, 0, 0, 1])])
+        again = self.cache()
+        np.testing.assert_array_equal(again.get("a"), [1, 2, 3, 4])
+        np.testing.assert_array_equal(again.get("c"), [0, 0, 0, 1])
+
+
+class QueryEmbeddingCacheTests(unittest.TestCase):
+    def test_key_is_normalized_but_the_text_is_embedded_as_typed(self):
+        calls = []
+        cache = QueryEmbeddingCache(lambda text: calls.append(text) or [1.0])
+        cache.get("  BRCA1   knockout ")
+        cache.get("BRCA1 knockout")
+        cache.get("brca1 knockout")
+        self.assertEqual(calls, ["  BRCA1   knockout ", "brca1 knockout"])
+        self.assertEqual(cache.stats["hits"], 1)
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def embed(text):
+            calls.append(text)
+            started.set()
+            release.wait(5)
+            return [1.0]
+
+        cache = QueryEmbeddingCache(embed)
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get("q")))
+        leader.start()
+        started.wait(5)
+        waiter = threading.Thread(target=lambda: results.append(cache.get("q")))
+        waiter.start()
+        while cache.stats["coalesced"] == 0:
+            threading.Event().wait(0.001)
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(calls, ["q"])
+        self.assertEqual(results, [[1.0], [1.0]])
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_async_misses_share_one_upstream_call(self):
+        calls = []
+
+        async def aembed(text):
+            calls.append(text)
+            await asyncio.sleep(0.01)
+            return [2.0]
+
+        async def run():
+            cache = QueryEmbeddingCache(None, aembed=aembed)
+            return cache, await asyncio.gather(*(cache.aget("q") for _ in range(5)))
+
+        cache, results = asyncio.run(run())
+        self.assertEqual(calls, ["q"])
+        self.assertEqual(results, [[2.0]] * 5)
+        self.assertEqual(cache.stats["coalesced"], 4)
+
+    def test_waiter_retries_when_the_leader_is_cancelled(self):
+        calls = []
+
+        async def aembed(text):
+            calls.append(text)
+            await asyncio.sleep(0.05)
+            return [3.0]
+
+        async def run():
+            cache = QueryEmbeddingCache(None, aembed=aembed)
+            leader = asyncio.create_task(cache.aget("q"))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(cache.aget("q"))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return cache, await asyncio.wait_for(waiter, 1)
+
+        cache, vector = asyncio.run(run())
+        self.assertEqual(vector, [3.0])
+        self.assertEqual(calls, ["q", "q"])
+        self.assertEqual(cache._ainflight, {})
+
+
+def unit(*components):
+    """A normalized vector from its first components; the rest are zero."""
+    v = np.zeros(DIMENSIONS, dtype=np.float32)
+    v[:len(components)] = components
+    return (v / np.linalg.norm(v)).tolist()
+
+
+class LexicalIndexTests(unittest.TestCase):
+    SECTIONS = [
+        ("Bone", "Microgravity causes bone loss in mice."),
+        ("Bone", "Bone density was measured after flight."),
+        ("Plants", "Arabidopsis roots grow in microgravity."),
+        ("Stress", "TGF-beta signalling and H2O2 stress."),
+    ]
+    NAMES = [
+        ("Document", "Bone", ["Bone"]),
+        ("Entity", "Bone loss", ["Bone"]),
+        ("Organism", "Arabidopsis thaliana", ["Plants"]),
+        ("Compound", "H2O2", ["Stress"]),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        write_index(self.path, self.SECTIONS, self.NAMES)
+        self.index = LexicalIndex(self.path)
+
+    def test_tokenize_keeps_compounds_and_their_parts(self):
+        self.assertEqual(tokenize("TGF-beta and H2O2"), ["tgf-beta", "tgf", "beta", "and", "h2o2"])
+
+    def test_documents_rank_by_bm25_scaled_to_the_best_hit(self):
+        result = self.index.search_documents("bone density")
+        self.assertFalse(result.exact)
+        self.assertEqual([row[0] for row in result.rows], ["Bone"])
+        self.assertEqual(result.rows[0][1], 1.0)
+        self.assertEqual(result.rows[0][2], ["Bone", "Bone loss"])
+
+        # Stopwords alone match nothing.
+        self.assertEqual(self.index.search_documents("what is the").rows, [])
+
+    def test_exact_name_match_ranks_first(self):
+        result = self.index.search_documents("h2o2")
+        self.assertTrue(result.exact)
+        self.assertEqual(result.rows[0], ("Stress", EXACT_MATCH_SCORE, ["H2O2"]))
+
+    def test_a_rewritten_index_is_picked_up(self):
+        self.assertEqual(self.index.search_documents("radiation").rows, [])
+        write_index(self.path, self.SECTIONS + [("Rays", "Radiation exposure on the station.")], self.NAMES)
+        self.assertEqual([row[0] for row in self.index.search_documents("radiation").rows], ["Rays"])
+
+    def test_exact_match_skips_the_embedding_and_the_vector_probes(self):
+        embedded = []
+        embed = lambda query: embedded.append(query) or [0.0] * DIMENSIONS
+        retriever = FakeRetriever(documents=5)
+
+        results, used_embedding = hybrid_search(retriever, self.index, embed, "Arabidopsis thaliana")
+        self.assertEqual((used_embedding, embedded), (False, []))
+        self.assertEqual([r["document"] for r in results], ["Plants"])
+
+        results, used_embedding = hybrid_search(retriever, self.index, embed, "bone density", limit=10)
+        self.assertEqual((used_embedding, embedded), (True, ["bone density"]))
+        self.assertIn("Bone", [r["document"] for r in results])
+
+
+class FuseTests(unittest.TestCase):
+    LISTS = {
+        "entity": [("A", 0.9, ["x"]), ("B", 0.8, ["y"])],
+        "lexical": [("B", 100.0, ["z"]), ("C", 0.5, [])],
+    }
+
+    def test_rrf_rewards_documents_ranked_in_several_lists(self):
+        results = fuse(self.LISTS, method="rrf", rrf_k=60)
+        self.assertEqual([r["document"] for r in results], ["B", "A", "C"])
+        self.assertAlmostEqual(results[0]["score"], 1 / 62 + 1 / 61)
+        self.assertEqual(results[0]["matched_items"], ["y", "z"])
+
+    def test_max_and_weighted_compare_raw_scores(self):
+        self.assertEqual([r["document"] for r in fuse(self.LISTS, method="max")], ["B", "A", "C"])
+        weighted = fuse(self.LISTS, method="weighted", weights={"lexical": 0.001}, limit=2)
+        self.assertEqual([(r["document"], round(r["score"], 4)) for r in weighted], [("A", 0.9), ("B", 0.9)])
+        with self.assertRaises(ValueError):
+            fuse(self.LISTS, method="sum")
+
+
+def unit_rows(count, seed):
+    rows = np.random.default_rng(seed).standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+class RelatedDocumentsTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+    def test_blocked_top_k_matches_a_full_sort(self):
+        matrix = unit_rows(30, 1)
+        indices, scores = top_k_neighbours(matrix, 4, block_size=7)
+        similarity = matrix @ matrix.T
+        np.fill_diagonal(similarity, -np.inf)
+        np.testing.assert_array_equal(indices, np.argsort(-similarity, axis=1)[:, :4])
+        np.testing.assert_allclose(scores, np.sort(similarity, axis=1)[:, ::-1][:, :4], rtol=1e-6)
+
+        indices, _ = top_k_neighbours(matrix, 4, rows=[5, 2], block_size=7)
+        np.testing.assert_array_equal(indices, np.argsort(-similarity, axis=1)[[5, 2], :4])
+
+    def test_incremental_update_matches_a_rebuild(self):
+        names = [f"Doc {i}" for i in range(40)]
+        matrix = unit_rows(40, 2)
+        table = NeighbourTable(self.path)
+        table.rebuild(names[:35], matrix[:35], k=5, block_size=8)
+        table.save()
+
+        changed = unit_rows(3, 3)
+        table = NeighbourTable(self.path)
+        touched = table.update(["Doc 3", *names[35:]], np.vstack([changed[:1], matrix[35:]]), k=5, block_size=8)
+
+        expected = matrix.copy()
+        expected[3] = changed[0]
+        indices, scores = top_k_neighbours(expected, 5)
+        np.testing.assert_array_equal(table.neighbours, indices)
+        np.testing.assert_allclose(table.scores, scores, rtol=1e-6)
+        self.assertEqual(table.names, names)
+        # Rewritten: the changed and new documents, rows that listed the changed one, and rows whose list moved.
+        previous = NeighbourTable(self.path).neighbours
+        listed = {i for i in range(35) if 3 in previous[i]}
+        moved = {i for i in range(35) if (previous[i] != indices[i]).any()}
+        self.assertEqual(set(touched), {3, *range(35, 40)} | listed | moved)
+        self.assertLess(len(touched), 40)
+
+    def test_rows_and_related_rows(self):
+        table = NeighbourTable(self.path)
+        table.rebuild(["A", "B", "C"], np.array([[1, 0], [0.8, 0.6], [0, 1]], dtype=np.float32), k=1)
+        self.assertEqual(table.rows([0]), [{"name": "A", "neighbours": [{"name": "B", "score": 0.800000011920929, "rank": 1}]}])
+
+        self.assertIsNone(related_rows([]))
+        self.assertEqual(related_rows([{"name": None, "score": None}]), [])
+        self.assertEqual(related_rows([{"name": "B", "score": 0.8}]), [{"document": "B", "score": 0.8}])
+
+
+class MigrationGraph:
+    """Driver and session for the embedding migration queries over ``nodes[label][element id]``."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        for label, nodes in self.nodes.items():
+            if query == READ_QUERY.format(label=label):
+                keys = sorted(k for k in nodes if k > params["after"])[:params["limit"]]
+                return [{"key": k, "embedding": nodes[k].get("embedding"), "codes": nodes[k].get("embedding_int8"),
+                         "scale": nodes[k].get("embedding_scale")} for k in keys]
+            if query == UNCONVERTIBLE_QUERY.format(label=label):
+                return mock.Mock(single=lambda: {"nodes": sum(
+                    n.get("embedding_int8") is None and len(n["embedding"]) != params["dimensions"] for n in nodes.values()
+                )})
+            if query == QUANTIZED_QUERY.format(label=label):
+                return mock.Mock(single=lambda: {"nodes": sum(n.get("embedding_int8") is not None for n in nodes.values())})
+            if query == WRITE_QUERY.format(label=label):
+                for row in params["rows"]:
+                    nodes[row["key"]].update({k: v for k, v in row.items() if k != "key"})
+                return mock.Mock()
+        raise NotImplementedError(query)
+
+    def execute_write(self, work):
+        return work(self)
+
+
+class EmbeddingStorageTests(unittest.TestCase):
+    def test_quantize_round_trip(self):
+        matrix = unit_rows(20, 4)
+        codes, scales = quantize(matrix)
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertTrue((np.abs(dequantize(codes, scales) - matrix) <= scales[:, None] / 2 + 1e-7).all())
+        self.assertEqual(quantize(np.zeros(4))[1].tolist(), [1.0])
+
+    def test_compact_properties_keep_an_int8_full_vector(self):
+        storage = EmbeddingStorage(DIMENSIONS, 4, rerank_candidates=3)
+        vector = unit_rows(1, 5)[0].tolist()
+        properties = storage.properties(vector)
+        self.assertEqual(len(properties["embedding"]), 4)
+        self.assertAlmostEqual(float(np.linalg.norm(properties["embedding"])), 1.0, places=5)
+        self.assertEqual(len(properties["embedding_int8"]), DIMENSIONS)
+        decoded = storage.full_vector(None, properties["embedding_int8"], properties["embedding_scale"])
+        np.testing.assert_allclose(decoded, vector, atol=properties["embedding_scale"])
+        self.assertEqual((storage.candidates(10), EmbeddingStorage(DIMENSIONS, DIMENSIONS).candidates(10)), (30, 10))
+
+    def test_rerank_restores_the_full_vector_order(self):
+        storage = EmbeddingStorage(DIMENSIONS, 2)
+        query = unit_rows(1, 6)[0]
+        candidates = unit_rows(12, 7)
+        codes, scales = quantize(candidates)
+        # Index scores from the truncated vectors, as the compact index would return them.
+        index_scores = (1 + truncate(candidates, 2) @ truncate(query, 2)[0]) / 2
+        rows = [(i, float(index_scores[i]), codes[i].tobytes(), float(scales[i])) for i in range(12)]
+
+        reranked = storage.rerank(query.tolist(), rows, 4)
+        self.assertEqual([i for i, _ in reranked], np.argsort(-(candidates @ query))[:4].tolist())
+        # Rows without codes keep their index score.
+        self.assertEqual(storage.rerank(query.tolist(), [("bare", 0.99, None, None)] + rows, 1), [("bare", 0.99)])
+
+    def test_recall_report(self):
+        report = {r["layout"]: r["recall"] for r in recall_report(unit_rows(200, 8), k=5, index_dimensions=(4,), queries=20)}
+        self.assertGreaterEqual(report[f"int8 {DIMENSIONS}-d"], 0.9)
+        self.assertGreaterEqual(report["4-d index + int8 re-rank x4"], report["4-d index"])
+
+    def test_migration_to_compact_and_back(self):
+        vectors = unit_rows(5, 9)
+        graph = MigrationGraph({"Entity": {f"4:x:{i}": {"embedding": v.tolist()} for i, v in enumerate(vectors)}})
+        compact = EmbeddingStorage(DIMENSIONS, 4)
+
+        report = migrate_embeddings(graph, compact, labels=["Entity"], batch_size=2)
+        self.assertEqual(report, {"Entity": {"converted": 5, "skipped": 0}})
+        node = graph.nodes["Entity"]["4:x:0"]
+        self.assertEqual(len(node["embedding"]), 4)
+        np.testing.assert_allclose(compact.full_vector(None, node["embedding_int8"], node["embedding_scale"]), vectors[0],
+                                   atol=node["embedding_scale"])
+
+        # Back to float32 only writes decoded int8 codes: refused unless allowed.
+        full = EmbeddingStorage(DIMENSIONS, DIMENSIONS)
+        with self.assertRaises(EmbeddingMigrationError):
+            check_migration(graph, full, labels=["Entity"])
+        migrate_embeddings(graph, full, labels=["Entity"], allow_lossy=True)
+        self.assertEqual(len(graph.nodes["Entity"]["4:x:0"]["embedding"]), DIMENSIONS)
+
+    def test_reduced_vectors_without_an_int8_copy_cannot_migrate(self):
+        graph = MigrationGraph({"Entity": {"4:x:0": {"embedding": [1.0, 0.0, 0.0, 0.0]}}})
+        with self.assertRaises(EmbeddingMigrationError):
+            migrate_embeddings(graph, EmbeddingStorage(DIMENSIONS, 4), labels=["Entity"])
+        self.assertNotIn("embedding_int8", graph.nodes["Entity"]["4:x:0"])
+
+
+class SemanticAnswerCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(threshold=0.95, max_entries=2, ttl=60)
+
+    def test_hit_within_the_threshold_under_the_same_version(self):
+        self.cache.store([1.0, 0.0, 0.0], 1, "answer")
+        value, similarity = self.cache.lookup([1.0, 0.1, 0.0], 1)
+        self.assertEqual(value, "answer")
+        self.assertGreater(similarity, 0.95)
+
+        self.assertIsNone(self.cache.lookup([1.0, 1.0, 0.0], 1))
+        self.assertIsNone(self.cache.lookup([1.0, 0.0, 0.0], 2))
+        self.assertIsNone(self.cache.lookup([1.0, 0.0], 1))
+        self.assertEqual(self.cache.report(), {"hits": 1, "misses": 3, "stores": 1, "evictions": 0, "entries": 1, "hit_rate": 0.25})
+
+    def test_entries_expire_after_the_ttl(self):
+        with mock.patch("engine.answer_cache.time.time", return_value=1000.0):
+            self.cache.store([1.0, 0.0], 1, "answer")
+        with mock.patch("engine.answer_cache.time.time", return_value=1059.0):
+            self.assertIsNotNone(self.cache.lookup([1.0, 0.0], 1))
+        with mock.patch("engine.answer_cache.time.time", return_value=1061.0):
+            self.assertIsNone(self.cache.lookup([1.0, 0.0], 1))
+
+    def test_stale_slots_are_reused_before_the_least_recently_used(self):
+        self.cache.store([1.0, 0.0], 1, "old version")
+        self.cache.store([0.0, 1.0], 2, "b")
+        self.cache.store([1.0, 1.0], 2, "c")
+        self.assertEqual(self.cache.stats["evictions"], 0)
+        self.assertEqual(self.cache.lookup([0.0, 1.0], 2)[0], "b")
+
+        # Both entries are live: the least recently used one ("c") goes.
+        self.cache.store([1.0, -1.0], 2, "d")
+        self.assertEqual(self.cache.stats["evictions"], 1)
+        self.assertIsNone(self.cache.lookup([1.0, 1.0], 2))
+        self.assertEqual(self.cache.lookup([0.0, 1.0], 2)[0], "b")
+        self.assertEqual(self.cache.lookup([1.0, -1.0], 2)[0], "d")
+
+
+class FakeClock:
+    """``time.monotonic`` that only moves when ``asyncio.sleep`` is awaited."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class SchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for target, value in (("engine.scheduler.time.monotonic", self.clock.monotonic),
+                              ("engine.scheduler.asyncio.sleep", self.clock.sleep),
+                              ("engine.scheduler.random.uniform", lambda low, high: high)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_requests_wait_for_the_rpm_bucket_to_refill(self):
+        async def run():
+            limiter = RateLimiter(rpm=2, tpm=1000)
+            for _ in range(3):
+                await limiter.acquire(1)
+
+        asyncio.run(run())
+        # The third request waits for one request's worth of refill: 60 s / 2 rpm.
+        self.assertEqual(self.clock.sleeps, [30.0])
+
+    def test_tokens_wait_for_the_tpm_bucket_and_usage_corrects_it(self):
+        async def run():
+            limiter = RateLimiter(rpm=100, tpm=600)
+            await limiter.acquire(500)
+            limiter.debit(-400)  # the response used 100 tokens, not 500
+            await limiter.acquire(500)
+            await limiter.acquire(300)
+            # Larger than the whole budget: capped instead of waiting forever.
+            await limiter.acquire(10_000)
+
+        asyncio.run(run())
+        # 600 - 100 - 500 = 0 left: 300 tokens take 30 s at 10 tokens/s, then the full 600 take 60 s.
+        self.assertEqual([round(s, 6) for s in self.clock.sleeps], [30.0, 60.0])
+
+    def test_submit_retries_after_the_servers_delay_and_charges_reported_usage(self):
+        scheduler = LLMScheduler({"llm": (100, 10_000)}, max_retries=2)
+        calls = []
+
+        async def complete():
+            calls.append(self.clock.now)
+            if len(calls) == 1:
+                raise openai.error.RateLimitError("slow down", headers={"retry-after": "5"})
+            return {"usage": {"total_tokens": 40}}
+
+        self.assertEqual(asyncio.run(scheduler.submit(complete, tokens=100)), {"usage": {"total_tokens": 40}})
+        # max(jittered backoff of at most 1 s, Retry-After of 5 s)
+        self.assertEqual(calls, [0.0, 5.0])
+        self.assertEqual({k: scheduler.stats[k] for k in ("requests", "retries", "tokens")},
+                         {"requests": 1, "retries": 1, "tokens": 40})
+
+    def test_submit_gives_up_after_max_retries(self):
+        scheduler = LLMScheduler({"llm": (100, 10_000)}, max_retries=1)
+
+        async def complete():
+            raise openai.error.APIConnectionError("down")
+
+        with self.assertRaises(openai.error.APIConnectionError):
+            asyncio.run(scheduler.submit(complete))
+        self.assertEqual((scheduler.stats["retries"], scheduler.stats["failures"]), (1, 1))
+
+
+class CanonicalizeTests(unittest.TestCase):
+    def test_canonical_key(self):
+        self.assertEqual(canonical_key("Simulated  Micro-gravity (SMG)"), "simulated micro gravity")
+        self.assertEqual(canonical_key("TGF-β"), canonical_key("tgf β"))
+
+    def test_blocked_pairs_match_the_full_product(self):
+        matrix = np.asarray([vector(i) for i in range(9)] + [vector(3)], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        expected = set(zip(*np.nonzero(np.triu(matrix @ matrix.T, k=1) >= 0.2)))
+        for block_size in (1, 4, 100):
+            with self.subTest(block_size=block_size):
+                self.assertEqual(set(zip(*similar_pairs(matrix, 0.2, block_size))), expected)
+
+    def test_names_join_by_key_and_by_similarity(self):
+        names = ["microgravity", "MICROGRAVITY", "weightlessness", "radiation"]
+        embeddings = [unit(1, 0), None, unit(1, 0.1), unit(0, 1)]
+        self.assertEqual(cluster(names, embeddings, threshold=0.95, block_size=2), [[0, 1, 2]])
+        self.assertEqual(cluster(names, embeddings, threshold=None), [[0, 1]])
+
+    def test_similarity_chains_do_not_merge_distant_ends(self):
+        # a~b and b~c are above the threshold, a~c is not.
+        names = ["a", "b", "c"]
+        embeddings = [unit(1, 0), unit(1, 0.45), unit(1, 0.9)]
+        self.assertEqual(cluster(names, embeddings, threshold=0.9), [[0, 1]])
+
+    def test_merge_rows_list_every_other_spelling_once(self):
+        nodes = [
+            {"name": "microgravity", "aliases": ["µg"]},
+            {"name": "Microgravity", "aliases": []},
+            {"name": "weightlessness", "aliases": ["µg", "microgravity"]},
+        ]
+        self.assertEqual(plan_merges(nodes, [[0, 1, 2]]), [
+            {"canonical": "microgravity", "aliases": ["µg", "Microgravity", "weightlessness"]},
+        ])
+
+    def test_resolve_maps_spellings_onto_the_first_name_seen(self):
+        canonicalizer = Canonicalizer(threshold=0.95)
+        self.assertEqual(canonicalizer.resolve("Entity", "microgravity", unit(1, 0))[0], "microgravity")
+        self.assertEqual(canonicalizer.resolve("Entity", "Microgravity", unit(0, 1))[0], "microgravity")
+        self.assertEqual(canonicalizer.resolve("Entity", "weightlessness", unit(1, 0.1))[0], "microgravity")
+        self.assertEqual(canonicalizer.resolve("Person", "J. Smith", unit(1, 0))[0], "J. Smith")
+        self.assertEqual(canonicalizer.resolve("Person", "J. Smyth", unit(1, 0))[0], "J. Smyth")
+        self.assertEqual(canonicalizer.report(), {"names": 5, "same_key": 1, "similar": 1, "new": 3})
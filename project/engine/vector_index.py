@@ -0,0 +1,253 @@
+"""In-process cosine index over a snapshot of the graph's embeddings.
+
+A snapshot directory holds, per label, a pre-normalized float32 ``.npy``
+matrix and a ``.json`` list with one metadata row per matrix row, plus a
+``manifest.json`` whose version is bumped on every write. Matrices are opened
+with ``mmap_mode="r"`` so workers on the same host share the page cache, and
+readers pick up a new snapshot on their next query after the manifest changes.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+# label -> relationship types from Document to the node
+NODE_LABELS = {
+    "Entity": ["MENTIONS"],
+    "Organism": ["MENTIONS_ORGANISM"],
+    "Compound": ["MENTIONS_COMPOUND"],
+    "Person": ["CONTRIBUTED_BY", "MENTIONS_PERSON"],
+}
+SECTION_LABEL = "Section"
+
+# One published manifest version, swapped in as one reference.
+Snapshot = namedtuple("Snapshot", "version tables name_rows")
+
+# Kept names whose node was deleted (canonicalization merges alias nodes away) or lost its embedding.
+MISSING_NODES_QUERY = """
+UNWIND $names AS name
+OPTIONAL MATCH (n:`{label}` {{name: name}})
+WITH name, n WHERE n IS NULL OR n.embedding IS NULL
+RETURN name
+"""
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(matrix, query, k):
+    """Indices and cosine scores of the ``k`` best rows, best first."""
+    if matrix.shape[0] == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    scores = matrix @ normalize_rows(query)[0]
+    k = min(k, scores.shape[0])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx])]
+    return idx, scores[idx]
+
+
+def _node_rows(session, label):
+    rels = "|".join(NODE_LABELS[label])
+    result = session.run(f"""
+        MATCH (n:`{label}`) WHERE n.embedding IS NOT NULL
+        OPTIONAL MATCH (n)<-[:{rels}]-(d:Document)
+        RETURN n.name AS name, n.embedding AS embedding, collect(DISTINCT d.name) AS docs
+    """)
+    return [({"name": r["name"], "docs": r["docs"]}, r["embedding"]) for r in result]
+
+
+def _section_rows(session, documents=None):
+    result = session.run("""
+        MATCH (d:Document)-[:HAS_SECTION]->(s:Section)
+        WHERE s.embedding IS NOT NULL AND ($documents IS NULL OR d.name IN $documents)
+        RETURN d.name AS doc, s.text AS text, s.ordinal AS ordinal, s.heading AS heading, s.embedding AS embedding
+    """, documents=documents)
+    return [
+        ({"doc": r["doc"], "text": r["text"], "ordinal": r["ordinal"], "heading": r["heading"]}, r["embedding"])
+        for r in result
+    ]
+
+
+def _missing_nodes(session, label, names):
+    result = session.run(MISSING_NODES_QUERY.format(label=label), names=names)
+    return {r["name"] for r in result}
+
+
+def _linked_node_rows(session, label, documents):
+    rels = "|".join(NODE_LABELS[label])
+    result = session.run(f"""
+        MATCH (d:Document)-[:{rels}]->(n:`{label}`)
+        WHERE d.name IN $documents AND n.embedding IS NOT NULL
+        WITH DISTINCT n
+        OPTIONAL MATCH (n)<-[:{rels}]-(d:Document)
+        RETURN n.name AS name, n.embedding AS embedding, collect(DISTINCT d.name) AS docs
+    """, documents=documents)
+    return [({"name": r["name"], "docs": r["docs"]}, r["embedding"]) for r in result]
+
+
+class SnapshotStore:
+    """Reads and atomically writes the snapshot files of one directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def manifest_path(self):
+        return self.path / "manifest.json"
+
+    def manifest(self):
+        if not self.manifest_path.exists():
+            return {"version": 0, "labels": {}}
+        return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+
+    def load(self, label, mmap=True):
+        version = self.manifest()["labels"].get(label)
+        if version is None:
+            return [], np.empty((0, 0), dtype=np.float32)
+        meta = json.loads((self.path / f"{label}.{version}.json").read_text(encoding="utf-8"))
+        matrix = np.load(self.path / f"{label}.{version}.npy", mmap_mode="r" if mmap else None)
+        return meta, matrix
+
+    def write(self, tables):
+        """Write ``{label: (meta, matrix)}`` and publish them in a new manifest version."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = self.manifest()
+        previous = dict(manifest["labels"])
+        version = manifest["version"] + 1
+        # Versioned file names: readers still mapping the previous files are unaffected.
+        for label, (meta, matrix) in tables.items():
+            np.save(self.path / f"{label}.{version}.npy", np.ascontiguousarray(matrix, dtype=np.float32))
+            (self.path / f"{label}.{version}.json").write_text(json.dumps(meta), encoding="utf-8")
+            manifest["labels"][label] = version
+        manifest["version"] = version
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+        self._remove_stale(previous, manifest["labels"])
+
+    def _remove_stale(self, previous, current):
+        # Keep the previous generation around for readers that have not reloaded yet.
+        live = {f"{label}.{version}" for labels in (previous, current) for label, version in labels.items()}
+        for path in self.path.glob("*.*.npy"):
+            stem = path.name[: -len(".npy")]
+            if stem not in live:
+                path.unlink(missing_ok=True)
+                path.with_suffix(".json").unlink(missing_ok=True)
+
+
+def _table(rows, dimensions=None):
+    meta = [m for m, _ in rows]
+    if not rows:
+        return meta, np.empty((0, dimensions or 0), dtype=np.float32)
+    return meta, normalize_rows([e for _, e in rows])
+
+
+def build_snapshot(driver, path):
+    """Export every Section and node embedding from Neo4j into a fresh snapshot."""
+    tables = {}
+    with driver.session() as session:
+        tables[SECTION_LABEL] = _table(_section_rows(session))
+        for label in NODE_LABELS:
+            tables[label] = _table(_node_rows(session, label))
+    SnapshotStore(path).write(tables)
+    return {label: len(meta) for label, (meta, _) in tables.items()}
+
+
+def refresh_snapshot(driver, path, documents):
+    """Merge the sections and linked nodes of ``documents`` into an existing snapshot.
+
+    Rows belonging to those documents are replaced and node rows whose node no
+    longer exists are dropped; everything else is kept, so only the newly
+    ingested part of the graph is read back from Neo4j.
+    """
+    store = SnapshotStore(path)
+    if not store.manifest()["labels"]:
+        return build_snapshot(driver, path)
+    documents = list(documents)
+    doc_set = set(documents)
+    tables = {}
+    with driver.session() as session:
+        meta, matrix = store.load(SECTION_LABEL, mmap=False)
+        keep = [i for i, m in enumerate(meta) if m["doc"] not in doc_set]
+        new_meta, new_matrix = _table(_section_rows(session, documents), matrix.shape[1] or None)
+        tables[SECTION_LABEL] = _concat([meta[i] for i in keep], matrix[keep], new_meta, new_matrix)
+
+        for label in NODE_LABELS:
+            meta, matrix = store.load(label, mmap=False)
+            new_meta, new_matrix = _table(_linked_node_rows(session, label, documents), matrix.shape[1] or None)
+            replaced = {m["name"] for m in new_meta}
+            gone = _missing_nodes(session, label, [m["name"] for m in meta if m["name"] not in replaced])
+            keep = [i for i, m in enumerate(meta) if m["name"] not in replaced and m["name"] not in gone]
+            tables[label] = _concat([meta[i] for i in keep], matrix[keep], new_meta, new_matrix)
+    store.write(tables)
+    return {label: len(meta) for label, (meta, _) in tables.items()}
+
+
+def _concat(meta, matrix, new_meta, new_matrix):
+    if not new_meta:
+        return meta, matrix
+    if matrix.shape[0] == 0:
+        return new_meta, new_matrix
+    return meta + new_meta, np.concatenate([matrix, new_matrix])
+
+
+class NumpyVectorIndex:
+    """Lazily loaded, auto-reloading view over a snapshot directory."""
+
+    def __init__(self, path):
+        self.store = SnapshotStore(path)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = Snapshot(None, {}, {})
+
+    def _maybe_reload(self):
+        try:
+            mtime = self.store.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise RuntimeError(f"No vector snapshot found in {self.store.path}")
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            manifest = self.store.manifest()
+            tables = {label: self.store.load(label) for label in manifest["labels"]}
+            name_rows = {
+                label: {m["name"]: i for i, m in enumerate(meta)}
+                for label, (meta, _) in tables.items() if label != SECTION_LABEL
+            }
+            # Readers hold on to whichever snapshot they started with.
+            self._snapshot = Snapshot(manifest["version"], tables, name_rows)
+            self._mtime = mtime
+
+    @property
+    def version(self):
+        self._maybe_reload()
+        return self._snapshot.version
+
+    def search(self, label, embedding, k):
+        """``(metadata, score)`` pairs for the ``k`` nearest rows of ``label``."""
+        self._maybe_reload()
+        meta, matrix = self._snapshot.tables.get(label, ([], np.empty((0, 0), dtype=np.float32)))
+        idx, scores = top_k(matrix, embedding, k)
+        return [(meta[i], float(s)) for i, s in zip(idx, scores)]
+
+    def rows(self, label):
+        """Metadata rows of ``label``, in matrix order."""
+        self._maybe_reload()
+        return self._snapshot.tables.get(label, ([], None))[0]
+
+    def exact_row(self, label, name):
+        self._maybe_reload()
+        snapshot = self._snapshot
+        row = snapshot.name_rows.get(label, {}).get(name)
+        return None if row is None else snapshot.tables[label][0][row]
@@ -5,10 +5,13 @@ const api = axios.create({
 })
 
 export type CategoryList = { categories: string[] }
+// Paged listings: next_after, then next_after_id for nodes without a name; both null after the last page
+export type PageCursor = { next_after?: string | null; next_after_id?: string | null }
+
 export type CategoryItems = {
   category_name: string
   data: { id: number; labels: string[]; properties: Record<string, unknown> }[]
-}
+} & PageCursor
 
 export type DocumentsForEntity = {
   category: string
@@ -16,10 +19,13 @@ export type DocumentsForEntity = {
   documents: string[]
 }
 
-export type AllDocuments = { documents: string[] }
+export type AllDocuments = { documents: string[] } & PageCursor
 
 export type SearchResults = {
-  results: { document: string; max_score: number }[]
+  // score orders the results; under the default "rrf" fusion it is a rank sum, not a similarity
+  results: { document: string; score: number }[]
+  fusion: 'max' | 'rrf' | 'weighted'
+  embedding_skipped: boolean
 }
 
 export type SummarizeResponse = {
@@ -33,9 +39,23 @@ export async function listCategories() {
   return data
 }
 
+async function allPages<T extends PageCursor>(url: string, merge: (all: T, page: T) => T) {
+  let params: Record<string, string> = {}
+  let all: T | undefined
+  for (;;) {
+    const { data } = await api.get<T>(url, { params })
+    all = all ? merge(all, data) : data
+    if (data.next_after != null) params = { after: data.next_after }
+    else if (data.next_after_id != null) params = { after_id: data.next_after_id }
+    else return { ...all, next_after: null, next_after_id: null }
+  }
+}
+
 export async function getCategoryItems(category: string) {
-  const { data } = await api.get<CategoryItems>(`/get-category/${encodeURIComponent(category)}/`)
-  return data
+  return allPages<CategoryItems>(`/get-category/${encodeURIComponent(category)}/`, (all, page) => ({
+    ...all,
+    data: [...all.data, ...page.data],
+  }))
 }
 
 export async function listDocumentsFor(category: string, name: string) {
@@ -46,13 +66,18 @@ export async function listDocumentsFor(category: string, name: string) {
 }
 
 export async function listAllDocuments() {
-  const { data } = await api.get<AllDocuments>('/list-all-documents/')
-  return data
+  return allPages<AllDocuments>('/list-all-documents/', (all, page) => ({
+    ...all,
+    documents: [...all.documents, ...page.documents],
+  }))
 }
 
-export async function getDocument(doc_name: string) {
+// Metadata by default; heavier parts are requested by name
+export type DocumentField = 'summary' | 'text' | 'headings' | 'sections'
+
+export async function getDocument(doc_name: string, fields: DocumentField[] = []) {
   const { data } = await api.get<{ document: unknown }>('/get-document/', {
-    params: { doc_name },
+    params: { doc_name, fields: fields.length ? fields.join(',') : undefined },
   })
   return data
 }
@@ -78,10 +78,10 @@ export default function Home() {
         <h2>Top Matches</h2>
         {results.length === 0 ? <p className="muted">No results yet. Try a search.</p> : (
           <div style={{display:'grid',gridTemplateColumns:'repeat(auto-fit,minmax(220px,1fr))',gap:12}}>
-            {results.map(r => (
+            {results.map((r, i) => (
               <div key={r.document} className="card">
                 <div style={{fontWeight:600}}>{r.document}</div>
-                <div className="muted" style={{fontSize:13}}>Relevance: {r.max_score.toFixed(2)}</div>
+                <div className="muted" style={{fontSize:13}}>Rank {i + 1}</div>
               </div>
             ))}
           </div>
@@ -10,7 +10,7 @@ export default function PublicationDetail() {
   useEffect(() => {
     if (!name) return
     setLoading(true)
-    getDocument(name).then((d) => setDoc(d.document)).catch(() => {}).finally(() => setLoading(false))
+    getDocument(name, ['summary']).then((d) => setDoc(d.document)).catch(() => {}).finally(() => setLoading(false))
   }, [name])
 
   return (
@@ -12,7 +12,7 @@ export default function SummariseDetail() {
     if (!name) return
     setLoading(true)
     const decoded = decodeURIComponent(name)
-    getDocument(decoded)
+    getDocument(decoded, ['summary'])
       .then((d) => setDoc(d.document || d))
       .catch(() => setDoc(null))
       .finally(() => setLoading(false))
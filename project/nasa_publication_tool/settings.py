@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.middleware.RequestTimingMiddleware',
+    'base.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -112,4 +115,107 @@ NEO4J_URI = "neo4j://127.0.0.1:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "123456789"
 
+# Driver pool (see neo4j_connection.py): connections per worker process, seconds to wait for a free one,
+# seconds to open one, and seconds before one is recycled. NEO4J_QUERY_TIMEOUT is the default server-side
+# transaction timeout of the API's named queries (engine/database.py); 0 leaves it to the server.
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", 50))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", 10))
+NEO4J_CONNECTION_TIMEOUT = float(os.environ.get("NEO4J_CONNECTION_TIMEOUT", 5))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", 3600))
+NEO4J_QUERY_TIMEOUT = float(os.environ.get("NEO4J_QUERY_TIMEOUT", 30)) or None
+
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Optional Django cache alias shared by workers for query embeddings (see engine/query_embeddings.py)
+QUERY_EMBEDDING_CACHE_ALIAS = None
+
+# Document search score fusion: "rrf", "max" or "weighted" (see engine/search.py). Only "rrf" puts the
+# per-query scaled BM25 scores and the vector cosines on the same footing. search-by-nodes/ returns each
+# document's fused "score" (formerly "max_score") and the "fusion" used; under "rrf" it is a rank sum,
+# not a similarity.
+SEARCH_FUSION = "rrf"
+SEARCH_FUSION_WEIGHTS = {"entity": 1.0, "organism": 1.0, "compound": 1.0, "person": 1.0, "lexical": 1.0}
+# Documents search-by-nodes/ returns when the request has no 'limit'. Search used to return every
+# matched document; a client that needs more passes a larger 'limit' (see base/search.py).
+SEARCH_LIMIT = int(os.environ.get("SEARCH_LIMIT", 50))
+
+# BM25 index over section text and node names (see engine/lexical_index.py), built by ingestion when
+# LEXICAL_INDEX_DIR is set or by scripts/build_lexical_index.py. Search fuses it with the vector probes
+# when it exists; with LEXICAL_SKIP_EMBEDDING a query matching a node name exactly is answered from it
+# alone, without an embedding call.
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", BASE_DIR / "lexical_index")
+LEXICAL_SKIP_EMBEDDING = os.environ.get("LEXICAL_SKIP_EMBEDDING", "1").lower() in ("1", "true", "yes")
+
+# SIMILAR_TO edges between documents (see engine/related_documents.py), computed by ingestion when
+# RELATED_DIR is set or by scripts/build_related_documents.py. related-documents/ serves at most
+# RELATED_DOCUMENTS_K of them per document.
+RELATED_DOCUMENTS_K = int(os.environ.get("RELATED_DOCUMENTS_K", 10))
+
+# Vector retrieval backend: "neo4j" (vector indexes over Bolt), "numpy" (in-process snapshot, see
+# engine/vector_index.py) or "fake" (offline stand-in)
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "neo4j")
+VECTOR_SNAPSHOT_DIR = os.environ.get("VECTOR_SNAPSHOT_DIR", BASE_DIR / "vector_snapshot")
+
+# Completion backend for /rag: "openai", or "fake" for offline runs (see engine/llm.py)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+
+# /rag context (see engine/context.py): sections retrieved, token budget they are packed into, shingle
+# containment above which a section counts as a near-duplicate, and whether sections that do not fit
+# are trimmed to the passages around the query terms instead of being skipped.
+RAG_TOP_K = int(os.environ.get("RAG_TOP_K", 10))
+RAG_CONTEXT_TOKENS = int(os.environ.get("RAG_CONTEXT_TOKENS", 6000))
+RAG_DUPLICATE_THRESHOLD = float(os.environ.get("RAG_DUPLICATE_THRESHOLD", 0.8))
+RAG_TRIM_SECTIONS = os.environ.get("RAG_TRIM_SECTIONS", "1").lower() in ("1", "true", "yes")
+# The RAG_NEIGHBOUR_SECTIONS best sections also bring the sections within RAG_NEIGHBOUR_WINDOW ordinals
+# of them in their document, packed after all retrieved sections. RAG_NEIGHBOUR_WINDOW=0 disables it.
+RAG_NEIGHBOUR_SECTIONS = int(os.environ.get("RAG_NEIGHBOUR_SECTIONS", 3))
+RAG_NEIGHBOUR_WINDOW = int(os.environ.get("RAG_NEIGHBOUR_WINDOW", 1))
+
+# Per-process semantic answer cache for /rag (see engine/answer_cache.py): a query whose embedding is
+# within RAG_ANSWER_CACHE_THRESHOLD cosine of a cached one, under the same graph version, gets the cached
+# answer. RAG_ANSWER_CACHE_SIZE=0 disables it; stats at /rag/answer-cache/.
+RAG_ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", 0.95))
+RAG_ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", 2000))
+RAG_ANSWER_CACHE_TTL = float(os.environ.get("RAG_ANSWER_CACHE_TTL", 3600))
+
+# Serve the base/rag endpoints with the async views (base/async_views.py, rag/async_views.py).
+# Only enable under an ASGI server, e.g. `uvicorn nasa_publication_tool.asgi:application --workers 4`.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
+# Catalog response cache (see base/response_cache.py). Entries are keyed on the graph version that
+# ingestion bumps; each worker re-reads the version from Neo4j at most every GRAPH_VERSION_TTL seconds.
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60
+GRAPH_VERSION_TTL = float(os.environ.get("GRAPH_VERSION_TTL", 5))
+
+# Create missing Neo4j constraints/indexes and check vector dimensions when a server process starts (runserver or
+# a WSGI/ASGI server, not other manage.py commands; see base/apps.py and engine/schema.py)
+NEO4J_SCHEMA_ON_STARTUP = os.environ.get("NEO4J_SCHEMA_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+# Request timing (see base/middleware.py and engine/profiling.py): stage spans go out as a Server-Timing
+# header and one JSON line per request on the "request_timing" logger. PROFILING_SAMPLE_RATE of requests,
+# and requests sending the PROFILING_HEADER header when one is named, are profiled with PROFILING_BACKEND
+# ("cprofile" or "pyinstrument") into PROFILING_DIR.
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0.0))
+PROFILING_HEADER = os.environ.get("PROFILING_HEADER", "")
+PROFILING_BACKEND = os.environ.get("PROFILING_BACKEND", "cprofile")
+PROFILING_DIR = os.environ.get("PROFILING_DIR", BASE_DIR / "profiles")
+
+# Response compression (see base/middleware.py): bodies of at least COMPRESSION_MIN_BYTES are sent with
+# brotli when the "brotli" package is installed and the client accepts it, otherwise with gzip.
+RESPONSE_COMPRESSION = os.environ.get("RESPONSE_COMPRESSION", "1").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 512))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "request_timing": {
+            "handlers": ["console"], "level": os.environ.get("REQUEST_TIMING_LOG_LEVEL", "INFO"), "propagate": False,
+        },
+    },
+}
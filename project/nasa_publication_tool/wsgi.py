@@ -10,13 +10,29 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.conf import settings
 from neo4j_connection import Neo4jConnection
+from engine.retrieval import create_async_retriever, create_retriever
+from engine.graph_version import READ_QUERY, GraphVersionTracker
+from engine.lexical_index import LexicalIndex
 import atexit
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nasa_publication_tool.settings')
 
 neo4j_connection = Neo4jConnection()
 
+retriever = create_retriever(neo4j_connection, settings.RETRIEVAL_BACKEND, settings.VECTOR_SNAPSHOT_DIR)
+async_retriever = create_async_retriever(neo4j_connection, settings.RETRIEVAL_BACKEND, settings.VECTOR_SNAPSHOT_DIR)
+lexical_index = LexicalIndex(settings.LEXICAL_INDEX_DIR)
+
+
+def read_graph_version():
+    records = neo4j_connection.execute_read("graph_version", READ_QUERY)
+    return records[0]["version"] if records else 0
+
+
+graph_version = GraphVersionTracker(read_graph_version, ttl=settings.GRAPH_VERSION_TTL)
+
 atexit.register(neo4j_connection.close)
 
 application = get_wsgi_application()
@@ -1,19 +1,42 @@
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, GraphDatabase
 from django.conf import settings
 
-class Neo4jConnection:
+from engine.database import Database
+
+
+def driver_config():
+    """Pool settings shared by the sync and async drivers (see the NEO4J_* settings)."""
+    return {
+        "max_connection_pool_size": settings.NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": settings.NEO4J_ACQUISITION_TIMEOUT,
+        "connection_timeout": settings.NEO4J_CONNECTION_TIMEOUT,
+        "max_connection_lifetime": settings.NEO4J_MAX_CONNECTION_LIFETIME,
+    }
+
+
+class Neo4jConnection(Database):
+    """The API's data-access layer: pooled drivers from settings and instrumented named queries."""
+
     def __init__(self):
-        self._driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+        auth = (settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+        config = driver_config()
+        super().__init__(
+            GraphDatabase.driver(settings.NEO4J_URI, auth=auth, **config),
+            # Created on first use so it binds to the ASGI server's event loop.
+            lambda: AsyncGraphDatabase.driver(settings.NEO4J_URI, auth=auth, **config),
+            query_timeout=settings.NEO4J_QUERY_TIMEOUT,
         )
 
-    def close(self):
-        if self._driver:
-            self._driver.close()
 
 if __name__ == "__main__":
+    import os
+    from engine import metrics
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nasa_publication_tool.settings")
     connection = Neo4jConnection()
-    result = connection.query("MATCH (n) RETURN n LIMIT 10")
-    print(result)
-    connection.close()
\ No newline at end of file
+    try:
+        for record in connection.execute_read("sample_nodes", "MATCH (n) RETURN n LIMIT 10"):
+            print(record["n"])
+        print(metrics.prometheus_text())
+    finally:
+        connection.close()
@@ -0,0 +1,103 @@
+"""Async version of ``rag.views.query_and_generate`` for ASGI deployments."""
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from nasa_publication_tool.wsgi import async_retriever, graph_version
+from engine.context import add_neighbours, neighbour_targets
+from engine.profiling import span
+from engine.query_embeddings import get_query_embedding_async
+from .views import (
+    AnswerStream, answer_cache, build_prompt, cached_answer, cached_events, llm, remember_answer, sse_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def retrieve_sections(q_emb, top_k=settings.RAG_TOP_K):
+    sections = await async_retriever.sections(q_emb, top_k=top_k)
+    window = settings.RAG_NEIGHBOUR_WINDOW
+    if not window:
+        return sections
+    targets = neighbour_targets(sections, settings.RAG_NEIGHBOUR_SECTIONS)
+    neighbours = await asyncio.gather(*(async_retriever.neighbours(s["doc_name"], s["ordinal"], window) for s in targets))
+    return add_neighbours(sections, neighbours)
+
+
+async def cache_version():
+    if answer_cache is None:
+        return None
+    try:
+        return await graph_version.acurrent()
+    except Exception:
+        logger.warning("Graph version unavailable, answer cache bypassed", exc_info=True)
+        return None
+
+
+async def acached_events(user_query, answer, started):
+    for event in cached_events(user_query, answer, started):
+        yield event
+
+
+async def stream_answer(user_query, publication, prompt, tokens, started, on_complete=None):
+    answer = AnswerStream(user_query, publication, tokens, started, on_complete)
+    yield answer.publications()
+    try:
+        async for token in llm.astream(prompt, temperature=0, max_tokens=5000):
+            yield answer.token(token)
+    except Exception as e:
+        yield answer.error(e)
+        return
+    yield answer.done()
+
+
+@csrf_exempt
+@require_POST
+async def query_and_generate(request):
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body or b"{}") if request.content_type == "application/json" else request.POST
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Request body must be a JSON object."}, status=400)
+
+    user_query = data.get('query', '')
+    if not user_query:
+        return JsonResponse({"error": "Query parameter is required."}, status=400)
+
+    stream = str(data.get("stream", request.GET.get("stream", False))).lower() in ("1", "true", "yes")
+    # The graph version read does not need the embedding, so it overlaps the embedding call.
+    with span("embed"):
+        q_emb, version = await asyncio.gather(get_query_embedding_async(user_query), cache_version())
+    with span("answer_cache"):
+        cached = cached_answer(q_emb, version)
+    if cached is not None:
+        if stream:
+            return sse_response(acached_events(user_query, cached, started))
+        return JsonResponse({"query": user_query, **cached})
+
+    with span("retrieve"):
+        sections = await retrieve_sections(q_emb)
+    with span("context"):
+        prompt, publication, tokens = build_prompt(user_query, sections)
+
+    if stream:
+        remember = lambda answer: remember_answer(q_emb, version, answer, publication, tokens)
+        return sse_response(stream_answer(user_query, publication, prompt, tokens, started, remember))
+
+    with span("llm"):
+        generated_output = await llm.acomplete(prompt, temperature=0, max_tokens=5000)
+    remember_answer(q_emb, version, generated_output, publication, tokens)
+    with span("render"):
+        return JsonResponse({
+            "query": user_query,
+            "generated_output": generated_output,
+            "Publication": publication,
+            "prompt_tokens": tokens,
+        })
@@ -1,3 +1,78 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+
+from engine.answer_cache import SemanticAnswerCache
+from engine.retrieval import FakeRetriever
+from . import views
+
+
+class FakeLLM:
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+
+    def stream(self, prompt, **kwargs):
+        yield from self.tokens
+        if self.error is not None:
+            raise self.error
+
+
+class StreamAnswerTests(SimpleTestCase):
+    def events(self, llm, on_complete=None):
+        with mock.patch.object(views, "llm", llm):
+            return list(views.stream_answer("q", ["Paper"], "prompt", 12, 0.0, on_complete))
+
+    def test_publications_then_tokens_then_done(self):
+        answers = []
+        events = self.events(FakeLLM(["Hello", " world "]), answers.append)
+
+        self.assertEqual([e.split("\n", 1)[0] for e in events],
+                         ["event: publications", "event: token", "event: token", "event: done"])
+        self.assertIn('"Publication": ["Paper"]', events[0])
+        self.assertEqual(answers, ["Hello world"])
+
+    def test_ttfb_is_taken_before_the_first_event_is_yielded(self):
+        with mock.patch.object(views, "llm", FakeLLM(["a"])):
+            stream = views.stream_answer("q", [], "prompt", 1, 0.0)
+            with mock.patch.object(views.ttfb_seconds, "observe") as observe:
+                next(stream)
+                observe.assert_called_once()
+
+    def test_failed_stream_ends_with_an_error_and_is_not_remembered(self):
+        answers = []
+        events = self.events(FakeLLM(["partial"], error=RuntimeError("LLM down")), answers.append)
+
+        self.assertTrue(events[-1].startswith("event: error"))
+        self.assertIn("LLM down", events[-1])
+        self.assertEqual(answers, [])
+
+
+class QueryAndGenerateTests(SimpleTestCase):
+    def post(self, data):
+        request = APIRequestFactory().post("/rag/query-and-generate/", data, format="json")
+        return views.query_and_generate(request)
+
+    def test_body_must_be_an_object_with_a_query(self):
+        self.assertEqual(self.post(["q"]).status_code, 400)
+        self.assertEqual(self.post({"query": ""}).status_code, 400)
+
+    def test_repeated_query_is_answered_from_the_cache(self):
+        llm = mock.Mock()
+        llm.complete.return_value = "Answer"
+        graph_version = mock.Mock()
+        graph_version.current.return_value = 3
+        with mock.patch.multiple(views, llm=llm, graph_version=graph_version, retriever=FakeRetriever(documents=3),
+                                 answer_cache=SemanticAnswerCache(threshold=0.9, max_entries=4),
+                                 get_query_embedding=mock.Mock(return_value=[1.0, 0.0])):
+            first = self.post({"query": "What happens to bone?"}).data
+            second = self.post({"query": "What happens to bones?"}).data
+            graph_version.current.return_value = 4
+            third = self.post({"query": "What happens to bone?"}).data
+
+        self.assertNotIn("cached", first)
+        self.assertEqual((second["cached"], second["generated_output"]), (True, "Answer"))
+        self.assertEqual(second["Publication"], first["Publication"])
+        self.assertNotIn("cached", third)
+        self.assertEqual(llm.complete.call_count, 2)
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from .views import query_and_generate
+from .views import answer_cache_stats, query_and_generate
+from . import async_views
 
 urlpatterns = [
-    path('query-and-generate/', query_and_generate, name='query_and_generate'),
-]
\ No newline at end of file
+    path('query-and-generate/', async_views.query_and_generate if settings.ASYNC_VIEWS else query_and_generate, name='query_and_generate'),
+    path('answer-cache/', answer_cache_stats, name='answer_cache_stats'),
+]
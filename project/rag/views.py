@@ -85,52 +85,44 @@
 
 
 from django.shortcuts import render
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from neo4j import GraphDatabase
-import openai
-from nasa_publication_tool.wsgi import neo4j_connection
-
-def get_embedding(text):
-    response = openai.Embedding.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return response["data"][0]["embedding"]
-
-@api_view(['POST'])
-def query_and_generate(request):
-    user_query = request.data.get('query', '')
-    if not user_query:
-        return Response({"error": "Query parameter is required."}, status=400)
-
-    # Get embedding for the user query
-    q_emb = get_embedding(user_query)
-
-    # Perform semantic search on section nodes
-    with neo4j_connection._driver.session() as session:
-        result = session.run(
-            """
-            CALL db.index.vector.queryNodes('section_embeddings', $top_k, $embedding)
-            YIELD node AS section_node, score AS section_score
-            MATCH (section_node)<-[:HAS_SECTION]-(doc:Document)
-            RETURN doc, section_node, section_score
-            """,
-            parameters={"embedding": q_emb, "top_k": 10}
-        )
-
-        sections = []
-        for record in result:
-            doc_name = record["doc"]["name"]
-            section_text = record["section_node"]["text"]
-            sections.append({"doc_name": doc_name, "section_text": section_text})
-
-    # Pass the sections and user query to the LLM
-    llm_input = "\n\n".join([s["section_text"] for s in sections])
-    publication = list(set([s["doc_name"] for s in sections]))
-    llm_response = openai.Completion.create(
-        model="gpt-4o-mini",
-        prompt=f"""
+import json
+import logging
+import time
+from nasa_publication_tool.wsgi import graph_version, retriever
+from engine.query_embeddings import get_query_embedding
+from engine.llm import create_llm
+from engine.answer_cache import SemanticAnswerCache
+from engine.context import ContextBuilder, add_neighbours, count_tokens, neighbour_targets
+from engine import metrics
+from engine.profiling import span
+
+logger = logging.getLogger(__name__)
+
+llm = create_llm(settings.LLM_BACKEND)
+
+ttfb_seconds = metrics.histogram("rag_stream_ttfb_seconds", "Request start to first streamed byte")
+first_token_seconds = metrics.histogram("rag_stream_first_token_seconds", "Request start to first LLM token")
+prompt_tokens = metrics.histogram(
+    "rag_prompt_tokens", "Tokens in the RAG prompt", buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+
+context_builder = ContextBuilder(
+    budget_tokens=settings.RAG_CONTEXT_TOKENS,
+    duplicate_threshold=settings.RAG_DUPLICATE_THRESHOLD,
+    trim=settings.RAG_TRIM_SECTIONS,
+)
+
+answer_cache = SemanticAnswerCache(
+    threshold=settings.RAG_ANSWER_CACHE_THRESHOLD,
+    max_entries=settings.RAG_ANSWER_CACHE_SIZE,
+    ttl=settings.RAG_ANSWER_CACHE_TTL,
+) if settings.RAG_ANSWER_CACHE_SIZE else None
+
+PROMPT_TEMPLATE = """
 You are an expert research assistant and summarizer. You will receive:
 
 Publication: The name or title of the publication from which all sections are extracted.
@@ -162,15 +154,187 @@ Query:
 Output:
  - A comprehensive Markdown-formatted answer based strictly on relevant sections.
 
-        """, temperature=0, max_tokens=5000
+        """
+
+
+def retrieve_sections(q_emb, top_k=settings.RAG_TOP_K):
+    # Perform semantic search on section nodes
+    sections = retriever.sections(q_emb, top_k=top_k)
+    window = settings.RAG_NEIGHBOUR_WINDOW
+    if not window:
+        return sections
+    targets = neighbour_targets(sections, settings.RAG_NEIGHBOUR_SECTIONS)
+    return add_neighbours(sections, [retriever.neighbours(s["doc_name"], s["ordinal"], window) for s in targets])
+
+
+def cache_version():
+    """Graph version answers are cached under; ``None`` (cache bypassed) when disabled or unreadable."""
+    if answer_cache is None:
+        return None
+    try:
+        return graph_version.current()
+    except Exception:
+        logger.warning("Graph version unavailable, answer cache bypassed", exc_info=True)
+        return None
+
+
+def cached_answer(q_emb, version):
+    hit = answer_cache.lookup(q_emb, version) if version is not None else None
+    if hit is None:
+        return None
+    answer, similarity = hit
+    return {**answer, "cached": True, "similarity": round(similarity, 4)}
+
+
+def remember_answer(q_emb, version, generated_output, publication, tokens):
+    if version is not None and generated_output:
+        answer_cache.store(q_emb, version, {
+            "generated_output": generated_output, "Publication": publication, "prompt_tokens": tokens,
+        })
+
+
+def build_prompt(user_query, sections):
+    """Prompt with ``sections`` packed into the context budget; returns ``(prompt, publication, tokens)``."""
+    context = context_builder.build(user_query, sections)
+    publication = list(dict.fromkeys(s["doc_name"] for s in context.sections))
+    prompt = PROMPT_TEMPLATE.format(publication=publication, sections=context.text, user_query=user_query)
+    tokens = count_tokens(prompt)
+    prompt_tokens.observe(tokens)
+    logger.info(
+        "rag context sections=%d/%d context_tokens=%d prompt_tokens=%d dropped=%s",
+        len(context.sections), len(sections), context.tokens, tokens, context.dropped,
     )
-    # print("LLM response:", llm_response)
+    return prompt, publication, tokens
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def cached_events(user_query, answer, started):
+    """The SSE sequence of ``stream_answer`` for a cached answer, as a single token event."""
+    yield sse_event("publications", {"query": user_query, "Publication": answer["Publication"], "prompt_tokens": answer["prompt_tokens"]})
+    yield sse_event("token", {"text": answer["generated_output"]})
+    total = time.perf_counter() - started
+    yield sse_event("done", {"ttfb_ms": total * 1000, "first_token_ms": total * 1000, "total_ms": total * 1000, "cached": True})
+
+
+class AnswerStream:
+    """Server-sent events of one streamed answer: the publication list first, then tokens, then a summary.
+
+    ``stream_answer`` and ``rag.async_views.stream_answer`` feed it the LLM's
+    tokens; ``on_complete`` is called with the full answer once the stream
+    finished without error.
+    """
+
+    def __init__(self, user_query, publication, tokens, started, on_complete=None):
+        self.user_query = user_query
+        self.publication = publication
+        self.tokens = tokens
+        self.started = started
+        self.on_complete = on_complete
+        self.ttfb = self.first_token = None
+        self.parts = []
+
+    def publications(self):
+        # Taken before the first yield: the generator only resumes once the server wants the next chunk.
+        self.ttfb = time.perf_counter() - self.started
+        ttfb_seconds.observe(self.ttfb)
+        return sse_event("publications", {"query": self.user_query, "Publication": self.publication, "prompt_tokens": self.tokens})
+
+    def token(self, token):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+            first_token_seconds.observe(self.first_token)
+        self.parts.append(token)
+        return sse_event("token", {"text": token})
+
+    def error(self, e):
+        logger.exception("LLM stream failed for query %r", self.user_query)
+        return sse_event("error", {"error": str(e)})
+
+    def done(self):
+        if self.on_complete is not None:
+            self.on_complete("".join(self.parts).strip())
+        total = time.perf_counter() - self.started
+        logger.info("rag stream ttfb=%.3fs first_token=%s total=%.3fs", self.ttfb, self.first_token, total)
+        return sse_event("done", {
+            "ttfb_ms": self.ttfb * 1000,
+            "first_token_ms": self.first_token * 1000 if self.first_token is not None else None,
+            "total_ms": total * 1000,
+        })
+
+
+def stream_answer(user_query, publication, prompt, tokens, started, on_complete=None):
+    answer = AnswerStream(user_query, publication, tokens, started, on_complete)
+    yield answer.publications()
+    try:
+        for token in llm.stream(prompt, temperature=0, max_tokens=5000):
+            yield answer.token(token)
+    except Exception as e:
+        yield answer.error(e)
+        return
+    yield answer.done()
+
+
+def wants_stream(request):
+    value = request.data.get("stream", request.GET.get("stream", False))
+    return str(value).lower() in ("1", "true", "yes")
+
 
-    generated_output = llm_response["choices"][0]["text"].strip()
+@api_view(['POST'])
+def query_and_generate(request):
+    started = time.perf_counter()
+    if not isinstance(request.data, dict):
+        return Response({"error": "Request body must be a JSON object."}, status=400)
+    user_query = request.data.get('query', '')
+    if not user_query:
+        return Response({"error": "Query parameter is required."}, status=400)
+
+    # Get embedding for the user query
+    with span("embed"):
+        q_emb = get_query_embedding(user_query)
+    with span("answer_cache"):
+        version = cache_version()
+        cached = cached_answer(q_emb, version)
+    if cached is not None:
+        if wants_stream(request):
+            return sse_response(cached_events(user_query, cached, started))
+        return Response({"query": user_query, **cached})
+
+    with span("retrieve"):
+        sections = retrieve_sections(q_emb)
+
+    # Pass the sections and user query to the LLM
+    with span("context"):
+        prompt, publication, tokens = build_prompt(user_query, sections)
+
+    if wants_stream(request):
+        remember = lambda answer: remember_answer(q_emb, version, answer, publication, tokens)
+        return sse_response(stream_answer(user_query, publication, prompt, tokens, started, remember))
+
+    with span("llm"):
+        generated_output = llm.complete(prompt, temperature=0, max_tokens=5000)
+    remember_answer(q_emb, version, generated_output, publication, tokens)
 
     # Return the response
     return Response({
         "query": user_query,
         "generated_output": generated_output,
-        "Publication": publication  # Ensure unique document names
-    })
\ No newline at end of file
+        "Publication": publication,  # Ensure unique document names
+        "prompt_tokens": tokens,
+    })
+
+
+@api_view(['GET'])
+def answer_cache_stats(request):
+    if answer_cache is None:
+        return Response({"enabled": False})
+    return Response({"enabled": True, **answer_cache.report()})
@@ -0,0 +1,28 @@
+from neo4j import GraphDatabase
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.lexical_index import build_lexical_index
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def main(path):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        counts = build_lexical_index(driver, path)
+        print(f"{counts['sections']} sections, {counts['names']} names, {counts['terms']} terms")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Build the BM25 index over section text and node names')
+    parser.add_argument('--path', default=os.environ.get('LEXICAL_INDEX_DIR', 'lexical_index'), help='Index directory')
+    args = parser.parse_args()
+    main(args.path)
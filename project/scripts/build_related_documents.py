@@ -0,0 +1,34 @@
+from neo4j import GraphDatabase
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.graph_version import bump_graph_version
+from engine.related_documents import compute_related
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def main(path, k, documents=None, block_size=1024):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        counts = compute_related(driver, path, k=k, documents=documents, block_size=block_size)
+        print(f"{counts['documents']} documents, SIMILAR_TO edges rewritten for {counts['updated']}")
+        # Cached related-documents/ responses are keyed on the graph version
+        print(f"Graph version bumped to {bump_graph_version(driver)}")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Pool section embeddings per document and write SIMILAR_TO edges')
+    parser.add_argument('--path', default=os.environ.get('RELATED_DIR', 'related_documents'), help='Neighbour table directory')
+    parser.add_argument('--k', type=int, default=int(os.environ.get('RELATED_DOCUMENTS_K', 10)), help='Neighbours per document')
+    parser.add_argument('--documents', nargs='*', help='Only re-pool these documents instead of a full rebuild')
+    parser.add_argument('--block-size', type=int, default=1024, help='Rows per similarity block')
+    args = parser.parse_args()
+    main(args.path, args.k, args.documents, args.block_size)
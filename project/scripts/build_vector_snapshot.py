@@ -0,0 +1,33 @@
+from neo4j import GraphDatabase
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.vector_index import build_snapshot, refresh_snapshot
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def main(path, documents=None):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        if documents:
+            counts = refresh_snapshot(driver, path, documents)
+        else:
+            counts = build_snapshot(driver, path)
+        for label, count in counts.items():
+            print(f"{label}: {count} vectors")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Export graph embeddings into the in-process vector snapshot')
+    parser.add_argument('--path', default=os.environ.get('VECTOR_SNAPSHOT_DIR', 'vector_snapshot'), help='Snapshot directory')
+    parser.add_argument('--documents', nargs='*', help='Only refresh these documents instead of a full rebuild')
+    args = parser.parse_args()
+    main(args.path, args.documents)
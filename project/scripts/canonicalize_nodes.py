@@ -0,0 +1,42 @@
+from neo4j import GraphDatabase
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.canonicalize import DEFAULT_THRESHOLD, canonicalize_graph, format_shrink
+from engine.graph_version import bump_graph_version
+from engine.vector_index import NODE_LABELS
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def main(labels, threshold, block_size, dry_run=False):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        report, before, after = canonicalize_graph(driver, labels, threshold, block_size, dry_run=dry_run)
+        for label, counts in report.items():
+            print(f"{label}: {counts['clusters']} clusters, {counts['merged']} nodes merged")
+            for example in counts["examples"]:
+                print(f"  {example['canonical']} <- {json.dumps(example['aliases'], ensure_ascii=False)}")
+        print(("Projected:" if dry_run else "Shrink:") + "\n" + format_shrink(before, after))
+        if not dry_run:
+            # Merged nodes leave cached catalog and search responses stale
+            print(f"Graph version bumped to {bump_graph_version(driver)}")
+            print("Rebuild the vector snapshot and lexical index if they are in use.")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Merge near-duplicate entity, organism, compound and person nodes')
+    parser.add_argument('--labels', nargs='*', default=list(NODE_LABELS), choices=list(NODE_LABELS), help='Labels to canonicalize')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Cosine similarity that makes two names one node')
+    parser.add_argument('--block-size', type=int, default=1024, help='Rows per similarity block')
+    parser.add_argument('--dry-run', action='store_true', help='Report the clusters and projected shrink without writing')
+    args = parser.parse_args()
+    main(args.labels, args.threshold, args.block_size, args.dry_run)
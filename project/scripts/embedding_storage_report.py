@@ -0,0 +1,91 @@
+from neo4j import GraphDatabase
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.embedding_storage import (
+    DEFAULT_RERANK_CANDIDATES, EmbeddingStorage, recall_report, storage_report, vector_counts,
+)
+from engine.embeddings import DEFAULT_DIMENSIONS
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+SAMPLE_QUERY = """
+MATCH (n:`{label}`)
+WHERE n.embedding IS NOT NULL
+RETURN n.embedding AS embedding, n.embedding_int8 AS codes, n.embedding_scale AS scale
+LIMIT $limit
+"""
+
+
+def load_sample(driver, label, limit):
+    """Full-precision vectors of up to ``limit`` nodes of ``label``."""
+    storage = EmbeddingStorage()
+    with driver.session() as session:
+        vectors = [
+            storage.full_vector(r["embedding"], r["codes"], r["scale"])
+            for r in session.run(SAMPLE_QUERY.format(label=label), limit=limit)
+        ]
+    return np.asarray([v for v in vectors if v is not None and len(v) == storage.dimensions], dtype=np.float32)
+
+
+def synthetic_vectors(n, dimensions, clusters=50, seed=0):
+    """Clustered vectors whose variance falls off with the dimension index, like a Matryoshka-trained model's.
+
+    Only a stand-in: recall on real embeddings is what decides the layout.
+    """
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dimensions) / 64.0)
+    centres = rng.standard_normal((clusters, dimensions))
+    vectors = centres[rng.integers(clusters, size=n)] + 0.7 * rng.standard_normal((n, dimensions))
+    return (vectors * decay).astype(np.float32)
+
+
+def main(label, sample, queries, k, index_dimensions, rerank_candidates, synthetic=None, output=None):
+    if synthetic:
+        vectors = synthetic_vectors(synthetic, DEFAULT_DIMENSIONS)
+        counts = {label: synthetic}
+    else:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        try:
+            counts = vector_counts(driver)
+            vectors = load_sample(driver, label, sample)
+        finally:
+            driver.close()
+    if len(vectors) <= k:
+        raise SystemExit(f"Need more than {k} full-precision {label} vectors, found {len(vectors)}")
+
+    storage = storage_report(counts, vectors.shape[1], index_dimensions)
+    recall = recall_report(vectors, k, index_dimensions, rerank_candidates, queries)
+    print(f"{sum(counts.values())} vectors in the graph ({', '.join(f'{l}: {n}' for l, n in counts.items())})")
+    print(f"{'layout':<28}{'properties':>14}{'vector index':>14}")
+    for row in storage:
+        print(f"{row['layout']:<28}{row['property_bytes'] / 1e6:>11.1f} MB{row['index_bytes'] / 1e6:>11.1f} MB")
+    print(f"\nrecall@{k} against exact float32 search ({min(queries, len(vectors))} {label} queries over {len(vectors)} vectors)")
+    for row in recall:
+        print(f"{row['layout']:<40}{row['recall']:>8.3f}")
+    if output:
+        Path(output).write_text(json.dumps({"counts": counts, "storage": storage, "recall": recall}, indent=2), encoding="utf-8")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Memory, index size and recall@k of the embedding storage layouts')
+    parser.add_argument('--label', default='Section', help='Label whose vectors are sampled for recall')
+    parser.add_argument('--sample', type=int, default=20000, help='Vectors to sample')
+    parser.add_argument('--queries', type=int, default=200, help='Sampled vectors used as queries')
+    parser.add_argument('--k', type=int, default=10, help='Neighbours compared for recall@k')
+    parser.add_argument('--index-dimensions', default='1024,512,256', help='Comma-separated reduced index dimensions')
+    parser.add_argument('--rerank-candidates', type=int, default=DEFAULT_RERANK_CANDIDATES,
+                        help='Index hits fetched per result before the int8 re-rank')
+    parser.add_argument('--synthetic', type=int, help='Use this many random vectors instead of reading Neo4j')
+    parser.add_argument('--output', help='Also write the report as JSON')
+    args = parser.parse_args()
+    dims = [int(d) for d in args.index_dimensions.split(",") if d.strip()]
+    main(args.label, args.sample, args.queries, args.k, dims, args.rerank_candidates, args.synthetic, args.output)
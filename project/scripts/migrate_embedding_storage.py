@@ -0,0 +1,72 @@
+from neo4j import GraphDatabase
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.embedding_storage import (
+    DEFAULT_INDEX_DIMENSIONS, LABELS, EmbeddingMigrationError, EmbeddingStorage, check_migration, migrate_embeddings,
+    storage_bytes, vector_counts,
+)
+from engine.graph_version import bump_graph_version
+from engine.schema import drop_vector_indexes, migrate, vector_index_dimensions
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def megabytes(n):
+    return f"{n / 1e6:.1f} MB"
+
+
+def main(index_dimensions, labels, batch_size, dry_run=False, wait=False, allow_lossy=False):
+    storage = EmbeddingStorage(index_dimensions=index_dimensions)
+    layout = "compact" if storage.compact else "float32"
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        vectors = sum(vector_counts(driver, labels).values())
+        per_vector = storage_bytes(storage.dimensions, index_dimensions, layout)
+        print(f"{vectors} vectors -> {layout} ({index_dimensions}-d index of {storage.dimensions}-d embeddings): "
+              f"~{megabytes(per_vector['properties'] * vectors)} properties, ~{megabytes(per_vector['index'] * vectors)} index")
+        # Nothing is dropped or rewritten unless every vector converts
+        try:
+            check_migration(driver, storage, labels, allow_lossy)
+        except EmbeddingMigrationError as e:
+            raise SystemExit(str(e))
+        if dry_run:
+            return
+
+        existing = vector_index_dimensions(driver)
+        if any(dims is not None and int(dims) != index_dimensions for dims in existing.values()):
+            print(f"Dropped vector indexes: {', '.join(drop_vector_indexes(driver))}")
+        try:
+            for label, counts in migrate_embeddings(driver, storage, labels, batch_size, allow_lossy).items():
+                print(f"{label}: {counts['converted']} converted")
+        except EmbeddingMigrationError as e:
+            raise SystemExit(str(e))
+        finally:
+            # The indexes come back even when some vectors were left unconverted
+            added = migrate(driver, index_dimensions, wait=wait)
+            print(f"Added {added['indexes']} indexes")
+        # Cached search responses were ranked with the old vectors
+        print(f"Graph version bumped to {bump_graph_version(driver)}")
+        print(f"Run the API and ingestion with EMBEDDING_INDEX_DIMENSIONS={index_dimensions}, "
+              "and rebuild the vector snapshot and related documents if they are in use.")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Rewrite stored embeddings as float32 or compact (reduced index + int8)')
+    parser.add_argument('--index-dimensions', type=int, default=DEFAULT_INDEX_DIMENSIONS,
+                        help='Dimensions kept in the vector indexes; the full model dimensions mean plain float32')
+    parser.add_argument('--labels', nargs='*', default=LABELS, choices=LABELS, help='Labels to convert')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Nodes per write transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the projected storage')
+    parser.add_argument('--wait', action='store_true', help='Wait until the rebuilt indexes are online')
+    parser.add_argument('--allow-lossy', action='store_true',
+                        help='Write float32 vectors decoded from int8 codes when converting compact storage back')
+    args = parser.parse_args()
+    main(args.index_dimensions, args.labels, args.batch_size, args.dry_run, args.wait, args.allow_lossy)
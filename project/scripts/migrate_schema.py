@@ -0,0 +1,36 @@
+from neo4j import GraphDatabase
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from engine.embedding_storage import DEFAULT_INDEX_DIMENSIONS
+from engine.schema import check_dimensions, migrate, vector_index_dimensions
+
+NEO4J_URI = os.environ.get('NEO4J_URI', 'neo4j://127.0.0.1:7687')
+NEO4J_USER = os.environ.get('NEO4J_USER', 'neo4j')
+NEO4J_PASSWORD = os.environ.get('NEO4J_PASSWORD', '123456789')
+
+
+def main(dimensions, check_only=False, wait=False):
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    try:
+        if check_only:
+            check_dimensions(driver, dimensions)
+        else:
+            added = migrate(driver, dimensions, wait=wait)
+            print(f"Added {added['constraints']} constraints and {added['indexes']} indexes")
+        for name, dims in sorted(vector_index_dimensions(driver).items()):
+            print(f"{name}: {dims} dimensions")
+    finally:
+        driver.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Create the Neo4j constraints and indexes the app and ingestion expect')
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_INDEX_DIMENSIONS, help='Embedding dimensions for vector indexes')
+    parser.add_argument('--check', action='store_true', help='Only verify vector index dimensions')
+    parser.add_argument('--wait', action='store_true', help='Wait until new indexes are online')
+    args = parser.parse_args()
+    main(args.dimensions, args.check, args.wait)